@@ -0,0 +1,63 @@
+import json
+import pathlib
+
+from typing import Optional, Tuple
+
+import click
+
+from . import suite
+
+
+@click.command()
+@click.option(
+    '--size',
+    'sizes',
+    multiple=True,
+    type=int,
+    help=f"Amount of images of projects, {suite.SIZES} by default.",
+)
+@click.option('--case', 'names', multiple=True, type=click.Choice(list(suite.CASES)))
+@click.option('--repeat', default=suite.REPEAT, show_default=True)
+@click.option(
+    '--output', type=click.Path(dir_okay=False), help="Write results to this file."
+)
+@click.option(
+    '--baseline',
+    type=click.Path(exists=True, dir_okay=False),
+    help="Compare results to those written to this file, failing on regressions.",
+)
+@click.option('--tolerance', default=suite.TOLERANCE, show_default=True)
+def main(
+    sizes: Tuple[int, ...],
+    names: Tuple[str, ...],
+    repeat: int,
+    output: Optional[str],
+    baseline: Optional[str],
+    tolerance: float,
+):
+    """Time operations of PicPick on synthetic projects."""
+    results = suite.run(
+        sizes=sorted(sizes) or suite.SIZES,
+        names=list(names) or None,
+        repeat=repeat,
+        report=click.echo,
+    )
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is None:
+        return
+
+    regressions = suite.compare(
+        results, json.loads(pathlib.Path(baseline).read_text()), tolerance
+    )
+    for regression in regressions:
+        click.echo(f"Regression: {regression}", err=True)
+
+    if regressions != []:
+        raise SystemExit(1)
+
+
+main()
@@ -0,0 +1,348 @@
+"""Benchmarks of the operations whose cost grows with the amount of images.
+
+Each case sets up a synthetic project of some size, then returns the operation to
+time, so that setup is never measured. Cases requiring Tk are skipped when no
+display is available, e.g. unless run under Xvfb.
+"""
+import contextlib
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+from unittest import mock
+
+from PIL import Image as PILImage  # type: ignore
+
+from picpick import hashing, imaging, storage
+from picpick.controller import Controller
+from picpick.model import Image, Model, Tag
+from picpick.storage import journal
+
+SIZES = (10_000, 100_000, 1_000_000)
+REPEAT = 3  # timings of each case, the fastest being compared
+TOLERANCE = 0.25  # slowdown over baseline reported as a regression
+
+TAGS_COUNT = 50
+MAX_TAGS = 3  # per image
+ADDED_COUNT = 1000  # images added one at a time to a project
+QUERIED_COUNT = 1000  # images whose near-duplicates are looked up
+
+DISPLAY_BOX = (928, 640)
+PHOTO_SIZE = (4000, 3000)
+
+Operation = Callable[[], object]
+Case = Callable[[int, pathlib.Path], Operation]
+
+
+class Skipped(Exception):
+    """Raised by cases which cannot run in this environment."""
+
+
+class Timing(NamedTuple):
+    min: float  # seconds
+    median: float
+
+
+class Regression(NamedTuple):
+    case: str
+    size: int
+    baseline: float
+    result: float
+
+    def __str__(self) -> str:
+        return (
+            f"{self.case} at {self.size} images: {self.result:.4f}s, "
+            f"{self.result / self.baseline:.0%} of {self.baseline:.4f}s"
+        )
+
+
+def synthetic(size: int, seed: int = 0) -> Model:
+    """Model of size images, which do not exist on disk, tagged at random."""
+    rng = random.Random(seed)
+    tags = [Tag(name=f'tag{i:02}') for i in range(TAGS_COUNT)]
+
+    model = Model()
+    model.tags = set(tags)
+
+    for i in range(size):
+        image = Image(path=pathlib.Path(f'/synthetic/{i // 1000:04}/{i:07}.jpg'))
+        image.tags.update(rng.sample(tags, rng.randint(0, MAX_TAGS)))
+        model.images.add(image)
+
+    return model
+
+
+class NullView:
+    """View doing nothing, so that only the controller is measured."""
+
+    def __init__(self, controller=None):
+        pass
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return lambda *args, **kwargs: None
+
+
+def controller_for(model: Model) -> Controller:
+    with mock.patch('picpick.controller.View', NullView):
+        return Controller(model=model)
+
+
+def tk_root():
+    """Hidden Tk root window, raises Skipped without a display."""
+    import tkinter as tk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise Skipped(f"no display: {e}")
+
+    root.withdraw()
+    return root
+
+
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str) -> Callable[[Case], Case]:
+    def register(function: Case) -> Case:
+        CASES[name] = function
+        return function
+
+    return register
+
+
+def _save(format: str) -> Case:
+    def setup(size: int, directory: pathlib.Path) -> Operation:
+        model = synthetic(size)
+        destination = directory / f'save.{format}'
+
+        if destination.exists():
+            destination.unlink()
+        return lambda: storage.save(destination, model, 0, format=format)
+
+    return setup
+
+
+def _load(format: str, lazy: bool = False) -> Case:
+    def setup(size: int, directory: pathlib.Path) -> Operation:
+        source = directory / f'load.{format}'
+
+        # same project for each timing, recorded as validated as when saved by
+        # PicPick, so that only a sample of its images is checked
+        if not source.exists():
+            validated = storage.save(source, synthetic(size), 0, format=format)
+            journal.restart(source, validated)
+        return lambda: storage.load(source, lazy=lazy)
+
+    return setup
+
+
+for format in storage.FORMATS:
+    case(f'storage.save[{format}]')(_save(format))
+    case(f'storage.load[{format}]')(_load(format))
+case('storage.load[binary, lazy]')(_load(storage.BINARY, lazy=True))
+
+
+@case('Controller.add_image')
+def add_image(size: int, directory: pathlib.Path) -> Operation:
+    controller = controller_for(synthetic(size))
+    images = [
+        Image(path=pathlib.Path(f'/added/{i:07}.jpg')) for i in range(ADDED_COUNT)
+    ]
+
+    def add():
+        for image in images:
+            controller.add_image(image)
+
+    return add
+
+
+@case('Controller.images')
+def images(size: int, directory: pathlib.Path) -> Operation:
+    controller = controller_for(synthetic(size))
+    controller.add_image(Image(path=pathlib.Path('/added/0.jpg')))
+
+    # positions are computed again once images changed
+    def access():
+        images = controller.images
+        return images.index(images[len(images) // 2])
+
+    return access
+
+
+@case('Controller.delete_tag')
+def delete_tag(size: int, directory: pathlib.Path) -> Operation:
+    controller = controller_for(synthetic(size))
+    return lambda: controller.delete_tag(Tag(name='tag00'))
+
+
+@case('Controller.update_tag')
+def update_tag(size: int, directory: pathlib.Path) -> Operation:
+    controller = controller_for(synthetic(size))
+    return lambda: controller.update_tag(Tag(name='tag00'), Tag(name='renamed'))
+
+
+def _hashed(size: int, seed: int = 0) -> Model:
+    # every tenth image a near-duplicate of the previous one
+    rng = random.Random(seed)
+    model = synthetic(size, seed)
+
+    previous = 0
+    for i, image in enumerate(model.order):
+        if i % 10 == 9:
+            image.hash = previous ^ 1 << rng.randrange(64) ^ 1 << rng.randrange(64)
+        else:
+            image.hash = rng.getrandbits(64)
+        previous = image.hash
+
+    return model
+
+
+@case('Model.near_duplicates')
+def near_duplicates(size: int, directory: pathlib.Path) -> Operation:
+    model = _hashed(size)
+    images = random.Random(0).sample(model.order, QUERIED_COUNT)
+    model.hashes  # indexed once, as long as hashes do not change
+
+    def query():
+        for image in images:
+            model.near_duplicates(image, hashing.NEAR_DISTANCE)
+
+    return query
+
+
+@case('Model.distinct')
+def distinct(size: int, directory: pathlib.Path) -> Operation:
+    model = _hashed(size)
+    return lambda: model.distinct(hashing.NEAR_DISTANCE)
+
+
+@case('FileList.set_images')
+def set_images(size: int, directory: pathlib.Path) -> Operation:
+    from picpick import widgets
+
+    file_list = widgets.FileList(master=tk_root())
+    model = synthetic(size)
+    return lambda: file_list.set_images(model.order)
+
+
+@case('FileList.refresh')
+def refresh(size: int, directory: pathlib.Path) -> Operation:
+    from picpick import widgets
+
+    model = synthetic(size)
+    controller = controller_for(model)
+
+    file_list = widgets.FileList(master=tk_root(), search=controller.search)
+    file_list.set_images(model.order)
+    file_list._filter.set('tag00 OR tag01')  # refreshes once set
+
+    return file_list.refresh
+
+
+def _photo(directory: pathlib.Path) -> pathlib.Path:
+    path = directory / 'photo.jpg'
+
+    if not path.exists():
+        # noise does not compress, as much data is decoded as from a photo
+        noise = PILImage.effect_noise(PHOTO_SIZE, 64).convert('RGB')
+        noise.save(path, quality=90)
+    return path
+
+
+@case('ImageDisplay.decode_and_resize')
+def decode_and_resize(size: int, directory: pathlib.Path) -> Operation:
+    path = _photo(directory)
+    loader = imaging.Loader(cache=imaging.ImageCache(max_bytes=0))  # never cached
+
+    return lambda: loader.render(path, DISPLAY_BOX).result()
+
+
+@case('ImageDisplay.resize')
+def resize(size: int, directory: pathlib.Path) -> Operation:
+    decoded = imaging.decode(_photo(directory), DISPLAY_BOX)
+    return lambda: imaging.thumbnail(decoded.image, DISPLAY_BOX)
+
+
+# independent of the amount of images, only timed once whatever sizes
+UNSIZED = {'ImageDisplay.decode_and_resize', 'ImageDisplay.resize'}
+
+# a lookup per image, which takes too long over the largest sizes
+SMALLEST_ONLY = {'Model.distinct'}
+
+
+def measure(case: Case, size: int, directory: pathlib.Path, repeat: int) -> Timing:
+    timings: List[float] = []
+
+    for _ in range(repeat):
+        operation = case(size, directory)
+
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    return Timing(min=min(timings), median=statistics.median(timings))
+
+
+@contextlib.contextmanager
+def _directory() -> Iterator[pathlib.Path]:
+    with tempfile.TemporaryDirectory() as directory:
+        yield pathlib.Path(directory)
+
+
+def run(
+    sizes=SIZES,
+    names: Optional[List[str]] = None,
+    repeat: int = REPEAT,
+    report: Callable[[str], None] = lambda line: None,
+) -> dict:
+    """Timings of cases, all of them unless named, as written to JSON."""
+    results: Dict[str, Dict[str, dict]] = {}
+    skipped: Dict[str, str] = {}
+
+    for name, function in CASES.items():
+        if names is not None and name not in names:
+            continue
+
+        for size in sizes[:1] if name in UNSIZED | SMALLEST_ONLY else sizes:
+            try:
+                with _directory() as directory:
+                    timing = measure(function, size, directory, repeat)
+            except Skipped as e:
+                skipped[name] = str(e)
+                report(f"{name}: skipped, {e}")
+                break
+
+            results.setdefault(name, {})[str(size)] = timing._asdict()
+            report(f"{name} at {size} images: {timing.min:.4f}s")
+
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE):
+    """Regressions of results over baseline, cases and sizes in both compared by
+    their fastest timings."""
+    regressions: List[Regression] = []
+
+    for name, timings in results['results'].items():
+        for size, timing in timings.items():
+            try:
+                previous = baseline['results'][name][size]['min']
+            except KeyError:
+                continue
+
+            if timing['min'] > previous * (1 + tolerance):
+                regressions.append(Regression(name, int(size), previous, timing['min']))
+
+    return regressions
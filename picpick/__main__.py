@@ -1,12 +1,24 @@
+import itertools
 import pathlib
 
-from typing import Optional
+from typing import Optional, Tuple
 
 import click
 
-from . import __version__
+from . import (
+    __version__,
+    exporting,
+    hashing,
+    importing,
+    labels,
+    query,
+    storage,
+    timing,
+    watching,
+)
 from .controller import Controller
 from .model import Model
+from .storage import journal
 
 
 def version(ctx, param, value):
@@ -16,19 +28,207 @@ def version(ctx, param, value):
     ctx.exit()
 
 
-@click.command()
-@click.argument('filename', type=click.Path(exists=True), required=False)
+class DefaultGroup(click.Group):
+    """Group invoking its default command when given no command name, so that
+    `picpick FILENAME` keeps opening FILENAME."""
+
+    default = 'run'
+
+    def parse_args(self, ctx, args):
+        if args == [] or (args[0] not in self.commands and args[0][:1] != '-'):
+            args.insert(0, self.default)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup)
 @click.option(
     '--version', is_flag=True, callback=version, expose_value=False, is_eager=True
 )
-def run(filename: Optional[str]):
+def main():
+    pass
+
+
+@main.command()
+@click.argument('filename', type=click.Path(exists=True), required=False)
+@click.option(
+    '--watch',
+    multiple=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="Add images appearing in this directory tree while running.",
+)
+@click.option(
+    '--timings',
+    type=click.Path(dir_okay=False),
+    help="Time operations, and write their latency to this file on exit, as CSV "
+    "if its extension is .csv, JSON otherwise.",
+)
+def run(filename: Optional[str], watch: Tuple[str, ...], timings: Optional[str]):
+    """Open project FILENAME, or a new project.
+
+    Latency of operations is displayed with F12.
+    """
+    if timings is not None:
+        timing.enable()
+
     model = Model()
     controller = Controller(model=model)
 
     if filename is not None:
         controller.load(pathlib.Path(filename))
 
+    if watch != ():
+        controller.watch(
+            [pathlib.Path(directory) for directory in watch],
+            index=None
+            if filename is None
+            else watching.index_path_for(pathlib.Path(filename)),
+        )
+
     controller.run()
 
+    if timings is not None:
+        timing.enable().write(pathlib.Path(timings))
+
+
+@main.command()
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('destination', type=click.Path(dir_okay=False))
+@click.option(
+    '--format',
+    'format_',
+    type=click.Choice(storage.FORMATS),
+    default=storage.BINARY,
+    show_default=True,
+)
+def convert(source: str, destination: str, format_: str):
+    """Convert project SOURCE into DESTINATION, in given format."""
+    model, current_index = storage.load(pathlib.Path(source))
+    validated = storage.save(
+        pathlib.Path(destination), model, current_index=current_index, format=format_
+    )
+
+    # trusted when loaded, hence only sampled rather than read whole
+    journal.restart(pathlib.Path(destination), validated)
+
+
+@main.command('import')
+@click.argument(
+    'directories',
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option('--recursive', '-r', is_flag=True, help="Import subdirectories too.")
+@click.option(
+    '--hash', 'hash_', is_flag=True, help="Compute perceptual hashes of images too."
+)
+@click.option(
+    '--project',
+    type=click.Path(dir_okay=False),
+    required=True,
+    help="Project to add images to, created if needed.",
+)
+def import_(directories: Tuple[str, ...], recursive: bool, hash_: bool, project: str):
+    """Add images in DIRECTORIES to a project."""
+    imported = importing.import_images(
+        pathlib.Path(project),
+        [pathlib.Path(directory) for directory in directories],
+        recursive=recursive,
+        hash=hash_,
+    )
+
+    click.echo(f"{imported.added} images added, {imported.present} already present")
+    for path in imported.invalid:
+        click.echo(f"{path} is not an image", err=True)
+    for path in imported.unhashed:
+        click.echo(f"{path} could not be hashed", err=True)
+
+
+@main.command('hash')
+@click.argument('project', type=click.Path(exists=True, dir_okay=False))
+@click.option('--all', 'all_', is_flag=True, help="Hash images already hashed too.")
+def hash_(project: str, all_: bool):
+    """Compute perceptual hashes of images in PROJECT, to find near-duplicates."""
+    with storage.edited(pathlib.Path(project)) as (model, changes):
+        images = [image for image in model.order if all_ or image.hash is None]
+        hashed = hashing.hash_model(model, images, changes.append)
+
+    click.echo(f"{hashed.hashed} images hashed")
+    for path in hashed.unreadable:
+        click.echo(f"{path} could not be hashed", err=True)
+
+
+@main.command('import-labels')
+@click.argument('files', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--sidecars',
+    is_flag=True,
+    help="Read tags of each image from a .txt file next to it too.",
+)
+@click.option(
+    '--project',
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="Project whose images to tag.",
+)
+def import_labels(files: Tuple[str, ...], sidecars: bool, project: str):
+    """Tag images of a project from CSV or JSON lines FILES, creating missing tags.
+
+    FILES have a path column, and either a tag or a tags one, as when exported.
+    """
+    try:
+        read = [labels.read(pathlib.Path(file)) for file in files]
+    except labels.UnknownFormat as e:
+        raise click.BadParameter(str(e), param_hint="'FILES'")
+
+    with storage.edited(pathlib.Path(project)) as (model, changes):
+        if sidecars:
+            read.append(labels.read_sidecars(model.order))
+        applied = labels.apply(model, itertools.chain(*read), changes.append)
+
+    click.echo(
+        f"{applied.tagged} tags added to images, {len(applied.created)} tags created"
+    )
+    if applied.unresolved > 0:
+        click.echo(
+            f"{applied.unresolved} labels of images not in project ignored", err=True
+        )
+
+
+@main.command()
+@click.argument('project', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option(
+    '--format',
+    'format_',
+    type=click.Choice(exporting.FORMATS),
+    default=exporting.CSV,
+    show_default=True,
+)
+@click.option(
+    '--query', 'text', default='', help="Only export images matching this filter."
+)
+@click.option(
+    '--compression',
+    type=click.Choice(exporting.COMPRESSIONS),
+    help="Compression of OUTPUT, guessed from its extension by default.",
+)
+def export(
+    project: str, output: str, format_: str, text: str, compression: Optional[str]
+):
+    """Export tags of images in PROJECT to OUTPUT, in given format."""
+    model, _ = storage.load(pathlib.Path(project))
+    destination = pathlib.Path(output)
+
+    if compression is None:
+        compression = exporting.compression_of(destination)
+
+    try:
+        exporting.export(destination, model, format_, text, compression)
+    except query.QuerySyntaxError as e:
+        raise click.BadParameter(str(e), param_hint="'--query'")
+    except exporting.CompressionUnavailable as e:
+        raise click.UsageError(str(e))
+
 
-run()
+main()
@@ -1,16 +1,60 @@
+import contextlib
+import os
 import pathlib
 
-from typing import List, Optional, Set
-
-from . import storage
-from .model import Image, Model, Tag
+from concurrent import futures
+
+from typing import (
+    AbstractSet,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+)
+
+from . import (
+    hashing,
+    labels as labelling,
+    operations,
+    query,
+    storage,
+    timing,
+    watching,
+)
+from .storage import journal
+from .events import Event
+from .model import Image, Model, sort_key, Tag
 from .view import View
 
+SAVE_POLL_INTERVAL = 100  # milliseconds
+WATCH_POLL_INTERVAL = 500  # milliseconds between checks for watched changes
+
+MISSING = Tag(name='missing')  # of images removed from watched directories
+
 
 class Controller:
     def __init__(self, model: Model):
         # required to comply with static typing
         self._view = View(controller=self)
+
+        self._batches = 0
+
+        # changes made since project was last saved to or loaded from a file
+        self._journal = journal.Journal()
+
+        # saves in the background, one at a time
+        self._executor = futures.ThreadPoolExecutor(max_workers=1)
+        self._saving: Optional[futures.Future] = None
+        self._saving_to: pathlib.Path
+        self._save_progress = 0.0
+        self._next_save: Optional[pathlib.Path] = None
+
+        self._watcher: Optional[watching.Watcher] = None
+
         self._init(model=model)
 
     def _init(self, model: Model):
@@ -20,76 +64,246 @@ class Controller:
         if len(model.tags) > 0:
             self._view.update_tags()
 
-        if len(model.images) > 0:
+        # images are only read from lazily loaded projects once displayed
+        if len(model.order) > 0:
             self._view.update_images()
             self.set_current_image(self.images[0])
 
     def add_image(self, image: Image):
-        assert image not in self.images  # TODO: performance can be improved
-        assert image.tags == set()
-
-        if image.path in [i.path for i in self.images]:
+        if self.add_images([image]) != []:
             raise self.__class__.ImageAlreadyPresent(image)
 
-        self._model.images.add(image)
+    @timing.timed
+    def add_images(self, images: Iterable[Image]) -> List[Image]:
+        """Add images whose path is not already present, and return the others."""
+        paths: Dict[pathlib.Path, Image] = {}
+        duplicates: List[Image] = []
+
+        for image in images:
+            assert image not in self._model.images
+            assert image.tags == set()
+
+            if image.path in paths or self._model.image_at(image.path) is not None:
+                duplicates.append(image)
+                continue
+
+            self._record(operations.AddImage(path=image.path))
+            paths[image.path] = image
 
-        self._view.update_images()
+        if paths == {}:
+            return duplicates
+
+        # sorted along with others at once
+        added = list(paths.values())
+        self._model.add_images(added)
+
+        self._changed(Event.IMAGES_CHANGED, lambda: self._view.add_images(added))
 
         if self.current_image is None:
-            self.set_current_image(image)
+            self.set_current_image(min(added, key=sort_key))
+
+        return duplicates
+
+    @timing.timed
+    def remove_image(self, image: Image):
+        assert image in self._model.images
 
+        if self.current_image is image:
+            self.set_current_image(None)
+
+        self._model.remove_image(image)
+        self._record(operations.RemoveImage(path=image.path))
+        self._changed(Event.IMAGES_CHANGED, lambda: self._view.remove_images([image]))
+
+    @timing.timed
     def add_tag(self, tag: Tag):
         assert tag not in self._model.tags
 
-        self._model.tags.add(tag)
-        self._view.update_tags()
+        self._model.add_tag(tag)
+        self._record(operations.AddTag(name=tag.name))
+        self._changed(Event.TAGS_CHANGED, self._view.update_tags)
 
+    @timing.timed
     def delete_tag(self, tag: Tag):
-        self._model.tags.remove(tag)
-
         in_current_image = (
             tag in self.current_image.tags if self.current_image else False
         )
 
-        for image in self._model.images:
-            image.tags.discard(tag)
+        self._model.delete_tag(tag)
+        self._record(operations.DeleteTag(name=tag.name))
 
-        self._view.update_tags()
+        self._changed(Event.TAGS_CHANGED, self._view.update_tags)
         if in_current_image:
-            self._view.update_current_image_tags()
+            self._changed(
+                Event.CURRENT_IMAGE_TAGS_CHANGED, self._view.update_current_image_tags
+            )
 
+    @timing.timed
     def update_tag(self, old: Tag, new: Tag):
         assert old in self._model.tags
 
         if new in self._model.tags:
             raise self.__class__.TagAlreadyPresent(new)
 
-        self._model.tags.remove(old)
-        self._model.tags.add(new)
+        self._model.rename_tag(old, new)
+        self._record(operations.RenameTag(old=old.name, new=new.name))
+        self._changed(Event.TAGS_CHANGED, self._view.update_tags)
 
-        for image in self._model.images:
-            if old in image.tags:
-                image.tags.remove(old)
-                image.tags.add(new)
+    @timing.timed
+    def set_tags(self, tags: Set[Tag]):
+        for tag in self._model.tags - tags:
+            self._record(operations.DeleteTag(name=tag.name))
+        for tag in tags - self._model.tags:
+            self._record(operations.AddTag(name=tag.name))
+
+        self._model.set_tags(tags)
+        self._changed(Event.TAGS_CHANGED, self._view.update_tags)
+
+    @timing.timed
+    def apply_labels(self, labels: Iterable[labelling.Label]) -> labelling.Applied:
+        """Tag images with labels at once, creating missing tags."""
+        current_tags = set(self.current_image.tags) if self.current_image else set()
+
+        with self.batch():
+            applied = labelling.apply(self._model, labels, self._record)
+
+            if applied.tagged > 0 or applied.created != []:
+                self._changed(Event.TAGS_CHANGED, self._view.update_tags)
+            if self.current_image and self.current_image.tags != current_tags:
+                self._changed(
+                    Event.CURRENT_IMAGE_TAGS_CHANGED,
+                    self._view.update_current_image_tags,
+                )
+
+        return applied
+
+    def watch(
+        self, roots: Iterable[pathlib.Path], index: Optional[pathlib.Path] = None
+    ):
+        """Add images appearing under roots, and tag those disappearing as missing,
+        until the application exits. Listings of roots are kept in index if given."""
+        assert self._watcher is None
+
+        self._watcher = watching.Watcher(roots, index)
+        self._watcher.start()
+        self._poll_watch()
+
+    def _poll_watch(self):
+        assert self._watcher is not None
+
+        for changes in self._watcher.changes():
+            self._apply_changes(changes)
+        self._view.after(WATCH_POLL_INTERVAL, self._poll_watch)
+
+    @timing.timed
+    def _apply_changes(self, changes: watching.Changes):
+        assert self._watcher is not None
+
+        removed = list(changes.removed)
+
+        if changes.complete:
+            # images removed while not watched, or not saved as missing
+            added = set(changes.added)
+            prefixes = tuple(os.path.join(root, '') for root in self._watcher.roots)
+            removed.extend(
+                image.path
+                for image in self._model.images
+                if str(image.path).startswith(prefixes) and image.path not in added
+            )
+
+        with self.batch():
+            self.add_images(
+                Image(path=path)
+                for path in changes.added
+                if self._model.image_at(path) is None
+            )
+
+            for path in changes.added:
+                self._flag_missing(path, False)
+            for path in removed:
+                self._flag_missing(path, True)
+
+    def _flag_missing(self, path: pathlib.Path, missing: bool):
+        image = self._model.image_at(path)
+
+        if image is None or (MISSING in image.tags) == missing:
+            return
 
-        self._view.update_tags()
+        if MISSING not in self._model.tags:
+            self.add_tag(MISSING)
 
-    def set_tags(self, tags: Set[Tag]):
-        self._model.tags = tags
+        if missing:
+            self._model.tag(image, MISSING)
+            self._record(operations.TagImage(path=path, name=MISSING.name))
+        else:
+            self._model.untag(image, MISSING)
+            self._record(operations.UntagImage(path=path, name=MISSING.name))
+
+        self._changed(Event.TAGS_CHANGED, self._view.update_tags)
+        if image is self.current_image:
+            self._changed(
+                Event.CURRENT_IMAGE_TAGS_CHANGED, self._view.update_current_image_tags
+            )
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """Only publish changes made within the batch as events, which the view
+        handles once each when Tk is idle, instead of updating it right away, e.g.
+        inserting rows one image at a time.
+
+            with controller.batch():
+                for image in images:
+                    ...
+        """
+        self._batches += 1
+        try:
+            yield
+        finally:
+            self._batches -= 1
+
+    def _record(self, operation: operations.Operation):
+        self._journal.append(operation)
 
-        for image in self._model.images:
-            image.tags.intersection_update(tags)
+    def _changed(self, event: Event, update: Callable[[], None]):
+        if self._batches > 0:
+            self._view.publish(event)
+        else:
+            update()
 
-        self._view.update_tags()
+    @property
+    def journaled(self) -> bool:
+        """Whether changes not saved yet are journaled, hence replayed once the
+        project is loaded again rather than lost."""
+        return self._journal.path is not None
 
     @property
-    def images(self) -> List[Image]:
-        return sorted(self._model.images, key=lambda image: image.path.name)
+    def images(self) -> Sequence[Image]:
+        """Sorted images, kept up to date as they are added or removed."""
+        return self._model.order
 
     @property
     def tags(self) -> List[Tag]:
         return sorted(self._model.tags, key=lambda tag: tag.name)
 
+    def search(self, text: str) -> Optional[AbstractSet[Image]]:
+        """Images matching query text, None if empty.
+
+        Raises query.QuerySyntaxError if text is not a valid query.
+        """
+        plan = query.parse(text)
+
+        if plan is None:
+            return None
+        return plan.evaluate(self._model.index)
+
+    def near_duplicates(self, image: Image) -> AbstractSet[Image]:
+        """Images whose hash is near the one of image, including image."""
+        return self._model.near_duplicates(image, hashing.NEAR_DISTANCE)
+
+    def distinct_images(self) -> AbstractSet[Image]:
+        """Images, only the first in order of those whose hashes are near."""
+        return self._model.distinct(hashing.NEAR_DISTANCE)
+
     @property
     def current_image(self) -> Optional[Image]:
         try:
@@ -97,8 +311,9 @@ class Controller:
         except AttributeError:
             return None
 
+    @timing.timed
     def set_current_image(self, image: Optional[Image]):
-        assert image is None or image in self._model.images
+        assert image is None or image in self._model.order
 
         if self.current_image is image:
             return
@@ -110,56 +325,187 @@ class Controller:
         else:
             self._current_image = image
 
-        self._view.update_current_image()
+        self._changed(Event.CURRENT_IMAGE_CHANGED, self._view.update_current_image)
 
+    @timing.timed
     def tag_current_image(self, tag: Tag):
         assert tag in self._model.tags
         assert tag not in self._current_image.tags
 
-        self._current_image.tags.add(tag)
-        self._view.update_current_image_tags()
+        self._model.tag(self._current_image, tag)
+        self._record(operations.TagImage(path=self._current_image.path, name=tag.name))
+        self._changed(
+            Event.CURRENT_IMAGE_TAGS_CHANGED, self._view.update_current_image_tags
+        )
 
+    @timing.timed
     def untag_current_image(self, tag: Tag):
         assert tag in self._model.tags
         assert tag in self._current_image.tags
 
-        self._current_image.tags.remove(tag)
-        self._view.update_current_image_tags()
+        self._model.untag(self._current_image, tag)
+        self._record(
+            operations.UntagImage(path=self._current_image.path, name=tag.name)
+        )
+        self._changed(
+            Event.CURRENT_IMAGE_TAGS_CHANGED, self._view.update_current_image_tags
+        )
 
     def set_current_image_tag(self, tag: Tag, present: bool):
         if present:
             return self.tag_current_image(tag)
         return self.untag_current_image(tag)
 
-    def save_current(self):
+    def save_current(self, background: bool = False):
         assert hasattr(self, 'last_save_path')
-        self.save(self.last_save_path)
+        self.save(self.last_save_path, background=background)
+
+    @timing.timed
+    def save(self, to: pathlib.Path, background: bool = False):
+        """Save project to a file, possibly while Tk keeps running.
+
+        A save in the background writes a snapshot of the project taken right
+        away, showing its progress until done, unless saving again to a file only
+        written changes. A save requested meanwhile is performed once it is done.
+        """
+        if self._saving is not None:
+            self._next_save = to
+            return
 
-    def save(self, to: pathlib.Path):
         current_index: Optional[int]
 
         try:
-            current_index = self.images.index(self._current_image)
+            current_index = self._model.order.index(self._current_image)
         except AttributeError:
             current_index = None
 
-        storage.save(to, self._model, current_index=current_index)
+        # only what changed is written when saving again to the same file
+        incremental = storage.writes_changes(to) and self._journal.project == to
+
+        if incremental:
+            current = None if current_index is None else self._current_image.path
+        elif background:
+            model = self._model.snapshot()
+        else:
+            model = self._model
+
+        # held until journal is rebased, so that compaction does not write the
+        # same changes meanwhile
+        self._journal.writing.acquire()
+
+        changes = self._journal.operations
+        written = len(changes)
+
+        def write():
+            validated: Optional[str] = None
+            try:
+                if incremental:
+                    storage.update(to, changes, current, self._set_save_progress)
+                else:
+                    validated = storage.save(
+                        to,
+                        model,
+                        current_index=current_index,
+                        progress=self._set_save_progress,
+                    )
+                # changes are now saved, and journal of another file dropped
+                self._journal.rebase(to, written, validated)
+            finally:
+                self._journal.writing.release()
+
+        if not background:
+            write()
+            self._saved(to)
+            return
+
+        self._save_progress = 0.0
+        self._saving = self._executor.submit(write)
+        self._saving_to = to
+        self._poll_save()
+
+    def _set_save_progress(self, fraction: float):
+        # read from Tk thread, which polls it
+        self._save_progress = fraction
+
+    def _poll_save(self):
+        if self._saving is None:  # already done while waiting for it
+            return
+
+        if not self._saving.done():
+            self._view.show_progress(self._save_progress)
+            self._view.after(SAVE_POLL_INTERVAL, self._poll_save)
+            return
 
-        self.last_save_path = to
+        saving, self._saving = self._saving, None
+        to = self._saving_to
+        try:
+            saving.result()
+        except Exception as e:
+            self._next_save = None
+            self._view.show_progress(None)
+            self._view.show_error("Project not saved", f"{to.name}: {e}")
+            return
+
+        self._saved(to)
+
+        next_save, self._next_save = self._next_save, None
+        if next_save is not None:
+            self.save(next_save, background=True)
+
+    def _saved(self, to: pathlib.Path):
+        self.last_save_path: pathlib.Path = to
         self._view.mark_saved(to.name)
 
+        # changes made while saving are still to be saved
+        if self._journal.operations != []:
+            self._view.mark_unsaved()
+
+    def _wait_for_save(self):
+        while self._saving is not None:
+            futures.wait([self._saving])
+            self._poll_save()
+
+    @timing.timed
     def load(self, source: pathlib.Path):
-        model, current_index = storage.load(source)
+        self._wait_for_save()
+
+        changes: List[operations.Operation] = []
+        previous = self._journal
+
+        # closed first so that all its operations are replayed when loading it
+        previous.close()
+        try:
+            model, current_index = storage.load(source, changes=changes, lazy=True)
+        except BaseException:
+            self._journal = journal.Journal(previous.project, previous.operations)
+            raise
 
         self._init(model=model)
 
+        # images of watched directories missing from the new project are added
+        if self._watcher is not None:
+            self._watcher.sync()
+
         if current_index is not None:
             self.set_current_image(self.images[current_index])
+
+        # operations journaled before a crash are kept journaled
+        self._journal = journal.Journal(source, changes)
+
         self._view.mark_saved(source.name)
+        if changes != []:
+            self._view.mark_unsaved()
 
     def run(self):
         self._view.run()
 
+        if self._watcher is not None:
+            self._watcher.stop()
+
+        self._wait_for_save()
+        self._executor.shutdown()
+        self._journal.close()
+
     class ImageAlreadyPresent(Exception):
         def __init__(self, image: Image):
             super().__init__(f"{image.path.name} is already present")
@@ -1,6 +1,55 @@
 from enum import auto, Enum
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+Callback = Callable[[], None]
 
 
 class Event(Enum):
     IMAGES_CHANGED = auto()
+    TAGS_CHANGED = auto()
     CURRENT_IMAGE_CHANGED = auto()
+    CURRENT_IMAGE_TAGS_CHANGED = auto()
+
+
+class EventBus:
+    """Calls subscribers of published events, at most once per idle cycle.
+
+    Subscribers are called in the order they first subscribed, when schedule runs
+    flush, however many of their events were published meanwhile. Immediate
+    subscribers are instead called on each publication.
+    """
+
+    def __init__(self, schedule: Callable[[Callback], Any]):
+        self._schedule = schedule
+
+        self._subscribers: Dict[Event, List[Tuple[Callback, bool]]] = {
+            event: [] for event in Event
+        }
+        self._order: Dict[Callback, int] = {}
+
+        self._pending: Set[Callback] = set()
+        self._scheduled = False
+
+    def subscribe(self, event: Event, callback: Callback, immediate: bool = False):
+        self._subscribers[event].append((callback, immediate))
+        self._order.setdefault(callback, len(self._order))
+
+    def publish(self, event: Event):
+        for callback, immediate in self._subscribers[event]:
+            if immediate:
+                callback()
+            else:
+                self._pending.add(callback)
+
+        if self._pending and not self._scheduled:
+            self._scheduled = True
+            self._schedule(self.flush)
+
+    def flush(self):
+        pending = sorted(self._pending, key=self._order.__getitem__)
+
+        self._pending.clear()
+        self._scheduled = False
+
+        for callback in pending:
+            callback()
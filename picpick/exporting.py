@@ -0,0 +1,162 @@
+"""Export of images tags, streamed one image at a time.
+
+Rows are written as images are iterated over in display order, so that output
+never needs to be held in memory whatever the amount of images.
+"""
+import csv
+import gzip
+import io
+import json
+import pathlib
+
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional
+
+from . import query
+from .model import Image, Model, Tag
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # optional dependency, only required for zstd compression
+    zstandard = None
+
+CSV = 'csv'
+JSONL = 'jsonl'
+COCO = 'coco'
+
+FORMATS = (CSV, JSONL, COCO)
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+COMPRESSIONS = (GZIP, ZSTD)
+
+_SUFFIXES = {'.gz': GZIP, '.zst': ZSTD}
+
+TAGS_SEPARATOR = ';'  # between tag names of a CSV row
+
+
+class Selection:
+    """Images in display order, only those matching query text if given.
+
+    Can be iterated over several times. Raises query.QuerySyntaxError if text is
+    not a valid query.
+    """
+
+    def __init__(self, model: Model, text: str = ''):
+        plan = query.parse(text)
+
+        self._order = model.order
+        self._matching = None if plan is None else plan.evaluate(model.index)
+
+    def __iter__(self) -> Iterator[Image]:
+        if self._matching is None:
+            return iter(self._order)
+        return (image for image in self._order if image in self._matching)
+
+
+class CompressionUnavailable(Exception):
+    def __init__(self, compression: str, package: str):
+        super().__init__(f"{compression} compression requires {package} installed")
+
+
+def _names(tags: Iterable[Tag]) -> List[str]:
+    return sorted(tag.name for tag in tags)
+
+
+def write_csv(f: IO[str], model: Model, images: Iterable[Image]):
+    writer = csv.writer(f)
+    writer.writerow(('path', 'tags'))
+
+    for image in images:
+        writer.writerow((str(image.path), TAGS_SEPARATOR.join(_names(image.tags))))
+
+
+def write_jsonl(f: IO[str], model: Model, images: Iterable[Image]):
+    for image in images:
+        record = {'path': str(image.path), 'tags': _names(image.tags)}
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def write_coco(f: IO[str], model: Model, images: Iterable[Image]):
+    """Write images as in COCO datasets, their tags as categories of annotations
+    without any bounding box."""
+    tags = sorted(model.tags, key=lambda tag: tag.name)
+    categories = {tag: i for i, tag in enumerate(tags, start=1)}
+
+    f.write('{"categories": [')
+    _write_items(f, ({'id': i, 'name': tag.name} for tag, i in categories.items()))
+
+    f.write('], "images": [')
+    _write_items(
+        f,
+        (
+            {'id': i, 'file_name': str(image.path)}
+            for i, image in enumerate(images, start=1)
+        ),
+    )
+
+    # images are iterated over again rather than their annotations kept
+    annotations = (
+        {'image_id': i, 'category_id': categories[tag]}
+        for i, image in enumerate(images, start=1)
+        for tag in sorted(image.tags, key=lambda tag: tag.name)
+    )
+
+    f.write('], "annotations": [')
+    _write_items(f, ({'id': i, **item} for i, item in enumerate(annotations, start=1)))
+    f.write(']}\n')
+
+
+def _write_items(f: IO[str], items: Iterable[dict]):
+    for i, item in enumerate(items):
+        if i > 0:
+            f.write(', ')
+        f.write(json.dumps(item, ensure_ascii=False))
+
+
+WRITERS: Dict[str, Callable[[IO[str], Model, Iterable[Image]], None]] = {
+    CSV: write_csv,
+    JSONL: write_jsonl,
+    COCO: write_coco,
+}
+
+
+def compression_of(path: pathlib.Path) -> Optional[str]:
+    """Compression implied by suffix of path, if any."""
+    return _SUFFIXES.get(path.suffix)
+
+
+def open_output(path: pathlib.Path, compression: Optional[str]) -> IO[str]:
+    """Open path for writing text, compressed as given.
+
+    Raises CompressionUnavailable if zstd compression is required without
+    zstandard installed.
+    """
+    if compression == GZIP:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+
+    if compression == ZSTD:
+        if zstandard is None:
+            raise CompressionUnavailable(ZSTD, 'zstandard')
+
+        compressed = zstandard.ZstdCompressor().stream_writer(path.open('wb'))
+        return io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+
+    return path.open('w', encoding='utf-8', newline='')
+
+
+def export(
+    destination: pathlib.Path,
+    model: Model,
+    format: str,
+    text: str = '',
+    compression: Optional[str] = None,
+):
+    """Write tags of images matching query text to destination, in given format."""
+    assert format in FORMATS
+    assert compression is None or compression in COMPRESSIONS
+
+    selection = Selection(model, text)  # invalid query raises before writing
+
+    with open_output(destination, compression) as f:
+        WRITERS[format](f, model, selection)
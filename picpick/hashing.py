@@ -0,0 +1,210 @@
+"""Perceptual hashes of images, close to each other when images look alike.
+
+Hashes are 64 bits long, and compared by the number of bits they differ by, as
+indexed by index.HashIndex. Images are decoded in other processes, as many at once
+as fit in a chunk, whose hashes are computed together as arrays when NumPy is
+installed.
+"""
+import concurrent.futures
+import functools
+import math
+import pathlib
+
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from PIL import Image as PILImage  # type: ignore
+
+from . import imaging, operations
+from .model import Image, Model
+
+try:
+    import numpy  # type: ignore
+except ImportError:  # optional dependency, hashes are computed in pure Python then
+    numpy = None  # type: ignore
+
+AHASH = 'ahash'  # pixels brighter than average
+DHASH = 'dhash'  # pixels brighter than their right neighbour
+PHASH = 'phash'  # lowest frequencies of the cosine transform above their median
+
+KINDS = (AHASH, DHASH, PHASH)
+DEFAULT_KIND = PHASH  # the one stored in projects, most robust to edits
+
+HASH_SIZE = 8  # bits per side of the square a hash is made of
+PHASH_SIZE = 32  # pixels per side of images whose cosine transform is computed
+
+NEAR_DISTANCE = 10  # bits at most between hashes of near-duplicate images
+
+CHUNK_SIZE = 256  # images sent at once to a process hashing them
+
+Pixels = List[List[int]]  # rows of grayscale values
+
+
+class Hashed(NamedTuple):
+    hashed: int
+    unreadable: List[pathlib.Path]
+
+
+def _shape(kind: str) -> Tuple[int, int]:
+    # width and height images are reduced to
+    if kind == DHASH:
+        return HASH_SIZE + 1, HASH_SIZE
+    if kind == PHASH:
+        return PHASH_SIZE, PHASH_SIZE
+    return HASH_SIZE, HASH_SIZE
+
+
+def _pixels(path: pathlib.Path, kind: str) -> Optional[bytes]:
+    width, height = _shape(kind)
+
+    try:
+        # decoded at a reduced scale where possible, still larger than needed
+        decoded = imaging.decode(path, (2 * width, 2 * height))
+        image = decoded.image.convert('L').resize((width, height), PILImage.LANCZOS)
+    except (OSError, ValueError):
+        return None
+
+    return image.tobytes()
+
+
+def _rows(data: bytes, width: int) -> Pixels:
+    return [list(row) for row in zip(*[iter(data)] * width)]
+
+
+def _bits(bits: Iterable[bool]) -> int:
+    value = 0
+    for bit in bits:
+        value = value << 1 | bit
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def _cosines(count: int, size: int) -> List[List[float]]:
+    # first count rows of the type II cosine transform matrix, left unscaled as
+    # only the order of coefficients matters
+    return [
+        [math.cos(math.pi * (2 * i + 1) * k / (2 * size)) for i in range(size)]
+        for k in range(count)
+    ]
+
+
+def _product(
+    a: Sequence[Sequence[float]], b: Sequence[Sequence[float]]
+) -> List[List[float]]:
+    columns = list(zip(*b))
+    return [
+        [sum(x * y for x, y in zip(row, column)) for column in columns] for row in a
+    ]
+
+
+def ahash(pixels: Pixels) -> int:
+    values = [value for row in pixels for value in row]
+    mean = sum(values) / len(values)
+    return _bits(value > mean for value in values)
+
+
+def dhash(pixels: Pixels) -> int:
+    return _bits(left < right for row in pixels for left, right in zip(row, row[1:]))
+
+
+def phash(pixels: Pixels) -> int:
+    cosines = _cosines(HASH_SIZE, len(pixels))
+    transformed = _product(_product(cosines, pixels), list(map(list, zip(*cosines))))
+
+    values = [value for row in transformed for value in row]
+    median = sorted(values)[len(values) // 2]
+    return _bits(value > median for value in values)
+
+
+HASHES: Dict[str, Callable[[Pixels], int]] = {AHASH: ahash, DHASH: dhash, PHASH: phash}
+
+
+def _hash_arrays(data: List[bytes], kind: str) -> List[int]:
+    width, height = _shape(kind)
+    pixels = numpy.frombuffer(b''.join(data), dtype=numpy.uint8)
+    pixels = pixels.reshape(len(data), height, width).astype(numpy.float64)
+
+    if kind == AHASH:
+        bits = pixels > pixels.mean(axis=(1, 2), keepdims=True)
+    elif kind == DHASH:
+        bits = pixels[:, :, :-1] < pixels[:, :, 1:]
+    else:
+        cosines = numpy.array(_cosines(HASH_SIZE, PHASH_SIZE))
+        transformed = cosines @ pixels @ cosines.T
+        values = transformed.reshape(len(data), -1)
+
+        # same median as in pure Python, the upper one of an even count of values
+        median = numpy.sort(values, axis=1)[:, values.shape[1] // 2]
+        bits = values > median[:, numpy.newaxis]
+
+    packed = numpy.packbits(bits.reshape(len(data), -1), axis=1)
+    return [int(value) for value in packed.view('>u8').ravel()]
+
+
+def hash_chunk(paths: List[pathlib.Path], kind: str) -> List[Optional[int]]:
+    """Hashes of images at paths, None for those which cannot be decoded."""
+    width, _ = _shape(kind)
+    data = [_pixels(path, kind) for path in paths]
+    decoded = [pixels for pixels in data if pixels is not None]
+
+    if numpy is not None and decoded != []:
+        hashes = iter(_hash_arrays(decoded, kind))
+    else:
+        hashes = (HASHES[kind](_rows(pixels, width)) for pixels in decoded)
+
+    return [None if pixels is None else next(hashes) for pixels in data]
+
+
+def hash_images(
+    paths: Iterable[pathlib.Path],
+    kind: str = DEFAULT_KIND,
+    processes: Optional[int] = None,
+) -> Iterator[Tuple[pathlib.Path, Optional[int]]]:
+    """Paths along with hashes of their images, in the same order."""
+    assert kind in KINDS
+
+    paths = list(paths)
+    chunks = []
+    for start in range(0, len(paths), CHUNK_SIZE):
+        stop = start + CHUNK_SIZE
+        chunks.append(paths[start:stop])
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        for chunk, hashes in zip(
+            chunks, executor.map(functools.partial(hash_chunk, kind=kind), chunks)
+        ):
+            yield from zip(chunk, hashes)
+
+
+def hash_model(
+    model: Model,
+    images: Iterable[Image],
+    record: Callable[[operations.Operation], None],
+    processes: Optional[int] = None,
+) -> Hashed:
+    """Set hashes of images of model, and record the operations performed."""
+    images = list(images)
+    hashed = 0
+    unreadable: List[pathlib.Path] = []
+
+    for image, (path, value) in zip(
+        images, hash_images((image.path for image in images), processes=processes)
+    ):
+        if value is None:
+            unreadable.append(path)
+            continue
+
+        model.set_hash(image, value)
+        record(operations.HashImage(path=path, hash=value))
+        hashed += 1
+
+    return Hashed(hashed=hashed, unreadable=unreadable)
@@ -0,0 +1,232 @@
+import collections
+import concurrent.futures
+import os
+import pathlib
+import threading
+
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from PIL import Image  # type: ignore
+
+Size = Tuple[int, int]
+
+# keep final resampling at least this many times larger than the result, as
+# integer reduction alone is of lower quality than a proper resampling
+REDUCING_GAP = 2
+
+
+class Decoded(NamedTuple):
+    image: Image.Image
+    size: Size  # of the file, image may have been decoded at a lower scale
+
+    def covers(self, box: Optional[Size]) -> bool:
+        if box is None:
+            return self.image.size == self.size
+
+        width, height = fit(self.size, box)
+        return self.image.width >= width and self.image.height >= height
+
+
+Entry = Tuple[int, Decoded]
+
+
+def modification_time(path: pathlib.Path) -> int:
+    return os.stat(path).st_mtime_ns
+
+
+def memory_size(image: Image.Image) -> int:
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+def fit(size: Size, box: Size) -> Size:
+    """Largest size with same aspect ratio fitting in box, never larger than size."""
+    width, height = size
+    box_width, box_height = box
+
+    if width <= box_width and height <= box_height:
+        return size
+
+    scale = min(box_width / width, box_height / height)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def decode(path: pathlib.Path, box: Optional[Size] = None) -> Decoded:
+    """Decode image file, at the lowest scale still covering box if given."""
+    image = Image.open(path)
+    size = image.size
+
+    if box is not None:
+        # no-op for formats other than JPEG, whose decoder can downscale by 1/2,
+        # 1/4 or 1/8 for a fraction of the cost of a full decoding
+        image.draft(image.mode, fit(size, box))
+
+    image.load()
+    return Decoded(image=image, size=size)
+
+
+def _resizable(image: Image.Image) -> Image.Image:
+    # reduction is not implemented for these modes, nor resampling for 16 bits
+    if image.mode == 'P':
+        return image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    if image.mode == '1':
+        return image.convert('L')
+    if image.mode.startswith('I;16'):
+        return image.convert('I')
+    return image
+
+
+def thumbnail(
+    image: Image.Image, box: Size, resample: int = Image.ANTIALIAS
+) -> Image.Image:
+    size = fit(image.size, box)
+
+    if size == image.size:
+        return image
+
+    image = _resizable(image)
+
+    factor = min(
+        image.width // (size[0] * REDUCING_GAP),
+        image.height // (size[1] * REDUCING_GAP),
+    )
+    if factor > 1:
+        image = image.reduce(factor)
+
+    return image.resize(size, resample)
+
+
+class ImageCache:
+    """Least recently used cache of decoded images, bounded by their memory size.
+
+    Entries are keyed by path and modification time, so that files edited on disk
+    are decoded again. The cache can be shared between threads.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+
+        self._entries: 'collections.OrderedDict[pathlib.Path, Entry]'
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: pathlib.Path) -> bool:
+        try:
+            mtime = modification_time(path)
+        except OSError:
+            return False
+
+        with self._lock:
+            return path in self._entries and self._entries[path][0] == mtime
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get(self, path: pathlib.Path, box: Optional[Size] = None) -> Optional[Decoded]:
+        """Cached image, provided it was decoded at a scale covering box."""
+        with self._lock:
+            if path not in self:
+                return None
+
+            self._entries.move_to_end(path)
+            decoded = self._entries[path][1]
+
+        return decoded if decoded.covers(box) else None
+
+    def put(self, path: pathlib.Path, decoded: Decoded):
+        mtime = modification_time(path)
+        size = memory_size(decoded.image)
+
+        with self._lock:
+            self.discard(path)
+
+            # never evict everything for an image that would not fit anyway
+            if size > self.max_bytes:
+                return
+
+            self._entries[path] = (mtime, decoded)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= memory_size(evicted.image)
+
+    def discard(self, path: pathlib.Path):
+        with self._lock:
+            if path in self._entries:
+                _, decoded = self._entries.pop(path)
+                self._bytes -= memory_size(decoded.image)
+
+    def load(self, path: pathlib.Path, box: Optional[Size] = None) -> Decoded:
+        decoded = self.get(path, box)
+
+        if decoded is None:
+            decoded = decode(path, box)
+            self.put(path, decoded)
+        return decoded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+Rendering = Tuple[Decoded, Image.Image]
+
+
+class Loader:
+    """Decodes and resizes images on worker threads.
+
+    Images to display and images to prefetch are handled by distinct workers, so
+    that prefetching never delays what the user is waiting for.
+    """
+
+    def __init__(self, cache: ImageCache):
+        self._cache = cache
+
+        self._display = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._background = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        self._prefetching: List[concurrent.futures.Future] = []
+
+    def render(
+        self, path: pathlib.Path, box: Size, decoded: Optional[Decoded] = None
+    ) -> 'concurrent.futures.Future[Rendering]':
+        """Decode image unless already decoded at a sufficient scale, then resize it
+        to fit in box."""
+        return self._display.submit(self._render, path, box, decoded)
+
+    def _render(
+        self, path: pathlib.Path, box: Size, decoded: Optional[Decoded]
+    ) -> Rendering:
+        if decoded is None or not decoded.covers(box):
+            decoded = self._cache.load(path, box)
+        return decoded, thumbnail(decoded.image, box)
+
+    def prefetch(self, paths: Iterable[pathlib.Path], box: Optional[Size] = None):
+        # previous prefetching requests are obsolete, skip them if not started yet
+        for future in self._prefetching:
+            future.cancel()
+
+        self._prefetching = [
+            self._background.submit(self._prefetch, path, box) for path in paths
+        ]
+
+    def _prefetch(self, path: pathlib.Path, box: Optional[Size]):
+        try:
+            self._cache.load(path, box)
+        except OSError:
+            pass  # unreadable files are reported once actually displayed
+
+    def shutdown(self):
+        for future in self._prefetching:
+            future.cancel()
+
+        self._display.shutdown(wait=False)
+        self._background.shutdown(wait=False)
@@ -0,0 +1,135 @@
+"""Import of whole directory trees of images into a project.
+
+Directories are listed concurrently, as listing them mostly waits for the disk,
+while files are recognized as images by reading their header in other processes,
+as doing so mostly waits for the interpreter. Images are then added at once.
+"""
+import concurrent.futures
+import os
+import pathlib
+
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from PIL import Image as PILImage  # type: ignore
+
+from . import hashing, operations, storage
+from .model import Image
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.pgm', '.pbm', '.ppm')
+
+SCAN_WORKERS = 16  # directories listed at once
+VERIFY_CHUNK_SIZE = 256  # files sent at once to a process recognizing images
+
+
+class Imported(NamedTuple):
+    added: int
+    present: int  # already in project
+    invalid: List[pathlib.Path]  # not images, despite their extension
+    unhashed: List[pathlib.Path]  # added, but whose hash could not be computed
+
+
+def has_image_extension(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in EXTENSIONS
+
+
+def _list(directory: pathlib.Path) -> Tuple[List[pathlib.Path], List[pathlib.Path]]:
+    files: List[pathlib.Path] = []
+    directories: List[pathlib.Path] = []
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(pathlib.Path(entry.path))
+            elif entry.is_file() and has_image_extension(entry.name):
+                files.append(pathlib.Path(entry.path))
+
+    return files, directories
+
+
+def scan(
+    roots: Iterable[pathlib.Path], recursive: bool = False
+) -> Iterator[pathlib.Path]:
+    """Files with an image extension in roots, or in their whole tree if recursive.
+
+    Files are yielded as their directory is listed, hence in no particular order,
+    and only once even if roots overlap.
+    """
+    listed: Set[pathlib.Path] = set()
+
+    with concurrent.futures.ThreadPoolExecutor(SCAN_WORKERS) as executor:
+        pending: Set[concurrent.futures.Future] = set()
+
+        def submit(directories: Iterable[pathlib.Path]):
+            for directory in directories:
+                if directory not in listed:
+                    listed.add(directory)
+                    pending.add(executor.submit(_list, directory))
+
+        submit(root.resolve() for root in roots)
+
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                pending.remove(future)
+
+                files, directories = future.result()
+                yield from files
+
+                if recursive:
+                    submit(directories)
+
+
+def is_image(path: pathlib.Path) -> bool:
+    # only the header is read, image data is decoded once displayed
+    try:
+        with PILImage.open(path):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+def verify(
+    paths: Iterable[pathlib.Path], processes: Optional[int] = None
+) -> Iterator[Tuple[pathlib.Path, bool]]:
+    """Paths along with whether they are images, in the same order."""
+    paths = list(paths)
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        yield from zip(
+            paths, executor.map(is_image, paths, chunksize=VERIFY_CHUNK_SIZE)
+        )
+
+
+def import_images(
+    project: pathlib.Path,
+    roots: Iterable[pathlib.Path],
+    recursive: bool = False,
+    hash: bool = False,
+) -> Imported:
+    """Add images found in roots to project, creating it if needed, along with
+    their perceptual hash if required."""
+    images: List[Image] = []
+    invalid: List[pathlib.Path] = []
+    unhashed: List[pathlib.Path] = []
+    present = 0
+
+    with storage.edited(project) as (model, changes):
+        for path, valid in verify(scan(roots, recursive)):
+            if not valid:
+                invalid.append(path)
+            elif model.image_at(path) is not None:
+                present += 1
+            else:
+                images.append(Image(path=path))
+
+        model.add_images(images)
+        changes.extend(operations.AddImage(path=image.path) for image in images)
+
+        if hash:
+            unhashed = hashing.hash_model(model, images, changes.append).unreadable
+
+    return Imported(
+        added=len(images), present=present, invalid=invalid, unhashed=unhashed
+    )
@@ -0,0 +1,518 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import operator
+
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+    TypeVar,
+    overload,
+)
+
+if TYPE_CHECKING:  # required to prevent circular imports
+    from .model import Image, Tag
+
+T = TypeVar('T', bound=Hashable)
+
+BLOCK_SIZE = 1000  # items of sorted index blocks, split in two once twice larger
+BULK_SIZE = 1000  # items added at once beyond which views are rebuilt
+
+HASH_BLOCKS = 4  # of 16 bits, hashes are indexed by
+
+_HASH_BLOCK_MASK = (1 << 64 // HASH_BLOCKS) - 1
+_HASH_BLOCK_SHIFTS = range(0, 64, 64 // HASH_BLOCKS)
+
+
+class _Block(Generic[T]):
+    __slots__ = ('items', 'keys', 'number')
+
+    def __init__(self, items: List[T], keys: List[Any]):
+        self.items = items
+        self.keys = keys
+        self.number = 0  # position among blocks, as of last computed offsets
+
+
+class SortedIndex(Sequence[T]):
+    """Items sorted by key, kept in blocks of at most twice BLOCK_SIZE items.
+
+    Adding or removing an item bisects blocks by their last key, then shifts the
+    items of a single block, in O(log n + BLOCK_SIZE). Items are looked up by
+    position from the offsets of blocks, and positions of items from their block
+    and its offset, both in O(log n + BLOCK_SIZE). Offsets are computed again after
+    mutations once needed, in O(n / BLOCK_SIZE).
+    """
+
+    def __init__(self, items: Iterable[T], key: Callable[[T], Any]):
+        self._key = key
+
+        if isinstance(items, SortedIndex) and items._key is key:
+            # already sorted, and keys already computed
+            self._build(
+                list(items),
+                [key for block in items._blocks for key in block.keys],
+            )
+        else:
+            ordered = sorted(items, key=key)
+            self._build(ordered, [key(item) for item in ordered])
+
+    def _build(self, items: List[T], keys: List[Any]):
+        self._blocks: List[_Block[T]] = []
+        self._maxes: List[Any] = []  # last key of each block
+        self._members: Dict[T, _Block[T]] = {}
+
+        for start in range(0, len(items), BLOCK_SIZE):
+            stop = start + BLOCK_SIZE
+            block = _Block(items[start:stop], keys[start:stop])
+
+            self._blocks.append(block)
+            self._maxes.append(block.keys[-1])
+            self._members.update(dict.fromkeys(block.items, block))
+
+        self._offsets: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    @overload
+    def __getitem__(self, i: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[T]:
+        ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index out of range")
+
+        offsets = self._offsets_of_blocks()
+        number = bisect.bisect_right(offsets, i) - 1
+        return self._blocks[number].items[i - offsets[number]]
+
+    def __iter__(self) -> Iterator[T]:
+        for block in self._blocks:
+            yield from block.items
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SortedIndex):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._members
+
+    def _offsets_of_blocks(self) -> List[int]:
+        if self._offsets is None:
+            offsets = []
+            count = 0
+            for number, block in enumerate(self._blocks):
+                block.number = number
+                offsets.append(count)
+                count += len(block.items)
+            self._offsets = offsets
+        return self._offsets
+
+    def _locate(self, item: T) -> Tuple[_Block[T], int]:
+        # block of item and position in it, only items with an equal key being
+        # looked through
+        block = self._members[item]
+        position = bisect.bisect_left(block.keys, self._key(item))
+        while block.items[position] != item:
+            position += 1
+        return block, position
+
+    def index(self, item: Any, start: int = 0, stop: Optional[int] = None) -> int:
+        if item not in self._members:
+            raise ValueError(f"{item!r} is not in index")
+
+        offsets = self._offsets_of_blocks()
+        block, position = self._locate(item)
+        position += offsets[block.number]
+
+        if position < start or (stop is not None and position >= stop):
+            raise ValueError(f"{item!r} is not in range")
+        return position
+
+    def add(self, item: T) -> int:
+        """Insert item after those with an equal key, and return its position."""
+        assert item not in self._members
+
+        key = self._key(item)
+
+        if self._blocks == []:
+            self._build([item], [key])
+            return 0
+
+        offsets = self._offsets_of_blocks()
+
+        # first block whose items are not all before item, or last one
+        number = min(bisect.bisect_right(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[number]
+        position = bisect.bisect_right(block.keys, key)
+
+        block.items.insert(position, item)
+        block.keys.insert(position, key)
+        self._maxes[number] = block.keys[-1]
+        self._members[item] = block
+
+        if len(block.items) > 2 * BLOCK_SIZE:
+            self._split(number)
+
+        self._offsets = None
+        return offsets[number] + position
+
+    def _split(self, number: int):
+        # into blocks of BLOCK_SIZE to twice as many items, once larger
+        block = self._blocks[number]
+        count = len(block.items) // BLOCK_SIZE
+        if count < 2:
+            return
+
+        bounds = [len(block.items) * i // count for i in range(count + 1)]
+        halves = []
+        for start, stop in zip(bounds[1:], bounds[2:]):
+            half = _Block(block.items[start:stop], block.keys[start:stop])
+            self._members.update(dict.fromkeys(half.items, half))
+            halves.append(half)
+
+        kept = bounds[1]
+        del block.items[kept:]
+        del block.keys[kept:]
+
+        following = slice(number + 1, number + 1)
+        self._blocks[following] = halves
+        self._maxes[number] = block.keys[-1]
+        self._maxes[following] = [half.keys[-1] for half in halves]
+
+    def is_bulk(self, count: int) -> bool:
+        """Whether count items are many to add at once, e.g. so that views of the
+        index are rebuilt rather than updated for each of them."""
+        return count > min(len(self), BULK_SIZE)
+
+    def update(self, items: Iterable[T]):
+        """Add many items, merged at once into the blocks they belong to."""
+        first = operator.itemgetter(0)
+        keyed = sorted(((self._key(item), item) for item in items), key=first)
+
+        count = len(self._members) + len(keyed)
+
+        if self._blocks == []:
+            self._build([item for _, item in keyed], [key for key, _ in keyed])
+            return
+
+        keys = [key for key, _ in keyed]
+
+        # items added to each block, those before the last key of a block being
+        # added to it, and all remaining ones to the last block
+        added: List[Tuple[int, List[Tuple[Any, T]]]] = []
+        start = 0
+        for number, maximum in enumerate(self._maxes):
+            if number == len(self._maxes) - 1:
+                stop = len(keyed)
+            else:
+                stop = bisect.bisect_left(keys, maximum, start)
+
+            if stop > start:
+                added.append((number, keyed[start:stop]))
+            start = stop
+
+        # last blocks first, so that numbers of the others are unchanged
+        for number, pairs in reversed(added):
+            block = self._blocks[number]
+
+            if len(pairs) <= BLOCK_SIZE:
+                position = 0
+                for key, item in pairs:
+                    # after those with an equal key, hence after previous ones
+                    position = bisect.bisect_right(block.keys, key, position)
+                    block.keys.insert(position, key)
+                    block.items.insert(position, item)
+            else:
+                # sorting merges both already sorted runs in linear time,
+                # keeping added items after those with an equal key
+                merged = sorted([*zip(block.keys, block.items), *pairs], key=first)
+                block.keys = [key for key, _ in merged]
+                block.items = [item for _, item in merged]
+
+            self._members.update((item, block) for _, item in pairs)
+            self._maxes[number] = block.keys[-1]
+            self._split(number)
+
+        assert len(self._members) == count, "items already in index"
+        self._offsets = None
+
+    def remove(self, item: T) -> int:
+        """Remove item, and return the position it had."""
+        if item not in self._members:
+            raise ValueError(f"{item!r} is not in index")
+
+        offsets = self._offsets_of_blocks()
+        block, position = self._locate(item)
+        number = block.number
+
+        del block.items[position]
+        del block.keys[position]
+        del self._members[item]
+
+        if block.items == []:
+            del self._blocks[number]
+            del self._maxes[number]
+        else:
+            self._maxes[number] = block.keys[-1]
+
+        self._offsets = None
+        return offsets[number] + position
+
+
+class LazyIndex(Sequence[T]):
+    """Items already sorted, each created from its position once first accessed.
+
+    Only created items can be looked up, which is enough since no reference to the
+    others exists yet. Displaying some items hence never creates all of them.
+    """
+
+    def __init__(self, count: int, create: Callable[[int], T]):
+        self._count = count
+        self._create = create
+
+        self._created: Dict[int, T] = {}
+        self._positions: Dict[T, int] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, i: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[T]:
+        ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("index out of range")
+
+        try:
+            return self._created[i]
+        except KeyError:
+            pass
+
+        item = self._create(i)
+        self._created[i] = item
+        self._positions[item] = i
+        return item
+
+    def __iter__(self) -> Iterator[T]:
+        for i in range(self._count):
+            yield self[i]
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._positions
+
+    def index(self, item: Any, start: int = 0, stop: Optional[int] = None) -> int:
+        try:
+            position = self._positions[item]
+        except KeyError:
+            raise ValueError(f"{item!r} is not in index") from None
+
+        if position < start or (stop is not None and position >= stop):
+            raise ValueError(f"{item!r} is not in range")
+        return position
+
+
+class TagIndex:
+    """Images of each tag, tags matching a word and images by amount of tags.
+
+    Kept up to date by the model mutations, so that filtering resolves to set
+    operations instead of looking through every image.
+    """
+
+    def __init__(self, images: Iterable[Image], tags: Iterable[Tag]):
+        self._images: Dict[Tag, Set[Image]] = {tag: set() for tag in tags}
+
+        self._counts: Dict[Image, int] = {}
+        self._by_count: Dict[int, Set[Image]] = {}
+
+        self._matching: Dict[str, List[Tag]] = {}
+
+        for image in images:
+            self.add_image(image)
+
+    @property
+    def tags(self) -> AbstractSet[Tag]:
+        return self._images.keys()
+
+    @property
+    def images(self) -> AbstractSet[Image]:
+        return self._counts.keys()
+
+    def tagged(self, tag: Tag) -> AbstractSet[Image]:
+        return self._images.get(tag, frozenset())
+
+    def counted(self, count: int) -> AbstractSet[Image]:
+        """Images having exactly count tags."""
+        return self._by_count.get(count, frozenset())
+
+    def matching(self, word: str) -> List[Tag]:
+        """Tags whose name contains word."""
+        # names are looked through once per word, until tags change
+        try:
+            return self._matching[word]
+        except KeyError:
+            pass
+
+        tags = [tag for tag in self._images if word in tag.name]
+        self._matching[word] = tags
+        return tags
+
+    def _count(self, image: Image, delta: int):
+        count = self._counts[image]
+
+        self._by_count[count].discard(image)
+        self._by_count.setdefault(count + delta, set()).add(image)
+        self._counts[image] = count + delta
+
+    def add(self, image: Image, tag: Tag):
+        if tag not in self._images:
+            self.add_tag(tag)
+
+        if image not in self._counts:
+            self._counts[image] = 0
+            self._by_count.setdefault(0, set()).add(image)
+
+        if image not in self._images[tag]:
+            self._images[tag].add(image)
+            self._count(image, 1)
+
+    def discard(self, image: Image, tag: Tag):
+        if image in self._images.get(tag, ()):
+            self._images[tag].remove(image)
+            self._count(image, -1)
+
+    def add_image(self, image: Image):
+        if image in self._counts:
+            return
+
+        self._counts[image] = 0
+        self._by_count.setdefault(0, set()).add(image)
+
+        for tag in image.tags:
+            self.add(image, tag)
+
+    def remove_image(self, image: Image):
+        for tag in image.tags:
+            self.discard(image, tag)
+
+        if image in self._counts:
+            self._by_count[self._counts.pop(image)].discard(image)
+
+    def add_tag(self, tag: Tag):
+        self._images.setdefault(tag, set())
+        self._matching.clear()
+
+    def remove_tag(self, tag: Tag):
+        for image in self._images.pop(tag, ()):
+            self._count(image, -1)
+
+        self._matching.clear()
+
+    def rename_tag(self, old: Tag, new: Tag):
+        self._images[new] = self._images.pop(old, set())
+        self._matching.clear()
+
+
+class HashIndex(Generic[T]):
+    """Items by 64 bits hash, looked up by the number of bits hashes differ by.
+
+    Hashes are split in blocks, each indexed by their value. Hashes differing by
+    radius bits at most have a block differing by radius // HASH_BLOCKS bits at
+    most, by pigeonhole principle, hence lookups only compare hashes found by
+    flipping that many bits of each block, instead of all of them.
+    """
+
+    def __init__(self, items: Iterable[Tuple[int, T]] = ()):
+        self._items: Dict[int, List[T]] = {}  # all of a same hash
+        self._blocks: List[Dict[int, List[int]]] = [{} for _ in range(HASH_BLOCKS)]
+        self._count = 0
+
+        for value, item in items:
+            self.add(value, item)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, value: int, item: T):
+        self._count += 1
+
+        items = self._items.get(value)
+        if items is not None:
+            items.append(item)
+            return
+
+        self._items[value] = [item]
+        for block, key in zip(self._blocks, _hash_blocks(value)):
+            block.setdefault(key, []).append(value)
+
+    def near(self, value: int, radius: int) -> List[T]:
+        """Items whose hash differs by radius bits at most."""
+        masks = _flips(radius // HASH_BLOCKS)
+
+        candidates: Iterable[int]
+        if len(masks) * HASH_BLOCKS >= len(self._items):
+            # fewer hashes than blocks to look up
+            candidates = self._items
+        else:
+            found: Set[int] = set()
+            for block, key in zip(self._blocks, _hash_blocks(value)):
+                for bucket in filter(None, map(block.get, [key ^ m for m in masks])):
+                    found.update(bucket)
+            candidates = found
+
+        return [
+            item
+            for candidate in candidates
+            if distance(value, candidate) <= radius
+            for item in self._items[candidate]
+        ]
+
+
+def _hash_blocks(value: int) -> List[int]:
+    return [value >> shift & _HASH_BLOCK_MASK for shift in _HASH_BLOCK_SHIFTS]
+
+
+@functools.lru_cache(maxsize=None)
+def _flips(bits: int) -> List[int]:
+    """Masks of hash blocks with at most bits set."""
+    return [
+        mask for mask in range(_HASH_BLOCK_MASK + 1) if bin(mask).count('1') <= bits
+    ]
+
+
+def distance(a: int, b: int) -> int:
+    """Number of bits hashes differ by."""
+    return bin(a ^ b).count('1')
@@ -0,0 +1,143 @@
+"""Import of tags from files written by other tools, streamed one label at a time.
+
+A label is the name of a tag given to the image at some path. Labels are read
+from CSV or JSON lines files, as exported, or from sidecar text files next to
+images, and applied without ever being held in memory all at once.
+"""
+import csv
+import gzip
+import json
+import pathlib
+
+from typing import Callable, IO, Iterable, Iterator, List, NamedTuple, Tuple
+
+from . import exporting, operations
+from .model import Image, Model, Tag
+
+Label = Tuple[pathlib.Path, str]  # path of an image, and name of one of its tags
+
+SIDECAR_SUFFIX = '.txt'  # replacing image suffix, holding names of its tags
+
+
+class UnknownFormat(ValueError):
+    def __init__(self, path: pathlib.Path):
+        super().__init__(f"Format of {path.name} is unknown, expected CSV or JSONL")
+
+
+class Applied(NamedTuple):
+    tagged: int  # tags added to images
+    created: List[Tag]
+    unresolved: int  # labels of images not in project
+
+
+def read_csv(f: IO[str], base: pathlib.Path) -> Iterator[Label]:
+    """Labels from rows with a path column, and either a tag column or a tags one
+    holding names separated as when exported.
+
+    Relative paths are relative to base, as are those of the following readers.
+    """
+    for row in csv.DictReader(f):
+        path = base / row['path']
+
+        if 'tag' in row:
+            yield path, row['tag']
+            continue
+
+        for name in row['tags'].split(exporting.TAGS_SEPARATOR):
+            if name != '':
+                yield path, name
+
+
+def read_jsonl(f: IO[str], base: pathlib.Path) -> Iterator[Label]:
+    """Labels from records with a path, and either a tag or a list of tags."""
+    for line in f:
+        if line.strip() == '':
+            continue
+
+        record = json.loads(line)
+        path = base / record['path']
+
+        if 'tag' in record:
+            yield path, record['tag']
+        else:
+            yield from ((path, name) for name in record['tags'])
+
+
+_READERS = {'.csv': read_csv, '.jsonl': read_jsonl}
+
+
+def read(path: pathlib.Path) -> Iterator[Label]:
+    """Labels in CSV or JSON lines file, possibly compressed with gzip.
+
+    Raises UnknownFormat if path extension is neither of them.
+    """
+    compressed = path.suffix == '.gz'
+    suffix = path.with_suffix('').suffix if compressed else path.suffix
+
+    try:
+        reader = _READERS[suffix]
+    except KeyError:
+        raise UnknownFormat(path) from None
+
+    # opened once iterated over, so that a format error is raised right away
+    def labels() -> Iterator[Label]:
+        if compressed:
+            f = gzip.open(path, 'rt', encoding='utf-8', newline='')
+        else:
+            f = path.open(encoding='utf-8', newline='')
+
+        with f:
+            yield from reader(f, path.resolve().parent)
+
+    return labels()
+
+
+def sidecar_for(image: Image) -> pathlib.Path:
+    return image.path.with_suffix(SIDECAR_SUFFIX)
+
+
+def read_sidecars(images: Iterable[Image]) -> Iterator[Label]:
+    """Labels in sidecar files of images, which have names of tags separated by
+    commas or lines."""
+    for image in images:
+        try:
+            text = sidecar_for(image).read_text(encoding='utf-8')
+        except FileNotFoundError:
+            continue
+
+        for line in text.splitlines():
+            for name in line.split(','):
+                if name.strip() != '':
+                    yield image.path, name.strip()
+
+
+def apply(
+    model: Model,
+    labels: Iterable[Label],
+    record: Callable[[operations.Operation], None],
+) -> Applied:
+    """Tag images of model with labels, creating missing tags, and record the
+    operations performed."""
+    tagged = 0
+    created: List[Tag] = []
+    unresolved = 0
+
+    for path, name in labels:
+        image = model.image_at(path)
+        if image is None:
+            unresolved += 1
+            continue
+
+        tag = Tag(name=name)
+
+        if tag not in model.tags:
+            model.add_tag(tag)
+            record(operations.AddTag(name=name))
+            created.append(tag)
+
+        if tag not in image.tags:
+            model.tag(image, tag)
+            record(operations.TagImage(path=image.path, name=name))
+            tagged += 1
+
+    return Applied(tagged=tagged, created=created, unresolved=unresolved)
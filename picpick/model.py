@@ -1,10 +1,18 @@
 import pathlib
+import threading
+import weakref
 
 from dataclasses import dataclass
-from typing import Set
+from typing import Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from .index import HashIndex, LazyIndex, SortedIndex, TagIndex
 
 
 class Image:
+    # perceptual hash of content, once computed, as a class attribute so that
+    # images pickled without it have none
+    hash: Optional[int] = None
+
     def __init__(self, path: pathlib.Path):
         self.path = path  # TODO: set as PK ?
         self.tags: Set[Tag] = set()
@@ -15,7 +23,270 @@ class Tag:
     name: str
 
 
+def sort_key(image: Image) -> str:
+    return image.path.name
+
+
+_INDEXES = ('_index', '_order', '_paths', '_hashes', '_distinct')
+
+
 class Model:
     def __init__(self):
         self.images: Set[Image] = set()
         self.tags: Set[Tag] = set()
+
+        self._index: Optional[TagIndex] = None
+        self._order: Optional[SortedIndex[Image]] = None
+        self._paths: Optional[Dict[pathlib.Path, Image]] = None
+        self._hashes: Optional[HashIndex[Image]] = None
+        self._distinct: Optional[Tuple[int, Set[Image]]] = None  # and radius
+
+        self._snapshots: 'weakref.WeakSet[_Copies]' = weakref.WeakSet()
+
+    def __getstate__(self):
+        # indexes are derived data, rebuilt when first needed
+        state = self.__dict__.copy()
+        for attribute in _INDEXES:
+            state.pop(attribute, None)
+        state.pop('_snapshots', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for attribute in _INDEXES:
+            setattr(self, attribute, None)
+        self._snapshots = weakref.WeakSet()
+
+    def snapshot(self) -> 'Model':
+        """Copy of images and tags, unaffected by later mutations of the model.
+
+        Only the order of images is copied right away. Each of them is copied once
+        read from the snapshot, possibly from another thread, or before being
+        mutated, whichever comes first.
+        """
+        images = list(self.order)
+        copies = _Copies()
+        self._snapshots.add(copies)  # as long as snapshot is
+
+        # same order, even between images with an equal sort key
+        return LazyModel(len(images), lambda i: copies(images[i]), self.tags)
+
+    def _preserve(self, image: Image):
+        # as it is until mutated, in snapshots still read
+        for copies in self._snapshots:
+            copies(image)
+
+    @property
+    def index(self) -> TagIndex:
+        if self._index is None:
+            self._index = TagIndex(self.images, self.tags)
+        return self._index
+
+    @property
+    def order(self) -> Sequence[Image]:
+        """Images sorted by sort_key."""
+        if self._order is None:
+            self._order = SortedIndex(self.images, key=sort_key)
+        return self._order
+
+    @property
+    def hashes(self) -> HashIndex[Image]:
+        """Hashed images."""
+        if self._hashes is None:
+            self._hashes = HashIndex(
+                (image.hash, image) for image in self.images if image.hash is not None
+            )
+        return self._hashes
+
+    def near_duplicates(self, image: Image, radius: int) -> Set[Image]:
+        """Images whose hash differs from the one of image by radius bits at most,
+        including image, none if it has no hash."""
+        if image.hash is None:
+            return set()
+        return set(self.hashes.near(image.hash, radius))
+
+    def distinct(self, radius: int) -> Set[Image]:
+        """Images without those near-duplicates of any previous one in order.
+
+        Kept until images or their hashes change, rather than looked up again.
+        """
+        if self._distinct is not None and self._distinct[0] == radius:
+            return self._distinct[1]
+
+        distinct: Set[Image] = set()
+        duplicates: Set[Image] = set()
+
+        for image in self.order:
+            if image not in duplicates:
+                distinct.add(image)
+                duplicates.update(self.near_duplicates(image, radius))
+
+        self._distinct = radius, distinct
+        return distinct
+
+    def image_at(self, path: pathlib.Path) -> Optional[Image]:
+        if self._paths is None:
+            self._paths = {image.path: image for image in self.images}
+        return self._paths.get(path)
+
+    def add_image(self, image: Image):
+        self._distinct = None
+
+        self.images.add(image)
+        self.index.add_image(image)
+
+        if self._order is not None:
+            self._order.add(image)
+        if self._paths is not None:
+            self._paths[image.path] = image
+        if self._hashes is not None and image.hash is not None:
+            self._hashes.add(image.hash, image)
+
+    def add_images(self, images: Iterable[Image]):
+        """Add many images, sorting them along with others at once."""
+        images = list(images)
+        self._distinct = None
+
+        self.images.update(images)
+        for image in images:
+            self.index.add_image(image)
+
+        if self._order is not None:
+            self._order.update(images)
+        if self._paths is not None:
+            self._paths.update((image.path, image) for image in images)
+        if self._hashes is not None:
+            for image in images:
+                if image.hash is not None:
+                    self._hashes.add(image.hash, image)
+
+    def remove_image(self, image: Image):
+        self._distinct = None
+
+        self.images.remove(image)
+        self.index.remove_image(image)
+
+        if self._order is not None:
+            self._order.remove(image)
+        if self._paths is not None:
+            del self._paths[image.path]
+        if image.hash is not None:
+            self._hashes = None  # rebuilt, as hashes cannot be removed from it
+
+    def set_hash(self, image: Image, value: int):
+        self._distinct = None
+        self._preserve(image)
+
+        if image.hash is not None:
+            self._hashes = None  # rebuilt, as hashes cannot be removed from it
+        elif self._hashes is not None:
+            self._hashes.add(value, image)
+
+        image.hash = value
+
+    def tag(self, image: Image, tag: Tag):
+        self._preserve(image)
+        image.tags.add(tag)
+        self.index.add(image, tag)
+
+    def untag(self, image: Image, tag: Tag):
+        self._preserve(image)
+        image.tags.remove(tag)
+        self.index.discard(image, tag)
+
+    def add_tag(self, tag: Tag):
+        self.tags.add(tag)
+        self.index.add_tag(tag)
+
+    def delete_tag(self, tag: Tag):
+        self.tags.remove(tag)
+
+        # only tagged images are looked through, as found by the index
+        for image in list(self.index.tagged(tag)):
+            self._preserve(image)
+            image.tags.discard(tag)
+
+        self.index.remove_tag(tag)
+
+    def rename_tag(self, old: Tag, new: Tag):
+        self.tags.remove(old)
+        self.tags.add(new)
+
+        for image in list(self.index.tagged(old)):
+            self._preserve(image)
+            image.tags.remove(old)
+            image.tags.add(new)
+
+        self.index.rename_tag(old, new)
+
+    def set_tags(self, tags: Set[Tag]):
+        removed = self.index.tags - tags
+
+        self.tags = tags
+
+        for image in self.images:
+            if not image.tags <= tags:
+                self._preserve(image)
+                image.tags.intersection_update(tags)
+
+        for tag in removed:
+            self.index.remove_tag(tag)
+        for tag in tags:
+            self.index.add_tag(tag)
+
+
+class _Copies:
+    """Copies of images, each made once from any thread."""
+
+    def __init__(self):
+        self._copies: Dict[Image, Image] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, image: Image) -> Image:
+        with self._lock:
+            copy = self._copies.get(image)
+            if copy is None:
+                copy = Image(path=image.path)
+                copy.tags = set(image.tags)
+                copy.hash = image.hash
+                self._copies[image] = copy
+            return copy
+
+
+class LazyModel(Model):
+    """Model whose images are created from their sorted position once needed.
+
+    Images are viewed in order without creating the others, e.g. to display some
+    of them. All of them are created at once the first time the whole set is
+    needed, e.g. to filter or mutate them, the model then being a plain one.
+    """
+
+    def __init__(self, count: int, create: Callable[[int], Image], tags: Iterable[Tag]):
+        super().__init__()
+
+        self.tags = set(tags)
+
+        self._lazy: LazyIndex[Image] = LazyIndex(count, create)
+        self._images: Optional[Set[Image]] = None
+
+    def __reduce__(self):
+        # pickled as the plain model it stands for
+        return Model, (), {'images': self.images, 'tags': self.tags}
+
+    @property
+    def images(self) -> Set[Image]:
+        if self._images is None:
+            self._images = set(self._lazy)
+            self._order = SortedIndex(self._lazy, key=sort_key)  # same order
+        return self._images
+
+    @images.setter
+    def images(self, images: Set[Image]):
+        self._images = images
+        self._order = None
+
+    @property
+    def order(self) -> Sequence[Image]:
+        if self._images is None:
+            return self._lazy
+        return super().order
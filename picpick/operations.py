@@ -0,0 +1,127 @@
+"""Model mutations, recorded by the controller so that projects can be written to
+disk incrementally.
+
+Images and tags are referred to by path and name, which identify them in files.
+"""
+import pathlib
+
+from dataclasses import dataclass
+from typing import Union
+
+from .model import Image, Model, Tag
+
+
+@dataclass(frozen=True)
+class AddImage:
+    path: pathlib.Path
+
+
+@dataclass(frozen=True)
+class RemoveImage:
+    path: pathlib.Path
+
+
+@dataclass(frozen=True)
+class AddTag:
+    name: str
+
+
+@dataclass(frozen=True)
+class DeleteTag:
+    name: str
+
+
+@dataclass(frozen=True)
+class RenameTag:
+    old: str
+    new: str
+
+
+@dataclass(frozen=True)
+class TagImage:
+    path: pathlib.Path
+    name: str
+
+
+@dataclass(frozen=True)
+class UntagImage:
+    path: pathlib.Path
+    name: str
+
+
+@dataclass(frozen=True)
+class HashImage:
+    path: pathlib.Path
+    hash: int
+
+
+Operation = Union[
+    AddImage,
+    RemoveImage,
+    AddTag,
+    DeleteTag,
+    RenameTag,
+    TagImage,
+    UntagImage,
+    HashImage,
+]
+
+
+def _image(model: Model, path: pathlib.Path) -> Image:
+    image = model.image_at(path)
+    if image is None:
+        raise ValueError(f"No image at {path}")
+    return image
+
+
+def _tag(model: Model, name: str) -> Tag:
+    tag = Tag(name=name)
+    if tag not in model.tags:
+        raise ValueError(f"No \"{name}\" tag")
+    return tag
+
+
+def apply(model: Model, operation: Operation):
+    """Perform operation on model.
+
+    Raises ValueError, leaving model untouched, if operation does not apply to it.
+    """
+    if isinstance(operation, AddImage):
+        if model.image_at(operation.path) is not None:
+            raise ValueError(f"{operation.path} is already present")
+        model.add_image(Image(path=operation.path))
+
+    elif isinstance(operation, RemoveImage):
+        model.remove_image(_image(model, operation.path))
+
+    elif isinstance(operation, AddTag):
+        if Tag(name=operation.name) in model.tags:
+            raise ValueError(f"\"{operation.name}\" tag is already present")
+        model.add_tag(Tag(name=operation.name))
+
+    elif isinstance(operation, DeleteTag):
+        model.delete_tag(_tag(model, operation.name))
+
+    elif isinstance(operation, RenameTag):
+        old = _tag(model, operation.old)
+        if Tag(name=operation.new) in model.tags:
+            raise ValueError(f"\"{operation.new}\" tag is already present")
+        model.rename_tag(old, Tag(name=operation.new))
+
+    elif isinstance(operation, TagImage):
+        image, tag = _image(model, operation.path), _tag(model, operation.name)
+        if tag in image.tags:
+            raise ValueError(f"{operation.path} is already tagged \"{tag.name}\"")
+        model.tag(image, tag)
+
+    elif isinstance(operation, UntagImage):
+        image, tag = _image(model, operation.path), _tag(model, operation.name)
+        if tag not in image.tags:
+            raise ValueError(f"{operation.path} is not tagged \"{tag.name}\"")
+        model.untag(image, tag)
+
+    elif isinstance(operation, HashImage):
+        model.set_hash(_image(model, operation.path), operation.hash)
+
+    else:
+        raise TypeError(f"Unknown operation {operation!r}")
@@ -0,0 +1,235 @@
+"""Tags query language, used to filter images.
+
+Words match tags whose name contains them, while quoted names match tags exactly.
+`untagged` matches images without tags and `has:N` images with exactly N tags.
+Terms combine with NOT, AND and OR, by decreasing precedence, and parentheses.
+Terms separated by spaces only are alternatives, as if joined by OR.
+
+    red AND NOT "reviewed"
+    (cat OR dog) AND has:1
+"""
+from __future__ import annotations
+
+import abc
+import functools
+import re
+
+from dataclasses import dataclass
+from typing import AbstractSet, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from .model import Tag
+
+if TYPE_CHECKING:
+    from .index import TagIndex
+    from .model import Image
+
+_TOKEN = re.compile(r'\s*(?:(?P<paren>[()])|"(?P<quoted>[^"]*)"|(?P<word>[^\s()"]+))')
+_COUNT = re.compile(r'has:(\d+)')
+
+AND = 'AND'
+OR = 'OR'
+NOT = 'NOT'
+UNTAGGED = 'untagged'
+
+
+class QuerySyntaxError(ValueError):
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} at position {position}")
+        self.position = position
+
+
+class Query(abc.ABC):
+    @abc.abstractmethod
+    def evaluate(self, index: TagIndex) -> AbstractSet[Image]:
+        ...
+
+
+@dataclass(frozen=True)
+class Word(Query):
+    text: str
+
+    def evaluate(self, index: TagIndex) -> AbstractSet[Image]:
+        tags = index.matching(self.text)
+
+        if len(tags) == 1:
+            return index.tagged(tags[0])
+        return set().union(*(index.tagged(tag) for tag in tags))
+
+
+@dataclass(frozen=True)
+class Exact(Query):
+    name: str
+
+    def evaluate(self, index: TagIndex) -> AbstractSet[Image]:
+        return index.tagged(Tag(name=self.name))
+
+
+@dataclass(frozen=True)
+class Count(Query):
+    count: int
+
+    def evaluate(self, index: TagIndex) -> AbstractSet[Image]:
+        return index.counted(self.count)
+
+
+@dataclass(frozen=True)
+class Not(Query):
+    operand: Query
+
+    def evaluate(self, index: TagIndex) -> AbstractSet[Image]:
+        return index.images - self.operand.evaluate(index)
+
+
+@dataclass(frozen=True)
+class And(Query):
+    operands: Tuple[Query, ...]
+
+    def evaluate(self, index: TagIndex) -> AbstractSet[Image]:
+        # subtract negated operands rather than intersecting with complements,
+        # and intersect starting from the smallest set
+        included = [o.evaluate(index) for o in self.operands if not isinstance(o, Not)]
+        excluded = [o.operand for o in self.operands if isinstance(o, Not)]
+
+        result: Set[Image]
+
+        if included == []:
+            result = set(index.images)
+        else:
+            included.sort(key=len)
+            result = set(included[0])
+
+            for images in included[1:]:
+                result.intersection_update(images)
+
+        for query in excluded:
+            if not result:
+                break
+            result.difference_update(query.evaluate(index))
+
+        return result
+
+
+@dataclass(frozen=True)
+class Or(Query):
+    operands: Tuple[Query, ...]
+
+    def evaluate(self, index: TagIndex) -> AbstractSet[Image]:
+        return set().union(*(o.evaluate(index) for o in self.operands))
+
+
+Token = Tuple[str, str, int]  # kind, text and position
+
+
+def _tokenize(text: str) -> List[Token]:
+    tokens: List[Token] = []
+    position = 0
+
+    while text[position:].strip() != '':
+        match = _TOKEN.match(text, position)
+
+        if match is None:
+            raise QuerySyntaxError("Unterminated quote", text.index('"', position))
+
+        assert match.lastgroup is not None
+        tokens.append((match.lastgroup, match.group(match.lastgroup), match.start()))
+        position = match.end()
+
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self._tokens = _tokenize(text)
+        self._position = 0
+        self._end = len(text)
+
+    def _peek(self) -> Optional[Token]:
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None
+
+    def _next(self) -> Token:
+        token = self._peek()
+        if token is None:
+            raise QuerySyntaxError("Unexpected end of query", self._end)
+
+        self._position += 1
+        return token
+
+    def _accept(self, keyword: str) -> bool:
+        token = self._peek()
+
+        if token is not None and token[:2] == ('word', keyword):
+            self._position += 1
+            return True
+        return False
+
+    def parse(self) -> Query:
+        query = self._or()
+
+        token = self._peek()
+        if token is not None:
+            raise QuerySyntaxError(f"Unexpected \"{token[1]}\"", token[2])
+        return query
+
+    def _or(self) -> Query:
+        operands = [self._and()]
+
+        while True:
+            token = self._peek()
+
+            if token is None or token[:2] == ('paren', ')'):
+                break
+
+            self._accept(OR)
+            operands.append(self._and())
+
+        return operands[0] if len(operands) == 1 else Or(tuple(operands))
+
+    def _and(self) -> Query:
+        operands = [self._not()]
+
+        while self._accept(AND):
+            operands.append(self._not())
+
+        return operands[0] if len(operands) == 1 else And(tuple(operands))
+
+    def _not(self) -> Query:
+        if self._accept(NOT):
+            operand = self._not()
+            return operand.operand if isinstance(operand, Not) else Not(operand)
+        return self._term()
+
+    def _term(self) -> Query:
+        kind, text, position = self._next()
+
+        if kind == 'paren' and text == '(':
+            query = self._or()
+
+            kind, text, position = self._next()
+            if (kind, text) != ('paren', ')'):
+                raise QuerySyntaxError("Missing closing parenthesis", position)
+            return query
+
+        if kind == 'quoted':
+            return Exact(text)
+
+        if kind == 'paren' or text in (AND, OR, NOT):
+            raise QuerySyntaxError(f"Unexpected \"{text}\"", position)
+
+        if text == UNTAGGED:
+            return Count(0)
+
+        match = _COUNT.fullmatch(text)
+        if match is not None:
+            return Count(int(match.group(1)))
+
+        return Word(text)
+
+
+@functools.lru_cache(maxsize=64)
+def parse(text: str) -> Optional[Query]:
+    """Query plan for text, None if empty."""
+    if text.strip() == '':
+        return None
+    return _Parser(text).parse()
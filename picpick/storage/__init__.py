@@ -0,0 +1,214 @@
+import contextlib
+import os
+import pathlib
+import pickle
+import shutil
+
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from . import binary, journal, sqlite, validation
+from .. import timing
+from .progress import Progress
+from .validation import Validator
+from ..model import LazyModel, Model
+from ..operations import Operation
+
+PICKLE = 'pickle'
+SQLITE = 'sqlite'
+BINARY = 'binary'
+
+FORMATS = (PICKLE, SQLITE, BINARY)
+DEFAULT_FORMAT = SQLITE
+
+
+def detect(path: pathlib.Path) -> str:
+    """Format of project file."""
+    if sqlite.is_project(path):
+        return SQLITE
+    if binary.is_project(path):
+        return BINARY
+    return PICKLE
+
+
+def writes_changes(destination: pathlib.Path) -> bool:
+    """Whether saving to destination only writes changes, when given."""
+    return destination.exists() and detect(destination) == SQLITE
+
+
+def update(
+    destination: pathlib.Path,
+    changes: Sequence[Operation],
+    current: Optional[pathlib.Path],
+    progress: Optional[Progress] = None,
+):
+    """Only write changes to destination, which writes_changes, along with path of
+    current image, without reading the model they were made to."""
+    # changes were validated when performed, and transactions are atomic
+    sqlite.update(destination, changes, current=current, progress=progress)
+
+
+@timing.timed
+def save(
+    destination: pathlib.Path,
+    model: Model,
+    current_index: Optional[int] = None,
+    changes: Optional[Sequence[Operation]] = None,
+    format: Optional[str] = None,
+    progress: Optional[Progress] = None,
+) -> Optional[str]:
+    """Save model to destination, in its current format if it already exists.
+
+    If given, changes are those made since destination was last saved or loaded,
+    and only those are written when the format allows it. Otherwise the whole
+    model is validated while written to a temporary file, replacing destination
+    once synced to disk, so that a crash never leaves it partially written.
+
+    Raises validation.InvalidProject, leaving destination untouched, if model is
+    not valid.
+    Returns checksum of destination if it was validated, and needs to be when
+    loaded.
+    """
+    if format is None:
+        format = detect(destination) if destination.exists() else DEFAULT_FORMAT
+
+    assert format in FORMATS
+
+    validator = Validator(model, current_index)
+    validator.raise_errors()  # before looking up current image
+
+    current = None if current_index is None else model.order[current_index].path
+
+    if format == SQLITE and changes is not None and writes_changes(destination):
+        update(destination, changes, current, progress)
+        return None
+
+    with _replacing(destination) as temporary:
+        if format == SQLITE:
+            sqlite.save(temporary, model, current, progress, validator)
+        elif format == BINARY:
+            binary.save(temporary, model, current_index, progress, validator)
+        else:
+            validator.check_all(model.images)
+            with temporary.open('wb') as f:
+                pickle.dump(model, f)
+                pickle.dump(current_index, f)
+
+    # SQLite constraints prevent invalid files already
+    return None if format == SQLITE else validation.checksum(destination)
+
+
+@contextlib.contextmanager
+def _replacing(destination: pathlib.Path) -> Iterator[pathlib.Path]:
+    temporary = destination.with_name(f'.{destination.name}.tmp')
+
+    try:
+        yield temporary
+
+        with temporary.open('rb') as f:
+            os.fsync(f.fileno())
+        if destination.exists():
+            shutil.copymode(destination, temporary)
+
+        os.replace(temporary, destination)
+    except BaseException:
+        if temporary.exists():
+            temporary.unlink()
+        raise
+
+    # renaming is only durable once directory is synced too
+    if hasattr(os, 'O_DIRECTORY'):
+        directory = os.open(destination.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+@contextlib.contextmanager
+def edited(project: pathlib.Path) -> Iterator[Tuple[Model, List[Operation]]]:
+    """Load project, or a new one if missing, to be changed by the block and saved
+    once it is done.
+
+    The block appends operations it performs to the given list, so that only
+    those are written to SQLite projects, along with those journaled. Journal of
+    project then starts over. Current image is kept if still present.
+    """
+    changes: List[Operation] = []
+
+    if project.exists():
+        model, current_index = load(project, changes=changes)
+    else:
+        model, current_index = Model(), None
+
+    current = None if current_index is None else model.order[current_index]
+
+    yield model, changes
+
+    if current is None or model.image_at(current.path) is not current:
+        current = model.order[0] if len(model.order) > 0 else None
+
+    validated = save(
+        project,
+        model,
+        current_index=None if current is None else model.order.index(current),
+        changes=changes,
+    )
+
+    journal.restart(project, validated)
+
+
+@timing.timed
+def load(
+    source: pathlib.Path,
+    changes: Optional[List[Operation]] = None,
+    lazy: bool = False,
+) -> Tuple[Model, Optional[int]]:
+    """Load model from source, then replay operations journaled since it was saved.
+
+    If given, changes is extended with replayed operations, which are not in
+    source yet. If lazy, binary files are memory-mapped instead, and images only
+    read from them once needed. Only a sample of them is then checked if source is
+    recorded as validated by its journal, so that loading time hardly depends on
+    their amount, all of them being read otherwise.
+    """
+    model: Model
+    current: Optional[pathlib.Path]
+    current_index: Optional[int]
+
+    format = detect(source)
+
+    if format == BINARY and lazy:
+        model, current_index = binary.load_lazy(source)
+
+        Validator(model, current_index).raise_errors()  # before looking it up
+        current = None if current_index is None else model.order[current_index].path
+    elif format == SQLITE:
+        model, current = sqlite.load(source)
+    elif format == BINARY:
+        model, current = binary.load(source)
+    else:
+        with source.open('rb') as f:
+            model = pickle.load(f)
+            current_index = pickle.load(f)
+
+        Validator(model, current_index).raise_errors()
+        current = None if current_index is None else model.order[current_index].path
+
+    replayed = journal.replay(source, model)
+    if changes is not None:
+        changes.extend(replayed)
+
+    if not isinstance(model, LazyModel) or replayed != []:
+        # images of lazy models are still those of source until replayed
+        image = None if current is None else model.image_at(current)
+        current_index = None if image is None else model.order.index(image)
+
+    if format != SQLITE:
+        # replayed operations were validated when performed, only hashing source
+        # when there is a checksum to compare
+        recorded = journal.checksum(source)
+        trusted = recorded is not None and recorded == validation.checksum(source)
+        sample = validation.TRUSTED_SAMPLE if trusted else None
+        validation.validate(model, current_index, sample=sample)
+
+    return model, current_index
@@ -0,0 +1,258 @@
+"""Compact binary project files, laid out in columns.
+
+Tags are stored once, sorted by name, and referred to by position. Images are
+stored in display order, their paths as suffixes of a prefix shared by all of
+them, along with the positions of their tags and their hashes, if any. Variable
+length values are concatenated, and located through arrays of offsets, so that
+any of them can be read without reading the others.
+
+All integers are unsigned, little-endian and 32 bits long, and every section
+starts on a 4 bytes boundary.
+"""
+import array
+import itertools
+import mmap
+import os
+import pathlib
+import struct
+import sys
+
+from typing import BinaryIO, cast, Iterable, List, Optional, Sequence, Tuple
+
+from .progress import Progress, tracked
+from .validation import checked, Validator
+from ..model import Image, LazyModel, Model, Tag
+
+MAGIC = b'PICPICK\x00'
+VERSION = 2  # images hashes added since version 1
+
+# magic, version, current image position or -1, tags, images and memberships
+# counts, then sizes of tag names, paths prefix and paths suffixes
+_HEADER = struct.Struct('<8sIqIIIIII')
+
+_ALIGNMENT = 4
+
+
+def is_project(path: pathlib.Path) -> bool:
+    with path.open('rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _padding(size: int) -> int:
+    return -size % _ALIGNMENT
+
+
+def _offsets(sizes: Iterable[int]) -> List[int]:
+    return [0, *itertools.accumulate(sizes)]
+
+
+def _integers(values: Iterable[int]) -> bytes:
+    integers = array.array('I', values)
+    assert integers.itemsize == 4
+
+    if sys.byteorder != 'little':
+        integers.byteswap()
+    return integers.tobytes()
+
+
+def _write(f: BinaryIO, section: bytes):
+    f.write(section)
+    f.write(bytes(_padding(len(section))))
+
+
+def save(
+    destination: pathlib.Path,
+    model: Model,
+    current_index: Optional[int],
+    progress: Optional[Progress] = None,
+    validator: Optional[Validator] = None,
+):
+    """Write whole model, checking images with validator if given.
+
+    Raises validation.InvalidProject before anything is written if images are not
+    valid.
+    """
+    images = model.order
+    tags = sorted(model.tags, key=lambda tag: tag.name)
+    positions = {tag: i for i, tag in enumerate(tags)}
+
+    names = [tag.name.encode() for tag in tags]
+
+    paths = [
+        os.fsencode(image.path)
+        for image in checked(tracked(images, len(images), progress, 0, 0.5), validator)
+    ]
+    if validator is not None:
+        validator.raise_errors()
+    prefix = cast(bytes, os.path.commonprefix(paths)) if paths != [] else b''
+
+    shared = len(prefix)
+    suffixes = [path[shared:] for path in paths]
+
+    memberships = [
+        sorted(positions[tag] for tag in image.tags)
+        for image in tracked(images, len(images), progress, 0.5, 0.9)
+    ]
+
+    # whether each image has a hash, one bit per image, then hashes as their low
+    # and high 32 bits, zero when missing
+    hashed = bytearray(-(-len(images) // 8))
+    hashes: List[int] = []
+    for i, image in enumerate(images):
+        value = 0 if image.hash is None else image.hash
+        if image.hash is not None:
+            hashed[i // 8] |= 1 << i % 8
+        hashes.extend((value & 0xFFFFFFFF, value >> 32))
+
+    names_data = b''.join(names)
+    suffixes_data = b''.join(suffixes)
+
+    with destination.open('wb') as f:
+        f.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                -1 if current_index is None else current_index,
+                len(tags),
+                len(images),
+                sum(len(m) for m in memberships),
+                len(names_data),
+                len(prefix),
+                len(suffixes_data),
+            )
+        )
+        _write(f, _integers(_offsets(len(name) for name in names)))
+        _write(f, names_data)
+        _write(f, prefix)
+        _write(f, _integers(_offsets(len(suffix) for suffix in suffixes)))
+        _write(f, suffixes_data)
+        _write(f, _integers(_offsets(len(m) for m in memberships)))
+        _write(f, _integers(itertools.chain.from_iterable(memberships)))
+        _write(f, bytes(hashed))
+        _write(f, _integers(hashes))
+
+
+class Columns:
+    """Columns of a binary project file, read from any buffer without copy."""
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+
+        (
+            magic,
+            version,
+            current,
+            tags_count,
+            images_count,
+            memberships_count,
+            names_size,
+            prefix_size,
+            suffixes_size,
+        ) = _HEADER.unpack_from(view)
+
+        if magic != MAGIC:
+            raise ValueError("Not a binary project file")
+        if version not in (1, VERSION):
+            raise ValueError(f"Unsupported project version {version}")
+
+        self._view = view
+        self._position = _HEADER.size
+
+        tag_offsets = self._integers(tags_count + 1)
+        names = self._bytes(names_size)
+
+        self.tags = [
+            Tag(name=str(names[start:stop], 'utf-8'))
+            for start, stop in zip(tag_offsets, tag_offsets[1:])
+        ]
+        self.current = None if current == -1 else current
+
+        self._prefix = bytes(self._bytes(prefix_size))
+        self._path_offsets = self._integers(images_count + 1)
+        self._suffixes = self._bytes(suffixes_size)
+
+        self._membership_offsets = self._integers(images_count + 1)
+        self._memberships = self._integers(memberships_count)
+
+        if version == 1:
+            self._hashed = memoryview(bytes(-(-images_count // 8)))
+            self._hashes: Sequence[int] = []
+        else:
+            self._hashed = self._bytes(-(-images_count // 8))
+            self._hashes = self._integers(2 * images_count)
+
+    def _bytes(self, size: int) -> memoryview:
+        start, stop = self._position, self._position + size
+        self._position = stop + _padding(size)
+        return self._view[start:stop]
+
+    def _integers(self, count: int) -> Sequence[int]:
+        data = self._bytes(4 * count)
+
+        if sys.byteorder == 'little':
+            return data.cast('I')
+
+        integers = array.array('I', data)
+        integers.byteswap()
+        return integers
+
+    def __len__(self) -> int:
+        return len(self._path_offsets) - 1
+
+    def path(self, i: int) -> pathlib.Path:
+        start, stop = self._path_offsets[i], self._path_offsets[i + 1]
+        return pathlib.Path(os.fsdecode(self._prefix + self._suffixes[start:stop]))
+
+    def tags_of(self, i: int) -> List[Tag]:
+        start, stop = self._membership_offsets[i], self._membership_offsets[i + 1]
+        return [self.tags[position] for position in self._memberships[start:stop]]
+
+    def hash_of(self, i: int) -> Optional[int]:
+        if not self._hashed[i // 8] & 1 << i % 8:
+            return None
+        return self._hashes[2 * i] | self._hashes[2 * i + 1] << 32
+
+    def image(self, i: int) -> Image:
+        image = Image(path=self.path(i))
+        image.tags.update(self.tags_of(i))
+        image.hash = self.hash_of(i)
+        return image
+
+    def release(self):
+        """Release buffer, columns cannot be read afterwards."""
+        for view in (
+            self._path_offsets,
+            self._suffixes,
+            self._membership_offsets,
+            self._memberships,
+            self._hashed,
+            self._hashes,
+            self._view,
+        ):
+            if isinstance(view, memoryview):
+                view.release()
+
+
+def load(source: pathlib.Path) -> Tuple[Model, Optional[pathlib.Path]]:
+    columns = Columns(source.read_bytes())
+    images = [columns.image(i) for i in range(len(columns))]
+
+    model = Model()
+    model.images = set(images)
+    model.tags = set(columns.tags)
+
+    current = None if columns.current is None else images[columns.current].path
+    return model, current
+
+
+def load_lazy(source: pathlib.Path) -> Tuple[LazyModel, Optional[int]]:
+    """Memory-map source, and only read images from it once needed.
+
+    Returns the model along with position of current image.
+    """
+    with source.open('rb') as f:
+        # mapping remains valid once file closed, or even replaced
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    columns = Columns(buffer)
+    return LazyModel(len(columns), columns.image, columns.tags), columns.current
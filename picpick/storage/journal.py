@@ -0,0 +1,294 @@
+"""Append-only journal of the operations performed since a project file was
+written, so that they survive a crash.
+
+The journal lives next to the project file, one JSON record per line. Its first
+line identifies the project file it applies to, so that a journal left over from
+before the project file was last written is never replayed. It also records the
+checksum the project file had when last validated, if known.
+"""
+import dataclasses
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+
+from typing import IO, Iterable, List, Optional
+
+from . import sqlite
+from .. import operations
+from ..model import Model
+from ..operations import Operation
+
+SUFFIX = '.journal'
+
+# operations journaled before being merged into SQLite project files
+COMPACT_THRESHOLD = 10_000
+
+_KINDS = {
+    kind.__name__: kind
+    for kind in (
+        operations.AddImage,
+        operations.RemoveImage,
+        operations.AddTag,
+        operations.DeleteTag,
+        operations.RenameTag,
+        operations.TagImage,
+        operations.UntagImage,
+        operations.HashImage,
+    )
+}
+
+
+def path_for(project: pathlib.Path) -> pathlib.Path:
+    return project.with_name(project.name + SUFFIX)
+
+
+def _identity(project: pathlib.Path) -> List[int]:
+    stat = os.stat(project)
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+def _header(path: pathlib.Path) -> list:
+    try:
+        with path.open(encoding='utf-8') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return []
+    return header if isinstance(header, list) else []
+
+
+def checksum(project: pathlib.Path) -> Optional[str]:
+    """Checksum of project when last validated, as recorded in its journal."""
+    header = _header(path_for(project))
+    return header[3] if len(header) > 3 else None
+
+
+def restart(project: pathlib.Path, validated: Optional[str]):
+    """Start journal of project over once written as a whole, recording checksum it
+    was validated with, so that it is trusted when loaded."""
+    restarted = Journal()
+    restarted.rebase(project, 0, validated)
+    restarted.close()
+
+
+def encode(operation: Operation) -> str:
+    fields = dataclasses.fields(operation)
+    values = [str(getattr(operation, field.name)) for field in fields]
+    return json.dumps([type(operation).__name__, *values]) + '\n'
+
+
+def decode(line: str) -> Operation:
+    kind, *values = json.loads(line)
+    cls = _KINDS[kind]
+
+    fields = dataclasses.fields(cls)
+    if len(values) != len(fields):
+        raise ValueError(f"Invalid {kind} record")
+
+    return cls(*(field.type(value) for field, value in zip(fields, values)))
+
+
+def replay(project: pathlib.Path, model: Model) -> List[Operation]:
+    """Perform on model the operations journaled since project was written, and
+    return them."""
+    try:
+        f = path_for(project).open(encoding='utf-8')
+    except FileNotFoundError:
+        return []
+
+    replayed: List[Operation] = []
+
+    with f:
+        try:
+            if json.loads(f.readline())[:3] != _identity(project):
+                return []
+        except (TypeError, ValueError):
+            return []
+
+        for line in f:
+            # last record may have been interrupted, and following ones are
+            # meaningless without it
+            if not line.endswith('\n'):
+                break
+            try:
+                operation = decode(line)
+                operations.apply(model, operation)
+            except (KeyError, TypeError, ValueError):
+                break
+
+            replayed.append(operation)
+
+    return replayed
+
+
+class Journal:
+    """Operations performed since project was written, appended to its journal.
+
+    Records are written and synced to disk by a worker thread, as many at once as
+    were appended meanwhile, so that appending never waits for the disk. Once
+    enough operations were journaled, SQLite projects are updated with them and
+    the journal started over.
+
+    Projects never written yet have their operations kept in memory only.
+    """
+
+    def __init__(
+        self,
+        project: Optional[pathlib.Path] = None,
+        journaled: Iterable[Operation] = (),
+    ):
+        """Continue project journal with operations replayed from it."""
+        self.project: Optional[pathlib.Path] = None
+        self.path: Optional[pathlib.Path] = None
+
+        self._operations: List[Operation] = list(journaled)
+        self._queue: List[str] = []
+        self._closing = False
+
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        self._io = threading.Lock()  # held while journal file is written
+
+        # held while project is written, so that compaction does not overlap
+        self.writing = threading.Lock()
+
+        self._file: Optional[IO[str]] = None
+        self._worker: Optional[threading.Thread] = None
+        self._compactable = False
+
+        if project is not None:
+            # written again with only those operations, as anything left after
+            # them, e.g. a record torn by a crash, would corrupt the next ones
+            self.rebase(project, 0)
+
+    @property
+    def operations(self) -> List[Operation]:
+        """Operations not written to project yet."""
+        with self._lock:
+            return list(self._operations)
+
+    def append(self, operation: Operation):
+        with self._lock:
+            assert not self._closing
+
+            self._operations.append(operation)
+            if self._file is not None:
+                self._queue.append(encode(operation))
+                self._appended.notify()
+
+    def rebase(
+        self, project: pathlib.Path, written: int, validated: Optional[str] = None
+    ):
+        """Start journal of project over, now that the first written operations
+        were written to it.
+
+        Journal is replaced at once with one holding the remaining operations, and
+        journal of another project previously written is deleted. Checksum of
+        project when last validated is kept unless given.
+        """
+        previous, path = self.path, path_for(project)
+        temporary = path.with_name(path.name + '.tmp')
+
+        if validated is None:
+            validated = checksum(project)
+
+        with self._io:
+            # operations appended from now on are written once journal replaced
+            with self._lock:
+                del self._operations[:written]
+                self._queue = []
+                remaining = list(self._operations)
+
+            with temporary.open('w', encoding='utf-8') as f:
+                f.write(json.dumps([*_identity(project), validated]) + '\n')
+                f.writelines(encode(operation) for operation in remaining)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+
+                os.replace(temporary, path)
+                self._open(project, path, 'a')
+
+        if previous is not None and previous != path:
+            previous.unlink()
+
+    def close(self, delete: bool = False):
+        """Wait for operations to be journaled, and optionally delete journal."""
+        with self._lock:
+            self._closing = True
+            self._appended.notify()
+
+        if self._worker is not None:
+            self._worker.join()
+
+        if delete and self.path is not None:
+            self.path.unlink()
+
+    def _open(self, project: pathlib.Path, path: pathlib.Path, mode: str):
+        self.project = project
+        self.path = path
+
+        self._file = path.open(mode, encoding='utf-8')
+        self._compactable = sqlite.is_project(project)
+
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._queue == [] and not self._closing:
+                    self._appended.wait()
+
+            with self._io:
+                with self._lock:
+                    lines, self._queue = self._queue, []
+                    closing = self._closing
+
+                assert self._file is not None
+
+                if lines != []:
+                    self._file.write(''.join(lines))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+
+            if self._compactable:
+                self._compact()
+
+            if closing:
+                with self._io:
+                    assert self._file is not None
+                    self._file.close()
+                return
+
+    def _compact(self):
+        # skipped while project is being saved, as saving writes operations too
+        if not self.writing.acquire(blocking=False):
+            return
+
+        try:
+            with self._lock:
+                journaled = len(self._operations) - len(self._queue)
+                if journaled < COMPACT_THRESHOLD:
+                    return
+
+                assert self.project is not None
+                project, changes = self.project, self._operations[:journaled]
+
+            try:
+                sqlite.apply(project, changes)
+            except (OSError, sqlite3.Error):
+                # project is left untouched, operations are still journaled
+                self._compactable = False
+                return
+
+            # a crash from now on leaves a journal identifying the project as it
+            # was before, hence ignored, which is right since operations are in it
+            self.rebase(project, journaled)
+        finally:
+            self.writing.release()
@@ -0,0 +1,27 @@
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+Progress = Callable[[float], None]  # called with the fraction of work done
+
+STEP = 4096  # items between two reports
+
+
+def tracked(
+    items: Iterable[T],
+    count: int,
+    progress: Optional[Progress],
+    start: float = 0.0,
+    stop: float = 1.0,
+) -> Iterator[T]:
+    """Iterate over count items, reporting progress from start to stop."""
+    if progress is None:
+        yield from items
+        return
+
+    for i, item in enumerate(items):
+        if i % STEP == 0:
+            progress(start + (stop - start) * i / count)
+        yield item
+
+    progress(stop)
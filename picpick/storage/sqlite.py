@@ -0,0 +1,248 @@
+"""SQLite project files, updated in place with only what changed since last save.
+
+Tag memberships reference images and tags by id, so that renaming a tag or
+removing an image touches a single row, memberships following by cascade.
+"""
+import contextlib
+import dataclasses
+import pathlib
+import sqlite3
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .progress import Progress, tracked
+from .validation import checked, Validator
+from .. import operations
+from ..model import Image, Model, Tag
+
+HEADER = b'SQLite format 3\x00'
+VERSION = 2  # images hashes added since version 1
+
+_SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID;
+CREATE TABLE images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    hash INTEGER
+);
+CREATE TABLE tags (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE image_tags (
+    image_id INTEGER NOT NULL REFERENCES images (id) ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags (id) ON DELETE CASCADE,
+    PRIMARY KEY (image_id, tag_id)
+) WITHOUT ROWID;
+CREATE INDEX image_tags_tag_id ON image_tags (tag_id);
+'''
+
+_STATEMENTS = {
+    operations.AddImage: 'INSERT INTO images (path) VALUES (:path)',
+    operations.RemoveImage: 'DELETE FROM images WHERE path = :path',
+    operations.AddTag: 'INSERT INTO tags (name) VALUES (:name)',
+    operations.DeleteTag: 'DELETE FROM tags WHERE name = :name',
+    operations.RenameTag: 'UPDATE tags SET name = :new WHERE name = :old',
+    operations.TagImage: '''
+        INSERT INTO image_tags (image_id, tag_id)
+        SELECT images.id, tags.id FROM images, tags
+        WHERE images.path = :path AND tags.name = :name
+    ''',
+    operations.UntagImage: '''
+        DELETE FROM image_tags
+        WHERE image_id = (SELECT id FROM images WHERE path = :path)
+        AND tag_id = (SELECT id FROM tags WHERE name = :name)
+    ''',
+    operations.HashImage: 'UPDATE images SET hash = :hash WHERE path = :path',
+}
+
+
+def is_project(path: pathlib.Path) -> bool:
+    with path.open('rb') as f:
+        return f.read(len(HEADER)) == HEADER
+
+
+@contextlib.contextmanager
+def _connect(path: pathlib.Path) -> Iterator[sqlite3.Connection]:
+    connection = sqlite3.connect(str(path), isolation_level=None)
+    try:
+        connection.execute('PRAGMA foreign_keys = ON')
+        yield connection
+    finally:
+        connection.close()
+
+
+@contextlib.contextmanager
+def _transaction(connection: sqlite3.Connection) -> Iterator[None]:
+    connection.execute('BEGIN')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed, hashes are stored as their two's complement
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _parameter(value: object) -> object:
+    return _signed(value) if isinstance(value, int) else str(value)
+
+
+def _parameters(operation: operations.Operation) -> Dict[str, object]:
+    return {
+        field.name: _parameter(getattr(operation, field.name))
+        for field in dataclasses.fields(operation)
+    }
+
+
+def _upgrade(connection: sqlite3.Connection):
+    """Upgrade file written by a previous version, before it is updated."""
+    (version,) = connection.execute(
+        "SELECT value FROM meta WHERE key = 'version'"
+    ).fetchone()
+
+    if version == 1:
+        connection.execute('ALTER TABLE images ADD COLUMN hash INTEGER')
+        connection.execute(
+            "UPDATE meta SET value = ? WHERE key = 'version'", (VERSION,)
+        )
+
+
+def _set_current(connection: sqlite3.Connection, current: Optional[pathlib.Path]):
+    connection.execute(
+        'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+        ('current', None if current is None else str(current)),
+    )
+
+
+def save(
+    destination: pathlib.Path,
+    model: Model,
+    current: Optional[pathlib.Path],
+    progress: Optional[Progress] = None,
+    validator: Optional[Validator] = None,
+):
+    """Write whole model into a new file, checking images with validator if given.
+
+    Raises validation.InvalidProject before anything is written if images are not
+    valid.
+    """
+    images = list(checked(model.images, validator))
+    if validator is not None:
+        validator.raise_errors()
+
+    if destination.exists():
+        destination.unlink()
+
+    with _connect(destination) as connection:
+        connection.executescript(_SCHEMA)
+
+        with _transaction(connection):
+            _insert(connection, model, images, current, progress)
+
+
+def _insert(
+    connection: sqlite3.Connection,
+    model: Model,
+    images: List[Image],
+    current: Optional[pathlib.Path],
+    progress: Optional[Progress],
+):
+    connection.execute(
+        'INSERT INTO meta (key, value) VALUES (?, ?)', ('version', VERSION)
+    )
+    _set_current(connection, current)
+
+    tag_ids = {tag: i for i, tag in enumerate(model.tags)}
+    connection.executemany(
+        'INSERT INTO tags (id, name) VALUES (?, ?)',
+        ((i, tag.name) for tag, i in tag_ids.items()),
+    )
+
+    connection.executemany(
+        'INSERT INTO images (id, path, hash) VALUES (?, ?, ?)',
+        (
+            (i, str(image.path), None if image.hash is None else _signed(image.hash))
+            for i, image in tracked(enumerate(images), len(images), progress, 0, 0.5)
+        ),
+    )
+    connection.executemany(
+        'INSERT INTO image_tags (image_id, tag_id) VALUES (?, ?)',
+        (
+            (i, tag_ids[tag])
+            for i, image in tracked(enumerate(images), len(images), progress, 0.5)
+            for tag in image.tags
+        ),
+    )
+
+
+def update(
+    destination: pathlib.Path,
+    changes: Sequence[operations.Operation],
+    current: Optional[pathlib.Path],
+    progress: Optional[Progress] = None,
+):
+    """Apply changes made since destination was last saved or loaded, in a single
+    transaction."""
+    with _connect(destination) as connection, _transaction(connection):
+        _upgrade(connection)
+        _apply(connection, tracked(changes, len(changes), progress))
+        _set_current(connection, current)
+
+
+def apply(destination: pathlib.Path, changes: Iterable[operations.Operation]):
+    """Apply changes in a single transaction, keeping current image."""
+    with _connect(destination) as connection, _transaction(connection):
+        _upgrade(connection)
+        _apply(connection, changes)
+
+
+def _apply(connection: sqlite3.Connection, changes: Iterable[operations.Operation]):
+    for operation in changes:
+        cursor = connection.execute(
+            _STATEMENTS[type(operation)], _parameters(operation)
+        )
+
+        # would otherwise insert nothing, the tag being lost
+        if isinstance(operation, operations.TagImage) and cursor.rowcount == 0:
+            raise sqlite3.IntegrityError(
+                f"{operation.path} or \"{operation.name}\" tag is not in project"
+            )
+
+
+def load(source: pathlib.Path) -> Tuple[Model, Optional[pathlib.Path]]:
+    with _connect(source) as connection:
+        meta = dict(connection.execute('SELECT key, value FROM meta'))
+
+        if meta.get('version') not in (1, VERSION):
+            raise ValueError(f"Unsupported project version {meta.get('version')}")
+
+        tags = {
+            i: Tag(name=name)
+            for i, name in connection.execute('SELECT id, name FROM tags')
+        }
+        images = {
+            i: Image(path=pathlib.Path(path))
+            for i, path in connection.execute('SELECT id, path FROM images')
+        }
+        if meta['version'] != 1:
+            for i, value in connection.execute(
+                'SELECT id, hash FROM images WHERE hash IS NOT NULL'
+            ):
+                images[i].hash = _unsigned(value)
+        for image_id, tag_id in connection.execute(
+            'SELECT image_id, tag_id FROM image_tags'
+        ):
+            images[image_id].tags.add(tags[tag_id])
+
+    model = Model()
+    model.images = set(images.values())
+    model.tags = set(tags.values())
+
+    current = meta.get('current')
+    return model, None if current is None else pathlib.Path(current)
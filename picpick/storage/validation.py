@@ -0,0 +1,126 @@
+"""Validation of projects, in a single pass over their images.
+
+Images are checked as they are iterated over, so that writing a project also
+validates it. Files identical to the one last validated, according to their
+checksum, only have a sample of their images checked when loaded, which does not
+read the others from lazily loaded ones.
+"""
+import hashlib
+import pathlib
+import random
+
+from typing import Iterable, Iterator, List, Optional
+
+from ..model import Image, Model, sort_key
+
+# images checked in files identical to their last validated save, 0 to skip them
+TRUSTED_SAMPLE = 1000
+
+MAX_ERRORS = 100  # invalid records described, others only counted
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class InvalidProject(ValueError):
+    def __init__(self, errors: List[str], count: int):
+        self.errors = errors
+        self.count = count
+
+        described = "; ".join(errors[:10])
+        if count > 10:
+            described += f" and {count - 10} more"
+        super().__init__(f"{count} invalid records: {described}")
+
+
+class Validator:
+    """Checks of a model images, collecting their errors until raised."""
+
+    def __init__(self, model: Model, current_index: Optional[int]):
+        self._model = model
+
+        self.errors: List[str] = []
+        self.count = 0
+
+        if current_index is not None and not 0 <= current_index < len(model.order):
+            self._error(f"current image {current_index} is out of range")
+
+    def _error(self, error: str):
+        self.count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(error)
+
+    def _duplicated(self, image: Image, position: int) -> bool:
+        # images of a same path have a same sort key, hence are next to each other
+        order = self._model.order
+        key = sort_key(image)
+
+        for step in (-1, 1):
+            i = position + step
+            while 0 <= i < len(order) and sort_key(order[i]) == key:
+                if order[i].path == image.path:
+                    return True
+                i += step
+
+        return False
+
+    def check(self, image: Image, position: Optional[int] = None):
+        """Check image, looking for duplicates only around its position in order
+        if given, instead of through the path index of all images."""
+        if position is None:
+            # path index is maintained by the model anyway
+            duplicated = self._model.image_at(image.path) is not image
+        else:
+            duplicated = self._duplicated(image, position)
+        if duplicated:
+            self._error(f"{image.path} is present several times")
+
+        if not image.tags <= self._model.tags:
+            names = ", ".join(sorted(tag.name for tag in image.tags - self._model.tags))
+            self._error(f"{image.path} has unknown tags {names}")
+
+    def check_all(self, images: Iterable[Image]):
+        for image in images:
+            self.check(image)
+        self.raise_errors()
+
+    def raise_errors(self):
+        if self.count > 0:
+            raise InvalidProject(self.errors, self.count)
+
+
+def checked(images: Iterable[Image], validator: Optional[Validator]) -> Iterator[Image]:
+    """Iterate over images, checking them with validator if given."""
+    if validator is None:
+        yield from images
+        return
+
+    for image in images:
+        validator.check(image)
+        yield image
+
+
+def validate(model: Model, current_index: Optional[int], sample: Optional[int] = None):
+    """Check model images, or only a random sample of them if given, which are
+    then the only ones read from lazily loaded models.
+
+    Raises InvalidProject describing invalid ones.
+    """
+    validator = Validator(model, current_index)
+    validator.raise_errors()  # before looking up images
+
+    order = model.order
+    if sample is None:
+        validator.check_all(order)
+        return
+
+    for position in random.sample(range(len(order)), min(sample, len(order))):
+        validator.check(order[position], position)
+    validator.raise_errors()
+
+
+def checksum(path: pathlib.Path) -> str:
+    digest = hashlib.blake2b()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
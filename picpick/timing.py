@@ -0,0 +1,176 @@
+"""Latency of operations, as perceived by users when PicPick lags.
+
+Timed functions record how long each of their calls took once timings are
+enabled, only checking whether they are otherwise. Percentiles are computed over
+the most recent calls, so that they reflect current lags rather than those since
+PicPick started.
+"""
+import collections
+import csv
+import functools
+import json
+import math
+import pathlib
+import threading
+import time
+
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, TypeVar, cast
+
+JSON = 'json'
+CSV = 'csv'
+
+FORMATS = (JSON, CSV)
+
+_SUFFIXES = {'.json': JSON, '.csv': CSV}
+
+WINDOW = 1000  # most recent calls percentiles are computed over, per operation
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+class Stats(NamedTuple):
+    calls: int  # since timings were enabled
+    p50: float  # milliseconds, over most recent calls
+    p95: float
+    p99: float
+    max: float
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    # nearest rank, hence always one of the durations
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Timings:
+    """Durations of most recent calls of each operation.
+
+    Recorded from any thread, as projects are saved in the background.
+    """
+
+    def __init__(self, window: int = WINDOW):
+        self._window = window
+        self._lock = threading.Lock()
+        self._durations: Dict[str, Deque[float]] = {}
+        self._calls: 'collections.Counter[str]' = collections.Counter()
+
+    def record(self, name: str, duration: float):
+        """Record a call of operation name, which took duration milliseconds."""
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = collections.deque(maxlen=self._window)
+                self._durations[name] = durations
+
+            durations.append(duration)
+            self._calls[name] += 1
+
+    def stats(self) -> Dict[str, Stats]:
+        """Stats of operations called so far, by name."""
+        with self._lock:
+            recorded = {
+                name: (self._calls[name], sorted(durations))
+                for name, durations in self._durations.items()
+            }
+
+        return {
+            name: Stats(
+                calls=calls,
+                p50=_percentile(ordered, 0.5),
+                p95=_percentile(ordered, 0.95),
+                p99=_percentile(ordered, 0.99),
+                max=ordered[-1],
+            )
+            for name, (calls, ordered) in sorted(recorded.items())
+        }
+
+    def write(self, path: pathlib.Path, format: Optional[str] = None):
+        """Write stats to path, in format guessed from its extension if not given,
+        JSON by default."""
+        if format is None:
+            format = _SUFFIXES.get(path.suffix.lower(), JSON)
+        assert format in FORMATS
+
+        stats = self.stats()
+
+        with path.open('w', newline='', encoding='utf-8') as f:
+            if format == JSON:
+                json.dump(
+                    {name: stat._asdict() for name, stat in stats.items()},
+                    f,
+                    indent=2,
+                )
+                return
+
+            writer = csv.writer(f)
+            writer.writerow(('operation',) + Stats._fields)
+            for name, stat in stats.items():
+                writer.writerow((name,) + stat)
+
+
+def table(stats: Dict[str, Stats]) -> str:
+    """Stats as lines of aligned columns, empty if none."""
+    if stats == {}:
+        return ''
+
+    width = max(len(name) for name in stats)
+    lines = [
+        f"{'operation (ms)':<{width}} {'calls':>7} "
+        + ' '.join(f'{field:>7}' for field in Stats._fields[1:])
+    ]
+    for name, stat in stats.items():
+        lines.append(
+            f"{name:<{width}} {stat.calls:>7} "
+            + ' '.join(f'{duration:>7.1f}' for duration in stat[1:])
+        )
+
+    return '\n'.join(lines)
+
+
+_timings: Optional[Timings] = None
+
+
+def enable(window: int = WINDOW) -> Timings:
+    """Start timing operations, if not already, and return their timings."""
+    global _timings
+
+    if _timings is None:
+        _timings = Timings(window)
+    return _timings
+
+
+def disable():
+    global _timings
+    _timings = None
+
+
+def timings() -> Optional[Timings]:
+    """Timings of operations, None unless enabled."""
+    return _timings
+
+
+def timed(function: F) -> F:
+    """Record durations of calls of function while timings are enabled.
+
+    Operations are named after the qualified name of methods, and after their
+    module for functions, e.g. "Controller.add_images" or "storage.save".
+    """
+    name = function.__qualname__
+    if '.' not in name:
+        name = f"{function.__module__.rpartition('.')[2]}.{name}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _timings is None:
+            return function(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # read again, may have been disabled meanwhile
+            current = _timings
+            if current is not None:
+                current.record(name, (time.perf_counter() - start) * 1000)
+
+    return cast(F, wrapper)
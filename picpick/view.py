@@ -6,13 +6,15 @@ import tkinter as tk
 import tkinter.ttk as ttk
 
 from tkinter import filedialog, messagebox
-from typing import List, TYPE_CHECKING
+from typing import Callable, Iterable, List, Optional, TYPE_CHECKING
 
-from . import dialogs, model, widgets
+from . import dialogs, importing, model, timing, widgets
+from .events import Event, EventBus
+from .storage import validation
 
 if TYPE_CHECKING:  # required to prevent circular imports
     from .controller import Controller
-    from .model import Model, Tag
+    from .model import Image, Model, Tag
 
 
 class View:
@@ -22,41 +24,130 @@ class View:
 
         self._window = MainWindow(controller=controller)
 
+        self._events = EventBus(schedule=self._window.after_idle)
+        self._subscribe()
+
+    def _subscribe(self):
+        window = self._window
+        subscribe = self._events.subscribe
+
+        # marked unsaved right away, so that a save before next idle cycle is not
+        # followed by an unsaved title
+        for event in Event:
+            subscribe(event, window.mark_unsaved, immediate=True)
+
+        subscribe(Event.IMAGES_CHANGED, self._show_images)
+        subscribe(Event.TAGS_CHANGED, self._show_tags)
+
+        for event in (Event.TAGS_CHANGED, Event.CURRENT_IMAGE_TAGS_CHANGED):
+            subscribe(event, window.file_list.refresh)  # TODO: add tests for this
+
+        subscribe(Event.CURRENT_IMAGE_CHANGED, self._show_current_image)
+
+        for event in (Event.CURRENT_IMAGE_CHANGED, Event.CURRENT_IMAGE_TAGS_CHANGED):
+            subscribe(event, self._show_current_image_tags)
+
     def run(self):
         self._window.mainloop()
 
     def mark_saved(self, filename: str):
         self._window.mark_saved(filename)
 
+    def mark_unsaved(self):
+        self._window.mark_unsaved()
+
+    def show_progress(self, fraction: Optional[float]):
+        self._window.show_progress(fraction)
+
+    def show_error(self, title: str, message: str):
+        messagebox.showerror(title, message)
+
+    def after(self, milliseconds: int, callback: Callable[[], None]):
+        self._window.after(milliseconds, callback)
+
+    def after_idle(self, callback: Callable[[], None]):
+        self._window.after_idle(callback)
+
+    def publish(self, event: Event):
+        """Update what event changed once Tk is idle, along with other events
+        published meanwhile."""
+        self._events.publish(event)
+
+    @timing.timed
     def update_images(self):
-        images = sorted(self.model.images, key=lambda image: image.path.name)
-        self._window.file_list.set_images(images)
+        self._events.publish(Event.IMAGES_CHANGED)
+
+    @timing.timed
+    def add_images(self, images: Iterable[Image]):
+        # rows are inserted right away, rather than the whole list rebuilt
+        self._window.file_list.insert(images)
         self._window.mark_unsaved()
 
+    @timing.timed
+    def remove_images(self, images: Iterable[Image]):
+        self._window.file_list.remove(images)
+        self._window.mark_unsaved()
+
+    @timing.timed
     def update_current_image(self):
+        self._events.publish(Event.CURRENT_IMAGE_CHANGED)
+
+    @timing.timed
+    def update_tags(self):
+        self._events.publish(Event.TAGS_CHANGED)
+
+    @timing.timed
+    def update_current_image_tags(self):
+        self._events.publish(Event.CURRENT_IMAGE_TAGS_CHANGED)
+
+    @timing.timed
+    def _show_images(self):
+        self._window.file_list.set_images(self.model.order)
+
+    @timing.timed
+    def _show_tags(self):
+        self._window.tag_section.show_tags(
+            sorted(self.model.tags, key=lambda tag: tag.name)
+        )
+
+    @timing.timed
+    def _show_current_image(self):
         image = self._controller.current_image
         self._window.file_list.select(image)
         self._window.image_display.set_image(image)
 
-        self.update_current_image_tags()
-        self._window.mark_unsaved()
-
-    def update_tags(self):
-        tags = sorted(self.model.tags, key=lambda tag: tag.name)
-        self._window.tag_list.set_tags(tags)
-        self._window.file_list.refresh()  # TODO: add tests for this
-        self._window.mark_unsaved()
+        if image is not None:
+            self._window.image_display.prefetch(
+                self._window.file_list.neighbours(image, widgets.PREFETCH_COUNT)
+            )
 
-    def update_current_image_tags(self):
+    @timing.timed
+    def _show_current_image_tags(self):
         self._window.tag_list.set_current_image(self._controller.current_image)
-        self._window.file_list.refresh()  # TODO: add tests for this
-        self._window.mark_unsaved()
+
+
+def confirm_unsaved(controller: Controller, action: str) -> bool:
+    if controller.journaled:
+        # kept in journal, and replayed once project is loaded again
+        consequence = "Changes are kept, and restored once it is opened again."
+    else:
+        consequence = "Changes will be lost."
+
+    return messagebox.askokcancel(
+        "Project unsaved",
+        f"Current project has not been saved, are you sure you want to {action}? "
+        + consequence,
+    )
 
 
 class MainWindow(tk.Tk):
     def __init__(self, controller: Controller):
         super().__init__()
 
+        self._controller = controller
+
+        self._progress: Optional[float] = None
+
         self.mark_unsaved()
         self.protocol('WM_DELETE_WINDOW', self.quit)
         self.geometry('928x640')
@@ -74,7 +165,12 @@ class MainWindow(tk.Tk):
 
         sidebar = ttk.PanedWindow(master=pw, orient=tk.VERTICAL)
 
-        file_list = widgets.FileList(master=sidebar)
+        file_list = widgets.FileList(
+            master=sidebar,
+            search=controller.search,
+            near_duplicates=controller.near_duplicates,
+            distinct=controller.distinct_images,
+        )
         file_list.bind(
             '<<FileListSelect>>',
             lambda _: controller.set_current_image(file_list.selected),
@@ -90,29 +186,47 @@ class MainWindow(tk.Tk):
         self._menu = menu
 
         self.file_list = file_list
+        self.tag_section = tag_section
         self.tag_list: widgets.TagList = tag_section.tag_list
         self.image_display: widgets.ImageDisplay = image_display
 
+        # over other widgets, hence created last
+        self._timings_overlay = widgets.TimingsOverlay(master=self)
+
+    def toggle_timings(self):
+        self._timings_overlay.toggle()
+
     def mark_unsaved(self):
         self._unsaved = True
-        if hasattr(self, '_last_saved_filename'):
-            filename = self._last_saved_filename
-            self.title(f"PicPick - {filename}*")
-        else:
-            self.title("PicPick *")
+        self._update_title()
 
     def mark_saved(self, filename: str):
-        self.title(f"PicPick - {filename}")
         self._last_saved_filename = filename
         self._unsaved = False
+        self._progress = None
+        self._update_title()
         self._menu.enable_save()
 
+    def show_progress(self, fraction: Optional[float]):
+        """Show progress of a save, or hide it if None."""
+        self._progress = fraction
+        self._update_title()
+
+    def _update_title(self):
+        if hasattr(self, '_last_saved_filename'):
+            title = f"PicPick - {self._last_saved_filename}"
+        else:
+            title = "PicPick "
+
+        if self._unsaved:
+            title += "*"
+        if self._progress is not None:
+            title += f" (saving {self._progress:.0%})"
+
+        self.title(title)
+
     def quit(self):
-        if self._unsaved and not messagebox.askokcancel(
-            "Project unsaved",
-            "Current project has not been saved, are you sure you want to exit "
-            "PicPick? Changes will be lost.",
-        ):
+        if self._unsaved and not confirm_unsaved(self._controller, "exit PicPick"):
             return
         super().quit()
 
@@ -136,18 +250,20 @@ class TagSection(tk.Frame):
         self._controller = controller
         self._displayed_tags: List[Tag] = []
 
+    def show_tags(self, tags: List[Tag]):
+        displayed = [tag for tag in self._displayed_tags if tag in tags]
+        self.tag_list.set_tags(displayed or tags)
+
     def _open_tags_manager(self):
+        # edited by the dialog, hence a copy for changes to be found once set
         dialog = dialogs.TagsManagerDialog(
             master=self,
-            tags=self._controller._model.tags,  # TODO: properly refactor this
+            tags=set(self._controller.tags),
             displayed_tags=self._displayed_tags,
         )
-        self._controller.set_tags(dialog.tags)
+        # tags list is updated once controller notifies the change
         self._displayed_tags = dialog.displayed_tags
-
-        self.tag_list.set_tags(
-            dialog.displayed_tags or sorted(dialog.tags, key=lambda t: t.name)
-        )
+        self._controller.set_tags(dialog.tags)
 
 
 class Menu(tk.Menu):
@@ -171,10 +287,18 @@ class Menu(tk.Menu):
 
         self.add_cascade(label="File", menu=file_menu)
 
+        view_menu = tk.Menu(self, tearoff=0)
+        view_menu.add_command(
+            label="Timings", command=master.toggle_timings, accelerator="F12"
+        )
+
+        self.add_cascade(label="View", menu=view_menu)
+
         master.bind_all('<Control-o>', lambda _: self._open())
         master.bind_all('<Control-s>', lambda _: self._save())
         master.bind_all('<Control-Shift-S>', lambda _: self._save_as())
         master.bind_all('<Control-q>', lambda _: master.quit())
+        master.bind_all('<F12>', lambda _: master.toggle_timings())
 
         self._file_menu = file_menu
 
@@ -185,22 +309,23 @@ class Menu(tk.Menu):
         if filename == () or filename == '':
             return
 
-        if self.master._unsaved and not messagebox.askokcancel(  # type: ignore
-            "Project unsaved",
-            "Current project has not been saved, are you sure you want to load "
-            "new save? Changes will be lost.",
+        if self.master._unsaved and not confirm_unsaved(  # type: ignore
+            self._controller, "load new save"
         ):
             return
 
         path = pathlib.Path(filename)
-        self._controller.load(path)
+        try:
+            self._controller.load(path)
+        except validation.InvalidProject as e:
+            messagebox.showerror("Invalid project", f"{path.name}: {e}")
 
     def enable_save(self):
         self._file_menu.entryconfigure('Save', state=tk.NORMAL)
 
     def _save(self):
         if hasattr(self._controller, 'last_save_path'):
-            self._controller.save_current()
+            self._controller.save_current(background=True)
             return
         self._save_as()
 
@@ -212,27 +337,25 @@ class Menu(tk.Menu):
             return
 
         path = pathlib.Path(filename)
-        self._controller.save(path)
+        self._controller.save(path, background=True)
 
     def _add_image(self):
         filenames = filedialog.askopenfilenames(
-            filetypes=(("image file", '.jpg .jpeg .png .bmp .pgm .pbm .ppm'),)
+            filetypes=(("image file", ' '.join(importing.EXTENSIONS)),)
         )
         if filenames == () or filenames == '':
             return
 
-        from .controller import Controller
-
-        errored = False
+        duplicates = self._controller.add_images(
+            model.Image(path=pathlib.Path(filename)) for filename in filenames
+        )
 
-        for filename in filenames:
-            path = pathlib.Path(filename)
-            try:
-                self._controller.add_image(model.Image(path=path))
-            except Controller.ImageAlreadyPresent:
-                errored = True
+        if duplicates != []:
+            names = ", ".join(image.path.name for image in duplicates[:10])
+            if len(duplicates) > 10:
+                names += f" and {len(duplicates) - 10} more"
 
-        if errored:
             messagebox.showwarning(
-                "Images already present", "Some images were already present"
+                "Images already present",
+                f"{len(duplicates)} images were already present: {names}",
             )
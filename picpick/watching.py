@@ -0,0 +1,439 @@
+"""Watching of directory trees for images added to or removed from them.
+
+Trees are rescanned incrementally: a directory is only listed again once its
+modification time changed, which happens whenever entries are added to, removed
+from or renamed in it. Rescanning an unchanged tree hence only reads modification
+times of its directories. Directories to rescan are reported by inotify on Linux,
+all of them being checked periodically otherwise.
+
+Listings are kept in an index next to the project, so that a tree is not listed
+again as a whole when watched again.
+"""
+import ctypes
+import errno
+import json
+import os
+import pathlib
+import queue
+import select
+import struct
+import threading
+import time
+
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .importing import has_image_extension
+
+INDEX_SUFFIX = '.watch'
+INDEX_VERSION = 1
+
+POLL_INTERVAL = 2.0  # seconds between rescans of whole trees without inotify
+WAIT_INTERVAL = 0.5  # seconds between checks for being stopped
+SAVE_INTERVAL = 30.0  # seconds at least between writes of the index
+
+# files modified more recently are still being written, and only reported once
+# listed again; their directory modification time is not recorded meanwhile, as
+# further changes within the same clock tick would not change it
+SETTLE_DELAY = 2_000_000_000  # nanoseconds
+
+
+class Changes(NamedTuple):
+    added: List[pathlib.Path]
+    removed: List[pathlib.Path]
+    complete: bool = False  # added are all images in trees, not only new ones
+
+
+class Directory(NamedTuple):
+    mtime: Optional[int]  # None if to be listed again anyway
+    files: Dict[str, Tuple[int, int]]  # names of images, with size and mtime
+    directories: List[str]
+
+
+def index_path_for(project: pathlib.Path) -> pathlib.Path:
+    return project.with_name(project.name + INDEX_SUFFIX)
+
+
+class Tree:
+    """Images under roots, as of their last listing."""
+
+    def __init__(
+        self,
+        roots: Iterable[pathlib.Path],
+        directories: Optional[Dict[pathlib.Path, Directory]] = None,
+    ):
+        self.roots = [root.resolve() for root in roots]
+        self._directories = directories or {}
+
+    @classmethod
+    def load(cls, path: pathlib.Path, roots: Iterable[pathlib.Path]) -> 'Tree':
+        """Tree saved to path, or a new one if missing or of other roots."""
+        tree = cls(roots)
+
+        try:
+            with path.open(encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return tree
+
+        if data.get('version') != INDEX_VERSION or data.get('roots') != [
+            str(root) for root in tree.roots
+        ]:
+            return tree
+
+        tree._directories = {
+            pathlib.Path(directory): Directory(
+                mtime,
+                {name: (size, modified) for name, (size, modified) in files.items()},
+                names,
+            )
+            for directory, (mtime, files, names) in data['directories'].items()
+        }
+        return tree
+
+    def save(self, path: pathlib.Path):
+        data = {
+            'version': INDEX_VERSION,
+            'roots': [str(root) for root in self.roots],
+            'directories': {
+                str(directory): listing
+                for directory, listing in self._directories.items()
+            },
+        }
+
+        # replaced at once, a partially written index would be discarded anyway
+        temporary = path.with_name(f'.{path.name}.tmp')
+        with temporary.open('w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+    @property
+    def directories(self) -> Iterable[pathlib.Path]:
+        return self._directories.keys()
+
+    def files(self) -> Iterator[pathlib.Path]:
+        for directory, listing in self._directories.items():
+            for name in listing.files:
+                yield directory / name
+
+    def unsettled(self) -> List[pathlib.Path]:
+        """Directories to be listed again, as their files were being written."""
+        return [
+            directory
+            for directory, listing in self._directories.items()
+            if listing.mtime is None
+        ]
+
+    def rescan(self, directories: Optional[Iterable[pathlib.Path]] = None) -> Changes:
+        """Changes in given directories, or in whole trees if not given.
+
+        Subdirectories of given directories are not checked, unless new.
+        """
+        if directories is None:
+            pending = [(root, True) for root in self.roots]
+        else:
+            pending = [(directory, False) for directory in directories]
+
+        added: List[pathlib.Path] = []
+        removed: List[pathlib.Path] = []
+
+        while pending:
+            directory, recursive = pending.pop()
+            known = self._directories.get(directory)
+
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                self._forget(directory, removed)
+                continue
+            except OSError:
+                continue  # e.g. unreadable, checked again next time
+
+            if known is not None and known.mtime == mtime:
+                if recursive:
+                    pending.extend(
+                        (directory / name, True) for name in known.directories
+                    )
+                continue
+
+            previous = known or Directory(None, {}, [])
+
+            try:
+                listing = self._list(directory, mtime, previous)
+            except (FileNotFoundError, NotADirectoryError):
+                self._forget(directory, removed)
+                continue
+            except OSError:
+                continue
+
+            added.extend(
+                directory / name for name in listing.files if name not in previous.files
+            )
+            removed.extend(
+                directory / name for name in previous.files if name not in listing.files
+            )
+
+            for name in previous.directories:
+                if name not in listing.directories:
+                    self._forget(directory / name, removed)
+
+            self._directories[directory] = listing
+
+            # new directories are listed whole, others only when rescanning trees
+            pending.extend(
+                (directory / name, True)
+                for name in listing.directories
+                if recursive or name not in previous.directories
+            )
+
+        return Changes(added=added, removed=removed)
+
+    def _list(
+        self, directory: pathlib.Path, mtime: Optional[int], previous: Directory
+    ) -> Directory:
+        files: Dict[str, Tuple[int, int]] = {}
+        directories: List[str] = []
+        settled = time.time_ns() - SETTLE_DELAY
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.name)
+                elif entry.is_file() and has_image_extension(entry.name):
+                    stat = entry.stat()
+
+                    if stat.st_mtime_ns <= settled:
+                        files[entry.name] = stat.st_size, stat.st_mtime_ns
+                    else:
+                        # new files only found once written, others kept as is
+                        if entry.name in previous.files:
+                            files[entry.name] = previous.files[entry.name]
+                        mtime = None
+
+        if mtime is not None and mtime > settled:
+            mtime = None
+
+        return Directory(mtime, files, directories)
+
+    def _forget(self, directory: pathlib.Path, removed: List[pathlib.Path]):
+        listing = self._directories.pop(directory, None)
+        if listing is None:
+            return
+
+        removed.extend(directory / name for name in listing.files)
+        for name in listing.directories:
+            self._forget(directory / name, removed)
+
+
+class Inotify:
+    """Directories whose entries changed, as reported by Linux inotify.
+
+    Raises OSError if inotify is not available.
+    """
+
+    _EVENT = struct.Struct('iIII')  # watch descriptor, mask, cookie, name length
+
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+
+    MASK = (
+        IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+        | IN_ONLYDIR
+    )
+
+    def __init__(self):
+        try:
+            self._libc = ctypes.CDLL(None, use_errno=True)
+            init = self._libc.inotify_init1
+        except (AttributeError, OSError):
+            raise OSError("inotify is not available") from None
+
+        self._fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise self._error()
+
+        self._watched: Dict[int, pathlib.Path] = {}
+        self._descriptors: Dict[pathlib.Path, int] = {}
+
+    def _error(self) -> OSError:
+        errno = ctypes.get_errno()
+        return OSError(errno, os.strerror(errno))
+
+    def watch(self, directory: pathlib.Path):
+        """Report changes in directory, raises OSError if it cannot be watched,
+        e.g. if too many directories are watched already."""
+        if directory in self._descriptors:
+            return
+
+        descriptor = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), self.MASK
+        )
+        if descriptor < 0:
+            error = self._error()
+            if error.errno in (errno.ENOENT, errno.ENOTDIR):
+                return  # removed meanwhile, reported by its parent
+            raise error
+
+        self._watched[descriptor] = directory
+        self._descriptors[directory] = descriptor
+
+    def read(self, timeout: float) -> Optional[Set[pathlib.Path]]:
+        """Directories changed since last read, waiting for timeout seconds at most
+        for a change. None if events were lost, any directory may have changed."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed: Set[pathlib.Path] = set()
+
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size + length
+
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+
+                directory = self._watched.get(descriptor)
+                if directory is None:
+                    continue
+
+                changed.add(directory)
+
+                if mask & self.IN_IGNORED:
+                    # removed, or no longer watched
+                    del self._watched[descriptor]
+                    del self._descriptors[directory]
+
+    def close(self):
+        os.close(self._fd)
+
+
+class Watcher:
+    """Changes in trees under roots, found by a background thread.
+
+    A complete listing is reported first, and again once synced. Listings are
+    saved to index if given, and read from it when started.
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[pathlib.Path],
+        index: Optional[pathlib.Path] = None,
+        interval: float = POLL_INTERVAL,
+    ):
+        self.roots = [root.resolve() for root in roots]
+
+        self._index = index
+        self._interval = interval
+
+        self._changes: 'queue.Queue[Changes]' = queue.Queue()
+        self._sync = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._sync.set()
+        self._thread.start()
+
+    def sync(self):
+        """Report a complete listing again."""
+        self._sync.set()
+
+    def changes(self) -> List[Changes]:
+        """Changes found since last called, without waiting."""
+        found: List[Changes] = []
+        while True:
+            try:
+                found.append(self._changes.get_nowait())
+            except queue.Empty:
+                return found
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        # index read from this thread too, as it may be large
+        if self._index is None:
+            self._tree = Tree(self.roots)
+        else:
+            self._tree = Tree.load(self._index, self.roots)
+
+        try:
+            inotify: Optional[Inotify] = Inotify()
+        except OSError:
+            inotify = None
+
+        saved = time.monotonic()
+        changes = self._tree.rescan()
+
+        try:
+            while not self._stop.is_set():
+                inotify = self._watch(inotify)
+
+                if self._sync.is_set():
+                    self._sync.clear()
+                    changes = Changes(
+                        list(self._tree.files()), changes.removed, complete=True
+                    )
+
+                if changes.added != [] or changes.removed != [] or changes.complete:
+                    self._changes.put(changes)
+
+                    if self._index is not None and (
+                        time.monotonic() - saved > SAVE_INTERVAL or changes.complete
+                    ):
+                        self._tree.save(self._index)
+                        saved = time.monotonic()
+
+                changes = self._wait(inotify)
+        finally:
+            if inotify is not None:
+                inotify.close()
+            if self._index is not None:
+                self._tree.save(self._index)
+
+    def _watch(self, inotify: Optional[Inotify]) -> Optional[Inotify]:
+        # new directories watched, falling back to polling if any cannot be
+        if inotify is None:
+            return None
+
+        try:
+            for directory in list(self._tree.directories):
+                inotify.watch(directory)
+        except OSError:
+            inotify.close()
+            return None
+
+        return inotify
+
+    def _wait(self, inotify: Optional[Inotify]) -> Changes:
+        if inotify is None:
+            self._stop.wait(self._interval)
+            return self._tree.rescan()
+
+        changed = inotify.read(WAIT_INTERVAL)
+        if changed is None:
+            return self._tree.rescan()
+
+        return self._tree.rescan(changed.union(self._tree.unsettled()))
@@ -1,17 +1,52 @@
+import collections
+import concurrent.futures
 import itertools
+import pathlib
 import tkinter as tk
 import tkinter.ttk as ttk
 
-from typing import Callable, List, Optional
+from typing import AbstractSet, Callable, Iterable, List, Optional, Sequence, Tuple
 
 from bidict import bidict  # type: ignore
 from PIL import Image, ImageTk  # type: ignore
 
-from . import model
+from . import imaging, index, model, timing
 
 MIN_WIDTH = 128
 MIN_HEIGHT = 128
 
+CACHE_SIZE = 512 * 1024 * 1024  # bytes of decoded images kept in memory
+PREFETCH_COUNT = 2  # images decoded ahead on each side of the current one
+
+POLL_INTERVAL = 10  # milliseconds between checks for decoded images
+
+RESIZE_DELAY = 150  # milliseconds of stable size before rendering in high quality
+RENDERINGS_COUNT = 4  # sizes the current image remains rendered at
+
+WHEEL_ROWS = 3  # file list rows scrolled per mouse wheel step
+
+TIMINGS_INTERVAL = 500  # milliseconds between refreshes of displayed timings
+
+SortedImages = index.SortedIndex[model.Image]
+
+# images matching a filter, None when not filtering, raises ValueError if invalid
+Search = Callable[[str], Optional[AbstractSet[model.Image]]]
+
+# images looking like given one, including it, and images without those looking
+# like previous ones
+NearDuplicates = Callable[[model.Image], AbstractSet[model.Image]]
+Distinct = Callable[[], AbstractSet[model.Image]]
+
+ALL = 'all'
+NEAR_DUPLICATES = 'near duplicates'
+DISTINCT = 'distinct'
+
+MODES = {
+    ALL: "All images",
+    NEAR_DUPLICATES: "Near-duplicates of current",
+    DISTINCT: "Collapse duplicates",
+}
+
 
 class ImageDisplay(tk.Canvas):
     def __init__(self, master=None):
@@ -19,17 +54,69 @@ class ImageDisplay(tk.Canvas):
         self.configure(background='black')
 
         def configure(e: tk.Event):
-            if self._image is not None:
-                self._resize()
+            self._placeholder_center()
+
+            if self._path is not None:
+                self._preview()
+
+        self._path: Optional[pathlib.Path] = None
+        self._image: Optional[imaging.Decoded] = None
+
+        # most recently used last
+        self._renderings: 'collections.OrderedDict[imaging.Size, Image.Image]'
+        self._renderings = collections.OrderedDict()
+        self._rendered: Optional[Image.Image] = None
+
+        self._cache = imaging.ImageCache(max_bytes=CACHE_SIZE)
+        self._loader = imaging.Loader(cache=self._cache)
+
+        self._pending: Optional[concurrent.futures.Future] = None
+        self._pending_box: Optional[imaging.Size] = None
+        self._poll_job: Optional[str] = None
+        self._resize_job: Optional[str] = None
+
+        self._placeholder = self.create_text(0, 0, anchor=tk.CENTER, fill='gray')
+        self._placeholder_hide()
 
         self.bind('<Configure>', configure)
-        self._image = None
+        self.bind('<Destroy>', lambda _: self._loader.shutdown())
 
+    @timing.timed
     def set_image(self, image: Optional[model.Image]):
-        self._image = Image.open(image.path) if image else Image.new('RGB', (0, 0))
+        self._path = image.path if image else None
+        self._image = self._cache.get(image.path, self._box) if image else None
+
+        self._renderings.clear()
+        self._rendered = None
+
+        if image is None:
+            self._cancel()
+            self._set_canvas_image(Image.new('RGB', (0, 0)))
+            return
+
+        if self._image is None:
+            self._placeholder_show("Loading...")
+
         self._resize()
 
+    def prefetch(self, images: Iterable[model.Image]):
+        # most likely next images first
+        self._loader.prefetch(
+            (i.path for i in images if i.path not in self._cache), self._box
+        )
+
+    @property
+    def _box(self) -> Optional[imaging.Size]:
+        width = self.winfo_width()
+        height = self.winfo_height()
+
+        if width < MIN_WIDTH or height < MIN_HEIGHT:
+            return None
+        return width, height
+
     def _set_canvas_image(self, image: Image):
+        self._placeholder_hide()
+
         # keep stored as object attribute to prevent garbage collection
         self._photo = ImageTk.PhotoImage(master=self, image=image)
 
@@ -41,32 +128,135 @@ class ImageDisplay(tk.Canvas):
                 width / 2, height / 2, anchor=tk.CENTER, image=self._photo
             )
         else:
-            self.itemconfig(self._canvas_image, image=self._photo)
+            self.itemconfig(self._canvas_image, image=self._photo, state=tk.NORMAL)
             self.coords(self._canvas_image, width / 2, height / 2)
 
+    def _placeholder_show(self, text: str):
+        # never let previous image be mistaken for the one being loaded
+        if hasattr(self, '_canvas_image'):
+            self.itemconfig(self._canvas_image, state=tk.HIDDEN)
+
+        self.itemconfig(self._placeholder, text=text, state=tk.NORMAL)
+
+    def _placeholder_hide(self):
+        self.itemconfig(self._placeholder, state=tk.HIDDEN)
+
+    def _placeholder_center(self):
+        self.coords(self._placeholder, self.winfo_width() / 2, self.winfo_height() / 2)
+
+    def _preview(self):
+        # while the size keeps changing, only stretch what is already displayed
+        # and wait for it to settle before rendering in high quality
+        box = self._box
+        if box is None:
+            return
+
+        if box in self._renderings:
+            self._cancel()
+
+            self._renderings.move_to_end(box)
+            self._rendered = self._renderings[box]
+            self._set_canvas_image(self._rendered)
+            return
+
+        if self._resize_job is not None:
+            self.after_cancel(self._resize_job)
+            self._resize_job = None
+
+        if self._rendered is not None and self._image is not None:
+            size = imaging.fit(self._image.size, box)
+            self._set_canvas_image(self._rendered.resize(size, Image.BILINEAR))
+        elif self._pending is None:
+            # nothing to stretch nor being rendered, e.g. when first mapped
+            self._resize()
+            return
+
+        self._resize_job = self.after(RESIZE_DELAY, self._resize)
+
+    @timing.timed
     def _resize(self):
-        width = self.winfo_width()
-        height = self.winfo_height()
+        assert self._path is not None
 
-        if width < MIN_WIDTH or height < MIN_HEIGHT:
+        self._resize_job = None
+
+        box = self._box
+        if box is None:
             return
 
-        # use thumbnail to maintain aspect ratio
-        resized = self._image.copy()  # type: ignore
-        resized.thumbnail((width, height), Image.ANTIALIAS)
+        self._cancel()
+
+        self._pending = self._loader.render(self._path, box, self._image)
+        self._pending_box = box
+        self._poll_job = self.after(POLL_INTERVAL, self._poll)
+
+    def _cancel(self):
+        # result of an already running request is ignored once replaced
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
+
+        if self._resize_job is not None:
+            self.after_cancel(self._resize_job)
+            self._resize_job = None
 
+    def _poll(self):
+        assert self._pending is not None
+
+        if not self._pending.done():
+            self._poll_job = self.after(POLL_INTERVAL, self._poll)
+            return
+
+        future = self._pending
+
+        self._pending = None
+        self._poll_job = None
+
+        try:
+            self._image, resized = future.result()
+        except (OSError, ValueError):
+            self._placeholder_show("Cannot display image")
+            return
+
+        assert self._pending_box is not None
+
+        self._renderings[self._pending_box] = resized
+        while len(self._renderings) > RENDERINGS_COUNT:
+            self._renderings.popitem(last=False)
+
+        self._rendered = resized
         self._set_canvas_image(resized)
 
 
 class FileList(tk.Frame):
-    def __init__(self, master):
+    """List of images, only displaying the rows currently visible.
+
+    A fixed pool of tree rows is reused whatever the amount of images, hence
+    scrolling and selection cost does not depend on it. Filters are resolved by
+    search, looking through every image tags if not given. Modes only showing
+    near-duplicates are offered when given the images to show.
+    """
+
+    def __init__(
+        self,
+        master,
+        search: Optional[Search] = None,
+        near_duplicates: Optional[NearDuplicates] = None,
+        distinct: Optional[Distinct] = None,
+    ):
         super().__init__(master=master)
 
+        self._search: Search = search or self._scan
+        self._near_duplicates = near_duplicates
+        self._distinct = distinct
+
         tree = ttk.Treeview(master=self, selectmode='browse')
         scroll = ttk.Scrollbar(master=self, orient=tk.VERTICAL)
 
-        tree.configure(yscrollcommand=scroll.set)
-        scroll.configure(command=tree.yview)
+        scroll.configure(command=self._yview)
 
         frame = tk.Frame(master=self)
         frame.pack(fill=tk.X)
@@ -80,6 +270,36 @@ class FileList(tk.Frame):
 
         filter_variable.trace(tk.W, lambda *_: self.refresh())
         self._filter = filter_variable
+        self._filter_entry = filter_entry
+        self._filter_foreground = filter_entry.cget('foreground')
+
+        modes = [ALL]
+        if near_duplicates is not None:
+            modes.append(NEAR_DUPLICATES)
+        if distinct is not None:
+            modes.append(DISTINCT)
+
+        self._mode = ALL
+        self._anchor: Optional[model.Image] = None  # whose near-duplicates shown
+
+        if len(modes) > 1:
+            mode_frame = tk.Frame(master=self)
+            mode_frame.pack(fill=tk.X)
+
+            mode_label = tk.Label(master=mode_frame, text="Show")
+            mode_box = ttk.Combobox(
+                master=mode_frame,
+                state='readonly',
+                values=[MODES[mode] for mode in modes],
+            )
+            mode_box.current(0)
+            mode_label.pack(side=tk.LEFT)
+            mode_box.pack(fill=tk.X, expand=True)
+
+            mode_box.bind(
+                '<<ComboboxSelected>>',
+                lambda _: self.set_mode(modes[mode_box.current()]),
+            )
 
         # pack in this order to prevent scrollbar from disappearing when
         # reducing widget size
@@ -89,81 +309,310 @@ class FileList(tk.Frame):
         tree.heading('#0', text="File")
 
         tree.bind('<<TreeviewSelect>>', lambda _: self._on_select())
+        tree.bind('<Configure>', lambda _: self._render())
+
+        tree.bind('<MouseWheel>', lambda e: self._scroll(-e.delta // 120 * WHEEL_ROWS))
+        tree.bind('<Button-4>', lambda _: self._scroll(-WHEEL_ROWS))
+        tree.bind('<Button-5>', lambda _: self._scroll(WHEEL_ROWS))
+
+        tree.bind('<Up>', lambda _: self._step(-1))
+        tree.bind('<Down>', lambda _: self._step(1))
+        tree.bind('<Prior>', lambda _: self._step(-self._rows_count))
+        tree.bind('<Next>', lambda _: self._step(self._rows_count))
+        tree.bind('<Home>', lambda _: self._step(-len(self._displayed)))
+        tree.bind('<End>', lambda _: self._step(len(self._displayed)))
 
         self._tree = tree
+        self._scrollbar = scroll
+
+        self._pool: List[str] = []  # tree rows, reused whatever image they show
+        self._rows = bidict()  # rendered tree rows to images
+        self._row_metrics: Optional[Tuple[int, int]] = None
+        self._top = 0
+
+        self._selected: Optional[model.Image] = None
 
         self.set_images([])
 
     def _on_select(self):
+        selection = self._tree.selection()
+
+        # rendered rows selection only reflects current selection, unless
+        # changed by the user
+        if selection == () or self._rows[selection[0]] is self._selected:
+            return
+
+        self._selected = self._rows[selection[0]]
         self.event_generate('<<FileListSelect>>')
 
-    def _reset(self):
-        self._tree.delete(*self._tree.get_children())
+    def set_images(self, images: Iterable[model.Image]):
+        self._images: Sequence[model.Image]
 
-    def set_images(self, images: List[model.Image]):
-        if self.selected not in images:
-            self.select(None)
+        if isinstance(images, index.LazyIndex):
+            # rows images are only created once rendered
+            self._images = images
+        else:
+            self._images = index.SortedIndex(images, key=model.sort_key)
+        self._displayed = self._images
 
-        self._reset()
+        self.refresh()
 
-        index = bidict()
+        if self._selected is not None and self._selected not in self._images:
+            self.select(None)
 
-        ROOT = ''
-        for image in images:
-            text = image.path.name
-            iid = self._tree.insert(ROOT, tk.END, text=text)
-            index[iid] = image
+    def set_mode(self, mode: str):
+        """Show all images, near-duplicates of the selected one, or only one of
+        each group of near-duplicates, among those matching filter."""
+        assert mode in MODES
 
-        self._images_index = index
+        self._mode = mode
+        self._anchor = self._selected
+        self.refresh()
 
     @property
     def selected(self) -> Optional[model.Image]:
-        selection = self._tree.selection()
-
-        if selection == ():
-            return None
-
-        assert isinstance(selection, tuple) and len(selection) == 1
-        return self._images_index[selection[0]]
+        return self._selected
 
     def select(self, image: Optional[model.Image]):
         # prevent infinite callback loop
         if image == self.selected:
             return
 
-        if image is None:
-            self._tree.selection_set(())
+        assert image is None or image in self._images
+
+        self._selected = image
+
+        if image is not None and image in self._displayed:
+            self._see(self._displayed.index(image))
+
+        self._render()
+        self.event_generate('<<FileListSelect>>', when='tail')
+
+    def neighbours(self, image: model.Image, count: int) -> List[model.Image]:
+        """Displayed images around given one, nearest first and next before previous."""
+        if image not in self._displayed:
+            return []
+
+        position = self._displayed.index(image)
+
+        result: List[model.Image] = []
+
+        for distance in range(1, count + 1):
+            for i in (position + distance, position - distance):
+                if 0 <= i < len(self._displayed):
+                    result.append(self._displayed[i])
+        return result
+
+    def insert(self, images: Iterable[model.Image]):
+        """Add images at their sorted position, without rebuilding the list."""
+        images = list(images)
+        sorted_images, displayed = self._sorted()
+
+        # rows position would not be kept in view anyway
+        if sorted_images.is_bulk(len(images)):
+            sorted_images.update(images)
+            self.refresh()
             return
 
-        assert image in self._images_index.values()
+        try:
+            matching = self._matching()
+        except ValueError:
+            matching = frozenset()  # invalid filter is reported on refresh
+
+        for image in images:
+            position = sorted_images.add(image)
+
+            if matching is None:
+                self._keep_in_view(position, 1)
+            elif image in matching:
+                self._keep_in_view(displayed.add(image), 1)
+
+        self._render()
+
+    def remove(self, images: Iterable[model.Image]):
+        sorted_images, displayed = self._sorted()
+        filtered = displayed is not sorted_images
+        selected_removed = False
+
+        for image in images:
+            if filtered and image in displayed:
+                self._keep_in_view(displayed.remove(image), -1)
 
-        iid = self._images_index.inverse[image]
-        self._tree.selection_set((iid,))
+            position = sorted_images.remove(image)
+            if not filtered:
+                self._keep_in_view(position, -1)
+
+            selected_removed = selected_removed or image is self._selected
+
+        if selected_removed:
+            self.select(None)
+        else:
+            self._render()
 
     def refresh(self):
-        words = self._filter.get().split()
-
-        displayed = []
-        not_displayed = []
-
-        for item, image in self._images_index.items():
-            if (
-                any(
-                    word in tag.name
-                    for word, tag in itertools.product(words, image.tags)
-                )
-                or words == []
-            ):
-                displayed.append(item)
+        try:
+            matching = self._matching()
+        except ValueError:
+            # keep previous results while filter is being typed
+            self._filter_entry.configure(foreground='red')
+            return
+
+        self._filter_entry.configure(foreground=self._filter_foreground)
+
+        if matching is None:
+            self._displayed = self._images
+        else:
+            self._displayed = index.SortedIndex(
+                (image for image in matching if image in self._images),
+                key=model.sort_key,
+            )
+
+        self._render()
+
+    def _matching(self) -> Optional[AbstractSet[model.Image]]:
+        """Images matching filter and shown in current mode, None if all are."""
+        matching = self._search(self._filter.get())
+
+        shown: Optional[AbstractSet[model.Image]] = None
+
+        if self._mode == NEAR_DUPLICATES:
+            assert self._near_duplicates is not None
+            if self._anchor is None:
+                shown = frozenset()
             else:
-                not_displayed.append(item)
+                shown = self._near_duplicates(self._anchor)
+        elif self._mode == DISTINCT:
+            assert self._distinct is not None
+            shown = self._distinct()
+
+        if matching is None:
+            return shown
+        if shown is None:
+            return matching
+        return matching & shown
+
+    def _sorted(self) -> Tuple[SortedImages, SortedImages]:
+        """Images and displayed ones, for rows to be inserted or removed.
+
+        Images created lazily are all created first.
+        """
+        if not isinstance(self._images, index.SortedIndex):
+            images = index.SortedIndex(self._images, key=model.sort_key)
+            if self._displayed is self._images:
+                self._displayed = images
+            self._images = images
+
+        # filtered images are always sorted already
+        assert isinstance(self._images, index.SortedIndex)
+        assert isinstance(self._displayed, index.SortedIndex)
+        return self._images, self._displayed
+
+    def _scan(self, text: str) -> Optional[AbstractSet[model.Image]]:
+        words = text.split()
+
+        if words == []:
+            return None
+
+        return {
+            image
+            for image in self._images
+            if any(
+                word in tag.name for word, tag in itertools.product(words, image.tags)
+            )
+        }
+
+    def _keep_in_view(self, position: int, shift: int):
+        # rows inserted or removed above must not move the visible ones
+        if position < self._top:
+            self._top += shift
+
+    @property
+    def _rows_count(self) -> int:
+        if self._row_metrics is None:
+            return int(self._tree.cget('height'))
+
+        top, row_height = self._row_metrics
+        return max((self._tree.winfo_height() - top) // row_height, 1)
 
-        assert len(displayed) + len(not_displayed) == len(self._images_index)
+    def _measure_rows(self):
+        # rows size depends on theme and fonts, measure an actually rendered one
+        bbox = self._tree.bbox(self._pool[0]) if self._rows else ''
+
+        if bbox == '':
+            return
+
+        _, top, _, row_height = bbox
+        self._row_metrics = top, row_height
+
+    def _see(self, position: int):
+        count = self._rows_count
+
+        if position < self._top:
+            self._top = position
+        elif position >= self._top + count:
+            self._top = position - count + 1
+
+    def _scroll(self, rows: int):
+        self._top += rows
+        self._render()
+
+    def _yview(self, command: str, value: str, unit: str = ''):
+        if command == tk.MOVETO:
+            self._top = round(float(value) * len(self._displayed))
+        elif unit == tk.PAGES:
+            self._top += int(value) * self._rows_count
+        else:
+            self._top += int(value)
+
+        self._render()
+
+    def _step(self, rows: int) -> str:
+        if len(self._displayed) > 0:
+            if self._selected is None or self._selected not in self._displayed:
+                position = 0 if rows > 0 else len(self._displayed) - 1
+            else:
+                position = self._displayed.index(self._selected) + rows
+                position = max(0, min(position, len(self._displayed) - 1))
+
+            self.select(self._displayed[position])
+
+        return 'break'  # prevent default tree bindings
+
+    def _render(self):
+        if self._row_metrics is None:
+            self._measure_rows()
+
+        count = self._rows_count
+
+        self._top = max(0, min(self._top, len(self._displayed) - count))
+
+        start, stop = self._top, self._top + count
+        images = self._displayed[start:stop]
+
+        while len(self._pool) < len(images):
+            self._pool.append(self._tree.insert('', tk.END))
 
         ROOT = ''
-        for item in displayed:
-            self._tree.move(item, ROOT, tk.END)
-        self._tree.detach(*not_displayed)
+        for i, (iid, image) in enumerate(zip(self._pool, images)):
+            self._tree.item(iid, text=image.path.name)
+            self._tree.move(iid, ROOT, i)
+        shown = len(images)
+        self._tree.detach(*self._pool[shown:])
+
+        self._rows = bidict(zip(self._pool, images))
+
+        if self._selected in self._rows.inverse:
+            self._tree.selection_set((self._rows.inverse[self._selected],))
+        else:
+            self._tree.selection_set(())
+
+        if len(self._displayed) == 0:
+            self._scrollbar.set(0, 1)
+        else:
+            self._scrollbar.set(
+                self._top / len(self._displayed),
+                (self._top + len(images)) / len(self._displayed),
+            )
 
 
 class TagList(tk.Frame):
@@ -229,3 +678,53 @@ class TagList(tk.Frame):
             variable.set(tag in image.tags if image is not None else False)
 
         self._current_image = image
+
+
+class TimingsOverlay(tk.Label):
+    """Latency of operations, displayed over other widgets of master once shown.
+
+    Operations are timed from then on, if they were not already.
+    """
+
+    def __init__(self, master):
+        super().__init__(
+            master=master,
+            font='TkFixedFont',
+            justify=tk.LEFT,
+            background='black',
+            foreground='white',
+            padx=8,
+            pady=8,
+        )
+        self._refresh_job: Optional[str] = None
+
+    @property
+    def shown(self) -> bool:
+        return self._refresh_job is not None
+
+    def toggle(self):
+        if self.shown:
+            self.hide()
+        else:
+            self.show()
+
+    def show(self):
+        timing.enable()
+
+        self.place(relx=1.0, rely=0.0, anchor=tk.NE)
+        self.lift()
+        self._refresh()
+
+    def hide(self):
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+
+        self.place_forget()
+
+    def _refresh(self):
+        timings = timing.timings()
+        text = '' if timings is None else timing.table(timings.stats())
+
+        self.configure(text=text or "No operation timed yet")
+        self._refresh_job = self.after(TIMINGS_INTERVAL, self._refresh)
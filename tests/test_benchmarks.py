@@ -0,0 +1,43 @@
+from benchmarks import suite
+
+
+def test_synthetic():
+    model = suite.synthetic(100)
+
+    assert len(model.images) == 100
+    assert len(model.tags) == suite.TAGS_COUNT
+    assert all(len(image.tags) <= suite.MAX_TAGS for image in model.images)
+
+    assert [image.tags for image in suite.synthetic(100).order] == [
+        image.tags for image in model.order
+    ]
+
+
+def test_run():
+    names = ['storage.save[binary]', 'storage.load[sqlite]', 'Controller.update_tag']
+    results = suite.run(sizes=(10, 20), names=names, repeat=2)
+
+    assert set(results['results']) == set(names)
+    for timings in results['results'].values():
+        assert set(timings) == {'10', '20'}
+        assert all(
+            0 <= timing['min'] <= timing['median'] for timing in timings.values()
+        )
+
+
+def test_compare():
+    def results(**timings):
+        return {
+            'results': {
+                name: {'10': {'min': timing, 'median': timing}}
+                for name, timing in timings.items()
+            }
+        }
+
+    baseline = results(a=1.0, b=1.0, c=1.0)
+
+    assert suite.compare(results(a=1.2, b=0.5, d=9.0), baseline) == []
+    assert suite.compare(results(a=1.3, b=1.0), baseline) == [
+        suite.Regression('a', 10, 1.0, 1.3)
+    ]
+    assert suite.compare(results(a=1.3), baseline, tolerance=0.5) == []
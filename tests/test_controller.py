@@ -1,10 +1,19 @@
 import pathlib
 
+from typing import List, Set
 from unittest import mock
 
 import pytest  # type: ignore
 
-from picpick.controller import Controller
+from picpick import operations, query, storage, timing, view, watching
+from picpick.controller import (
+    Controller,
+    MISSING,
+    SAVE_POLL_INTERVAL,
+    WATCH_POLL_INTERVAL,
+)
+from picpick.events import Event
+from picpick.storage import journal
 from picpick.model import Model, Tag
 
 
@@ -33,18 +42,23 @@ def test_add_image(image_factory):
     assert not hasattr(controller, '_current_image')
 
     # adding the first image should automatically set it as current
-    controller.add_image(image_factory('foo.jpg'))
+    foo = image_factory('foo.jpg')
+    controller.add_image(foo)
     assert controller._current_image.path.name == 'foo.jpg'
     assert [image.path.name for image in controller.images] == ['foo.jpg']
 
-    view.update_images.assert_called_once_with()
+    # only the new row is inserted, list is not rebuilt
+    view.add_images.assert_called_once_with([foo])
+    view.update_images.assert_not_called()
     view.reset_mock()
 
-    controller.add_image(image_factory('bar.jpg'))
+    bar = image_factory('bar.jpg')
+    controller.add_image(bar)
     assert controller._current_image.path.name == 'foo.jpg'
     assert [image.path.name for image in controller.images] == ['bar.jpg', 'foo.jpg']
 
-    view.update_images.assert_called_once_with()
+    view.add_images.assert_called_once_with([bar])
+    view.update_images.assert_not_called()
     view.reset_mock()
 
     # adding the same image twice should fail
@@ -54,13 +68,184 @@ def test_add_image(image_factory):
         controller.add_image(image_factory('foo.jpg'))
     assert [image.path.name for image in controller.images] == ['bar.jpg', 'foo.jpg']
 
+    view.add_images.assert_not_called()
+    view.reset_mock()
+
+
+def test_add_images(image_factory):
+    view = mock.MagicMock()
+    controller = Controller(model=Model())
+    controller._view = view
+
+    foo, bar = image_factory('foo.jpg'), image_factory('bar.jpg')
+    assert controller.add_images([foo, bar]) == []
+    assert list(controller.images) == [bar, foo]
+
+    # first image in order becomes current, view is updated once
+    assert controller.current_image is bar
+    view.add_images.assert_called_once_with([foo, bar])
+    view.reset_mock()
+
+    # duplicates, even within the same batch, are skipped and returned
+    baz, other_baz = image_factory('baz.jpg'), image_factory('baz.jpg')
+    other_foo = image_factory('foo.jpg')
+    assert controller.add_images([baz, other_foo, other_baz]) == [other_foo, other_baz]
+    assert list(controller.images) == [bar, baz, foo]
+    assert controller.current_image is bar
+    view.add_images.assert_called_once_with([baz])
+    view.reset_mock()
+
+    assert controller.add_images([image_factory('bar.jpg')]) != []
+    view.add_images.assert_not_called()
+
+
+def test_remove_image(model: Model):
+    view = mock.MagicMock()
+    controller = Controller(model=model)
+    controller._view = view
+
+    one, three, two = controller.images
+
+    controller.remove_image(three)
+    assert list(controller.images) == [one, two]
+    assert controller.current_image is one
+
+    view.remove_images.assert_called_once_with([three])
     view.update_images.assert_not_called()
+    view.update_current_image.assert_not_called()
+    view.reset_mock()
+
+    # removing current image leaves no image selected
+    controller.remove_image(one)
+    assert list(controller.images) == [two]
+    assert controller.current_image is None
+
+    view.remove_images.assert_called_once_with([one])
+    view.update_current_image.assert_called_once_with()
+
+
+def published(view: mock.MagicMock) -> Set[Event]:
+    return {call.args[0] for call in view.publish.call_args_list}
+
+
+def test_batch(model: Model, image_factory):
+    view = mock.MagicMock()
+    controller = Controller(model=model)
+    controller._view = view
+
+    red, green = Tag(name='red'), Tag(name='green')
+
+    with controller.batch():
+        controller.add_tag(Tag(name='yellow'))
+
+        # nested batches too
+        with controller.batch():
+            controller.tag_current_image(red)
+            controller.add_image(image_factory('four.jpg'))
+
+        controller.update_tag(green, Tag(name='lime'))
+        controller.untag_current_image(red)
+
+    assert controller.tags == [
+        Tag(name='blue'),
+        Tag(name='lime'),
+        Tag(name='red'),
+        Tag(name='yellow'),
+    ]
+    assert len(controller.images) == 4
+
+    # only published, view is updated once per kind of change when idle
+    view.update_tags.assert_not_called()
+    view.add_images.assert_not_called()
+    assert published(view) == {
+        Event.IMAGES_CHANGED,
+        Event.TAGS_CHANGED,
+        Event.CURRENT_IMAGE_TAGS_CHANGED,
+    }
     view.reset_mock()
 
+    # changes outside of a batch are applied right away
+    controller.add_tag(Tag(name='purple'))
+    view.update_tags.assert_called_once_with()
+    view.publish.assert_not_called()
+
+
+def test_apply_labels(basedir: pathlib.Path, model: Model):
+    view = mock.MagicMock()
+    controller = Controller(model=model)
+    controller._view = view
+
+    applied = controller.apply_labels(
+        [
+            (basedir / 'one.jpg', 'red'),
+            (basedir / 'two.jpg', 'yellow'),
+            (basedir / 'missing.jpg', 'red'),
+        ]
+    )
+    assert (applied.tagged, applied.created, applied.unresolved) == (
+        2,
+        [Tag(name='yellow')],
+        1,
+    )
+    assert model.order[0].tags == {Tag(name='red')}
+    assert Tag(name='yellow') in controller.tags
+
+    # view is updated once, along with current image tags
+    view.update_tags.assert_not_called()
+    assert published(view) == {Event.TAGS_CHANGED, Event.CURRENT_IMAGE_TAGS_CHANGED}
+    assert controller._journal.operations == [
+        operations.TagImage(path=basedir / 'one.jpg', name='red'),
+        operations.AddTag(name='yellow'),
+        operations.TagImage(path=basedir / 'two.jpg', name='yellow'),
+    ]
+
+
+def test_watch(basedir: pathlib.Path, model: Model, image_factory):
+    view = mock.MagicMock()
+    controller = Controller(model=model)
+    controller._view = view
+
+    one, three, two = controller.images
+    controller.tag_current_image(Tag(name='red'))
+    four = image_factory('four.jpg')
+
+    with mock.patch('picpick.watching.Watcher') as Watcher:
+        Watcher.return_value.roots = [basedir]
+        Watcher.return_value.changes.return_value = [
+            watching.Changes(added=[one.path, four.path], removed=[], complete=True)
+        ]
+        controller.watch([basedir])
+
+    # images not listed are missing, new ones added
+    assert [image.path.name for image in controller.images] == [
+        'four.jpg',
+        'one.jpg',
+        'three.jpg',
+        'two.jpg',
+    ]
+    assert MISSING in controller.tags
+    assert controller._model.index.tagged(MISSING) == {two, three}
+    view.after.assert_called_once_with(WATCH_POLL_INTERVAL, controller._poll_watch)
+
+    # current image keeps its tags, and is no longer missing once back
+    view.reset_mock()
+    controller._apply_changes(watching.Changes(added=[], removed=[one.path]))
+    assert one.tags == {Tag(name='red'), MISSING}
+
+    controller._apply_changes(watching.Changes(added=[one.path], removed=[]))
+    assert one.tags == {Tag(name='red')}
+
+    assert Event.CURRENT_IMAGE_TAGS_CHANGED in published(view)
+
+    assert controller._journal.operations[-2:] == [
+        operations.TagImage(path=one.path, name='missing'),
+        operations.UntagImage(path=one.path, name='missing'),
+    ]
+
 
 def test_images(image_factory):
     controller = Controller(model=Model())
-    assert controller.images == []
+    assert list(controller.images) == []
 
     for name in ('foo.jpg', 'bar.jpg', 'baz.jpg'):
         controller.add_image(image_factory(name))
@@ -260,5 +445,234 @@ def test_load_empty_project(basedir: pathlib.Path):
     assert controller._model is not model
 
     assert controller.current_image is None
-    assert controller.images == []
+    assert list(controller.images) == []
     assert controller.tags == []
+
+
+def test_save_changes(basedir: pathlib.Path, model: Model, image_factory):
+    controller = Controller(model=model)
+    controller._view = mock.MagicMock()
+
+    red = Tag(name='red')
+    one = controller.current_image
+    assert one is not None
+
+    # changes are only journaled once saved to a file
+    controller.tag_current_image(red)
+    assert controller._journal.path is None
+
+    save_path = basedir / 'save.picpick'
+    controller.save(save_path)
+    assert controller._journal.path == journal.path_for(save_path)
+    assert controller._journal.operations == []
+
+    four = image_factory('four.jpg')
+    controller.add_image(four)
+    controller.untag_current_image(red)
+    controller.set_tags({red, Tag(name='lime')})
+
+    changes = controller._journal.operations
+    assert changes[:2] == [
+        operations.AddImage(path=four.path),
+        operations.UntagImage(path=one.path, name='red'),
+    ]
+    assert set(changes[2:]) == {
+        operations.DeleteTag(name='green'),
+        operations.DeleteTag(name='blue'),
+        operations.AddTag(name='lime'),
+    }
+
+    # without reading the model, hence without snapshot
+    with mock.patch('picpick.storage.update') as update, mock.patch.object(
+        model, 'snapshot', side_effect=AssertionError
+    ):
+        controller.save(save_path, background=True)
+        controller._wait_for_save()
+    assert update.call_args[0][:3] == (save_path, changes, one.path)
+    assert controller._journal.operations == []
+
+    # saving elsewhere writes everything, and drops previous journal
+    controller.add_tag(Tag(name='yellow'))
+
+    other_path = basedir / 'other.picpick'
+    with mock.patch('picpick.storage.save') as save:
+        save.side_effect = lambda to, *args, **kwargs: to.touch()
+        controller.save(other_path)
+    assert 'changes' not in save.call_args[1]
+    assert not journal.path_for(save_path).exists()
+    assert journal.path_for(other_path).exists()
+
+
+def test_tags_manager_changes_saved(basedir: pathlib.Path, model: Model):
+    controller = Controller(model=model)
+    controller._view = mock.MagicMock()
+
+    save_path = basedir / 'save.picpick'
+    controller.save(save_path)
+
+    def edit(master, tags, displayed_tags):
+        # as the dialog does, editing given tags in place
+        tags.add(Tag(name='new'))
+        tags.discard(Tag(name='blue'))
+        return mock.Mock(tags=tags, displayed_tags=displayed_tags)
+
+    section = mock.Mock(_controller=controller, _displayed_tags=[])
+    with mock.patch('picpick.view.dialogs.TagsManagerDialog', side_effect=edit):
+        view.TagSection._open_tags_manager(section)
+
+    assert set(controller._journal.operations) == {
+        operations.AddTag(name='new'),
+        operations.DeleteTag(name='blue'),
+    }
+
+    controller.tag_current_image(Tag(name='new'))
+    one = controller.current_image
+    assert one is not None
+
+    controller.save(save_path)
+
+    loaded, _ = storage.load(save_path)
+    assert {image.path: image.tags for image in loaded.images}[one.path] == {
+        Tag(name='new')
+    }
+    assert Tag(name='blue') not in loaded.tags
+
+
+def test_load_journaled_changes(basedir: pathlib.Path, model: Model):
+    controller = Controller(model=model)
+    controller._view = mock.MagicMock()
+
+    save_path = basedir / 'save.picpick'
+    controller.save(save_path)
+
+    controller.tag_current_image(Tag(name='red'))
+    controller.add_tag(Tag(name='yellow'))
+
+    # as if application had crashed
+    controller._journal.close()
+
+    controller = Controller(model=Model())
+    controller._view = mock.MagicMock()
+    controller.load(save_path)
+
+    one = controller.current_image
+    assert one is not None and one.path.name == 'one.jpg'
+
+    assert Tag(name='yellow') in controller.tags
+    assert one.tags == {Tag(name='red')}
+
+    assert controller._journal.operations == [
+        operations.TagImage(path=one.path, name='red'),
+        operations.AddTag(name='yellow'),
+    ]
+
+    # replayed changes are still to be saved
+    assert controller.journaled
+    assert controller._view.mock_calls[-2:] == [
+        mock.call.mark_saved('save.picpick'),
+        mock.call.mark_unsaved(),
+    ]
+
+    controller._journal.close()
+    controller = Controller(model=Model())
+    assert not controller.journaled
+
+    controller._view = mock.MagicMock()
+    controller.load(save_path)
+    controller._view.mark_unsaved.assert_called_once()
+
+    # nothing replayed once saved
+    controller.save(save_path)
+    controller._journal.close()
+
+    controller = Controller(model=Model())
+    controller._view = mock.MagicMock()
+    controller.load(save_path)
+    controller._view.mark_unsaved.assert_not_called()
+
+
+def test_save_in_background(basedir: pathlib.Path, model: Model):
+    controller = Controller(model=model)
+    controller._view = mock.MagicMock()
+
+    red = Tag(name='red')
+    one = controller.current_image
+    assert one is not None
+
+    save_path = basedir / 'save.picpick'
+    controller.save(save_path, background=True)
+    controller._view.after.assert_called_once_with(
+        SAVE_POLL_INTERVAL, controller._poll_save
+    )
+
+    # made after project snapshot was taken
+    controller.tag_current_image(red)
+
+    controller._wait_for_save()
+    controller._view.mark_saved.assert_called_once_with('save.picpick')
+    controller._view.mark_unsaved.assert_called_once_with()
+    assert controller._journal.operations == [
+        operations.TagImage(path=one.path, name='red')
+    ]
+
+    journaled: List[operations.Operation] = []
+    loaded_model, _ = storage.load(save_path, changes=journaled)
+    assert journaled == [operations.TagImage(path=one.path, name='red')]
+
+    # failed save keeps changes journaled
+    with mock.patch('picpick.storage.save') as save, mock.patch(
+        'picpick.storage.update'
+    ) as update:
+        save.side_effect = update.side_effect = OSError("No space left on device")
+        controller.save(save_path, background=True)
+        controller._wait_for_save()
+
+    controller._view.show_error.assert_called_once()
+    assert controller._journal.operations == [
+        operations.TagImage(path=one.path, name='red')
+    ]
+
+
+def test_search(model: Model):
+    controller = Controller(model=model)
+    one, three, two = controller.images
+
+    controller.tag_current_image(Tag(name='red'))
+    controller.set_current_image(two)
+    controller.tag_current_image(Tag(name='green'))
+
+    assert controller.search('') is None
+    assert controller.search('  ') is None
+
+    assert controller.search('red') == {one}
+    assert controller.search('re') == {one, two}  # red and green
+    assert controller.search('red blue') == {one}
+    assert controller.search('yellow') == set()
+    assert controller.search('"re"') == set()
+    assert controller.search('re AND NOT green') == {one}
+    assert controller.search('untagged') == {three}
+
+    with pytest.raises(query.QuerySyntaxError):
+        controller.search('red AND')
+
+    controller.untag_current_image(Tag(name='green'))
+    assert controller.search('re') == {one}
+
+    controller.delete_tag(Tag(name='red'))
+    assert controller.search('re') == set()
+
+
+def test_timings(model: Model, basedir):
+    controller = Controller(model=model)
+    timings = timing.enable()
+
+    try:
+        controller.add_tag(Tag(name='new'))
+        controller.save(basedir / 'project.picpick')
+    finally:
+        timing.disable()
+
+    stats = timings.stats()
+    assert stats['Controller.add_tag'].calls == 1
+    assert stats['Controller.save'].calls == 1
+    assert stats['storage.save'].calls == 1
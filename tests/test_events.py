@@ -0,0 +1,46 @@
+from typing import List
+from unittest import mock
+
+from picpick.events import Event, EventBus
+
+
+def test_event_bus():
+    scheduled: List = []
+    bus = EventBus(schedule=scheduled.append)
+
+    calls = []
+    images, tags = mock.Mock(), mock.Mock()
+    images.side_effect = lambda: calls.append('images')
+    tags.side_effect = lambda: calls.append('tags')
+    title = mock.Mock()
+
+    bus.subscribe(Event.IMAGES_CHANGED, images)
+    bus.subscribe(Event.TAGS_CHANGED, tags)
+    bus.subscribe(Event.CURRENT_IMAGE_TAGS_CHANGED, tags)
+    for event in Event:
+        bus.subscribe(event, title, immediate=True)
+
+    bus.publish(Event.TAGS_CHANGED)
+    bus.publish(Event.CURRENT_IMAGE_TAGS_CHANGED)
+    bus.publish(Event.IMAGES_CHANGED)
+    bus.publish(Event.TAGS_CHANGED)
+
+    # immediate subscribers are called on each publication
+    assert title.call_count == 4
+    tags.assert_not_called()
+
+    # others are called once, in subscription order, when scheduled flush runs
+    assert scheduled == [bus.flush]
+    bus.flush()
+    assert calls == ['images', 'tags']
+
+    # nothing is delivered twice
+    bus.flush()
+    assert calls == ['images', 'tags']
+
+    # events without deferred subscribers schedule nothing
+    bus.publish(Event.CURRENT_IMAGE_CHANGED)
+    assert scheduled == [bus.flush]
+
+    bus.publish(Event.IMAGES_CHANGED)
+    assert scheduled == [bus.flush, bus.flush]
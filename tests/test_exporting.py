@@ -0,0 +1,92 @@
+import csv
+import gzip
+import json
+import pathlib
+
+import pytest  # type: ignore
+
+from picpick import exporting, query
+from picpick.model import Model, Tag
+
+
+@pytest.fixture
+def tagged(model: Model) -> Model:
+    one, three, two = model.order
+    red, green = Tag(name='red'), Tag(name='green')
+
+    model.tag(one, red)
+    model.tag(one, green)
+    model.tag(two, red)
+    return model
+
+
+def test_export_csv(basedir: pathlib.Path, tagged: Model):
+    output = basedir / 'tags.csv'
+    exporting.export(output, tagged, exporting.CSV)
+
+    with output.open(newline='') as f:
+        rows = list(csv.reader(f))
+
+    assert rows == [
+        ['path', 'tags'],
+        [str(basedir / 'one.jpg'), 'green;red'],
+        [str(basedir / 'three.jpg'), ''],
+        [str(basedir / 'two.jpg'), 'red'],
+    ]
+
+
+def test_export_jsonl(basedir: pathlib.Path, tagged: Model):
+    output = basedir / 'tags.jsonl.gz'
+    exporting.export(
+        output,
+        tagged,
+        exporting.JSONL,
+        text='red AND NOT green',
+        compression=exporting.compression_of(output),
+    )
+
+    with gzip.open(output, 'rt') as f:
+        records = [json.loads(line) for line in f]
+
+    assert records == [{'path': str(basedir / 'two.jpg'), 'tags': ['red']}]
+
+    # nothing is written if query is invalid
+    output = basedir / 'invalid.jsonl'
+    with pytest.raises(query.QuerySyntaxError):
+        exporting.export(output, tagged, exporting.JSONL, text='red AND')
+    assert not output.exists()
+
+
+def test_export_coco(basedir: pathlib.Path, tagged: Model):
+    output = basedir / 'tags.json'
+    exporting.export(output, tagged, exporting.COCO, text='red')
+
+    dataset = json.loads(output.read_text())
+    assert dataset['categories'] == [
+        {'id': 1, 'name': 'blue'},
+        {'id': 2, 'name': 'green'},
+        {'id': 3, 'name': 'red'},
+    ]
+    assert dataset['images'] == [
+        {'id': 1, 'file_name': str(basedir / 'one.jpg')},
+        {'id': 2, 'file_name': str(basedir / 'two.jpg')},
+    ]
+    assert dataset['annotations'] == [
+        {'id': 1, 'image_id': 1, 'category_id': 2},
+        {'id': 2, 'image_id': 1, 'category_id': 3},
+        {'id': 3, 'image_id': 2, 'category_id': 3},
+    ]
+
+
+def test_export_zstd(basedir: pathlib.Path, tagged: Model, monkeypatch):
+    output = basedir / 'tags.csv.zst'
+    assert exporting.compression_of(output) == exporting.ZSTD
+
+    if exporting.zstandard is not None:
+        exporting.export(output, tagged, exporting.CSV, compression=exporting.ZSTD)
+        with exporting.zstandard.open(output, 'rt') as f:
+            assert f.readline().strip() == 'path,tags'
+
+    monkeypatch.setattr(exporting, 'zstandard', None)
+    with pytest.raises(exporting.CompressionUnavailable):
+        exporting.export(output, tagged, exporting.CSV, compression=exporting.ZSTD)
@@ -0,0 +1,80 @@
+import pathlib
+
+from typing import List
+
+import pytest  # type: ignore
+
+from PIL import Image as PILImage  # type: ignore
+
+from picpick import hashing, operations
+from picpick.index import distance
+from picpick.model import Image, Model
+
+
+def gradient(path: pathlib.Path, size=(64, 48), flip: bool = False):
+    width, height = size
+    image = PILImage.new('L', size)
+    image.putdata(
+        [
+            (x * 255 // width + y * 128 // height) % 256
+            for y in range(height)
+            for x in range(width)
+        ]
+    )
+    if flip:
+        image = image.transpose(PILImage.FLIP_LEFT_RIGHT)
+    image.convert('RGB').save(path)
+
+
+@pytest.fixture
+def paths(basedir: pathlib.Path) -> List[pathlib.Path]:
+    gradient(basedir / 'original.png')
+    gradient(basedir / 'resized.jpg', size=(128, 96))  # and compressed
+    gradient(basedir / 'flipped.png', flip=True)
+    (basedir / 'broken.jpg').write_bytes(b'not an image')
+
+    return [
+        basedir / name
+        for name in ('original.png', 'resized.jpg', 'flipped.png', 'broken.jpg')
+    ]
+
+
+@pytest.mark.parametrize('kind', hashing.KINDS)
+def test_hash_images(paths: List[pathlib.Path], kind: str):
+    hashed = list(hashing.hash_images(paths, kind, processes=2))
+    assert [path for path, _ in hashed] == paths
+
+    original, resized, flipped, broken = (value for _, value in hashed)
+    assert broken is None
+    assert original is not None and resized is not None and flipped is not None
+
+    assert distance(original, resized) <= hashing.NEAR_DISTANCE
+    assert distance(original, flipped) > hashing.NEAR_DISTANCE
+
+
+@pytest.mark.parametrize('kind', hashing.KINDS)
+def test_hash_arrays(paths: List[pathlib.Path], kind: str, monkeypatch):
+    if hashing.numpy is None:
+        pytest.skip("NumPy is not installed")
+
+    vectorized = hashing.hash_chunk(paths, kind)
+    monkeypatch.setattr(hashing, 'numpy', None)
+    assert hashing.hash_chunk(paths, kind) == vectorized
+
+
+def test_hash_model(paths: List[pathlib.Path]):
+    model = Model()
+    model.add_images(Image(path=path) for path in paths)
+    recorded: List[operations.Operation] = []
+
+    hashed = hashing.hash_model(model, model.order, recorded.append)
+    assert hashed.hashed == 3
+    assert hashed.unreadable == [paths[3]]
+
+    original = model.image_at(paths[0])
+    assert original is not None and original.hash is not None
+    assert operations.HashImage(path=paths[0], hash=original.hash) in recorded
+    assert len(recorded) == 3
+
+    resized = model.image_at(paths[1])
+    assert model.near_duplicates(original, hashing.NEAR_DISTANCE) == {original, resized}
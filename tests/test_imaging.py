@@ -0,0 +1,152 @@
+import concurrent.futures
+import os
+import pathlib
+
+from PIL import Image as PILImage  # type: ignore
+
+from picpick import imaging
+
+
+def test_image_cache(basedir: pathlib.Path):
+    paths = []
+    for name in ('a.png', 'b.png', 'c.png'):
+        path = basedir / name
+        PILImage.new(mode='RGB', size=(8, 8)).save(path)
+        paths.append(path)
+
+    a, b, c = paths
+
+    # room for exactly two 8x8 RGB images
+    cache = imaging.ImageCache(max_bytes=2 * 8 * 8 * 3)
+    assert len(cache) == 0
+    assert a not in cache
+
+    image = cache.load(a)
+    assert image.image.size == image.size == (8, 8)
+    assert a in cache
+    assert cache.load(a) is image
+    assert cache.bytes == 8 * 8 * 3
+
+    cache.load(b)
+    assert a in cache and b in cache
+
+    # a was used more recently than b, hence b must be evicted
+    cache.get(a)
+    cache.load(c)
+    assert len(cache) == 2
+    assert a in cache and b not in cache and c in cache
+    assert cache.bytes == 2 * 8 * 8 * 3
+
+    # modified files must not be served from cache
+    stat = os.stat(a)
+    os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert a not in cache
+    assert cache.get(a) is None
+    assert cache.load(a) is not image
+
+    # images larger than the whole budget are never cached
+    large = basedir / 'large.png'
+    PILImage.new(mode='RGB', size=(16, 16)).save(large)
+    cache.load(large)
+    assert large not in cache
+    assert len(cache) == 2
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.bytes == 0
+
+
+def test_loader(basedir: pathlib.Path):
+    path = basedir / 'a.png'
+    PILImage.new(mode='RGB', size=(64, 32)).save(path)
+
+    cache = imaging.ImageCache(max_bytes=1024 * 1024)
+    loader = imaging.Loader(cache=cache)
+
+    image, resized = loader.render(path, (16, 16)).result(timeout=5)
+    assert image.size == (64, 32)
+    assert resized.size == (16, 8)
+    assert path in cache
+
+    # already decoded images are only resized
+    other, resized = loader.render(path, (32, 32), image).result(timeout=5)
+    assert other is image
+    assert resized.size == (32, 16)
+
+    prefetched = basedir / 'b.png'
+    PILImage.new(mode='RGB', size=(8, 8)).save(prefetched)
+    missing = basedir / 'missing.png'
+
+    # unreadable files must not prevent others from being prefetched
+    loader.prefetch([missing, prefetched])
+    concurrent.futures.wait(loader._prefetching, timeout=5)
+    assert prefetched in cache
+    assert missing not in cache
+
+    loader.shutdown()
+
+
+def test_fit():
+    assert imaging.fit((64, 32), (16, 16)) == (16, 8)
+    assert imaging.fit((32, 64), (16, 16)) == (8, 16)
+    assert imaging.fit((64, 32), (128, 128)) == (64, 32)  # never upscaled
+    assert imaging.fit((1000, 1), (10, 10)) == (10, 1)
+
+
+def test_decode_at_display_scale(basedir: pathlib.Path):
+    path = basedir / 'large.jpg'
+    PILImage.new(mode='RGB', size=(1600, 1200)).save(path)
+
+    decoded = imaging.decode(path)
+    assert decoded.image.size == decoded.size == (1600, 1200)
+    assert decoded.covers(None)
+
+    # smallest JPEG scale still larger than display, here 1/4
+    decoded = imaging.decode(path, (300, 300))
+    assert decoded.size == (1600, 1200)
+    assert decoded.image.size == (400, 300)
+    assert decoded.covers((300, 300))
+    assert not decoded.covers((800, 800))
+    assert not decoded.covers(None)
+
+    assert imaging.thumbnail(decoded.image, (300, 300)).size == (300, 225)
+
+    # other formats are always fully decoded
+    path = basedir / 'large.png'
+    PILImage.new(mode='RGB', size=(1600, 1200)).save(path)
+
+    decoded = imaging.decode(path, (300, 300))
+    assert decoded.image.size == decoded.size == (1600, 1200)
+
+    # reduced then resampled to the exact fitting size
+    assert imaging.thumbnail(decoded.image, (300, 300)).size == (300, 225)
+    assert imaging.thumbnail(decoded.image, (1600, 1600)) is decoded.image
+
+    # modes which cannot be reduced as they are, e.g. palette PNG
+    for mode in ('P', '1'):
+        path = basedir / f'{mode}.png'
+        PILImage.new(mode=mode, size=(1600, 1200)).save(path)
+
+        decoded = imaging.decode(path, (300, 300))
+        assert decoded.image.mode == mode
+        assert imaging.thumbnail(decoded.image, (300, 300)).size == (300, 225)
+
+    image = PILImage.new(mode='I;16', size=(1600, 1200))
+    assert imaging.thumbnail(image, (300, 300)).size == (300, 225)
+
+
+def test_cache_scale(basedir: pathlib.Path):
+    path = basedir / 'large.jpg'
+    PILImage.new(mode='RGB', size=(1600, 1200)).save(path)
+
+    cache = imaging.ImageCache(max_bytes=16 * 1024 * 1024)
+
+    small = cache.load(path, (200, 200))
+    assert cache.get(path, (200, 200)) is small
+    assert cache.get(path, (100, 100)) is small
+
+    # decoded again at a larger scale once display grew
+    assert cache.get(path, (800, 800)) is None
+    large = cache.load(path, (800, 800))
+    assert large.image.size == (800, 600)
+    assert cache.get(path, (200, 200)) is large
@@ -0,0 +1,64 @@
+import pathlib
+
+from picpick import importing, storage
+from picpick.model import Tag
+
+
+def test_import_images(basedir: pathlib.Path, image_factory):
+    root = basedir / 'images'
+    (root / 'nested' / 'deeper').mkdir(parents=True)
+
+    image_factory('images/one.jpg')
+    image_factory('images/nested/two.png')
+    image_factory('images/nested/deeper/three.JPG')
+    (root / 'notes.txt').write_text("not an image")
+    (root / 'nested' / 'broken.jpg').write_bytes(b'not an image either')
+
+    assert sorted(path.name for path in importing.scan([root])) == ['one.jpg']
+    assert sorted(path.name for path in importing.scan([root], recursive=True)) == [
+        'broken.jpg',
+        'one.jpg',
+        'three.JPG',
+        'two.png',
+    ]
+
+    project = basedir / 'out.picpick'
+    imported = importing.import_images(project, [root / 'nested'])
+    assert (imported.added, imported.present) == (1, 0)
+    assert [path.name for path in imported.invalid] == ['broken.jpg']
+
+    model, current_index = storage.load(project)
+    assert [image.path.name for image in model.order] == ['two.png']
+    assert current_index == 0
+
+    imported = importing.import_images(project, [root], recursive=True)
+    assert (imported.added, imported.present) == (2, 1)
+
+    # current image is kept
+    model, current_index = storage.load(project)
+    assert [image.path.name for image in model.order] == [
+        'one.jpg',
+        'three.JPG',
+        'two.png',
+    ]
+    assert current_index == 2
+
+    # existing tags are kept
+    model.add_tag(Tag(name='red'))
+    model.tag(model.order[1], Tag(name='red'))
+    storage.save(project, model, current_index=1)
+
+    image_factory('images/four.jpg')
+    imported = importing.import_images(
+        project, [root, root / 'nested'], True, hash=True
+    )
+    assert (imported.added, imported.present, imported.unhashed) == (1, 3, [])
+
+    model, current_index = storage.load(project)
+    assert len(model.images) == 4
+    assert [image.path.name for image in model.order if image.hash is not None] == [
+        'four.jpg'
+    ]
+    assert current_index is not None
+    assert model.order[current_index].path.name == 'three.JPG'
+    assert model.order[current_index].tags == {Tag(name='red')}
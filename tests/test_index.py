@@ -0,0 +1,259 @@
+import random
+
+from unittest import mock
+
+import pytest  # type: ignore
+
+from picpick import index as index_module
+from picpick.index import distance, HashIndex, LazyIndex, SortedIndex, TagIndex
+from picpick.model import Tag
+
+
+def test_sorted_index():
+    index = SortedIndex(['delta', 'alpha', 'charlie', 'bravo'], key=str)
+
+    assert len(index) == 4
+    assert list(index) == ['alpha', 'bravo', 'charlie', 'delta']
+    assert index[0] == 'alpha'
+    assert index[-1] == 'delta'
+    assert index[1:3] == ['bravo', 'charlie']
+
+    assert 'charlie' in index
+    assert 'echo' not in index
+
+    assert index.index('alpha') == 0
+    assert index.index('delta') == 3
+
+    with pytest.raises(ValueError):
+        index.index('echo')
+
+    empty: SortedIndex[str] = SortedIndex([], key=str)
+    assert len(empty) == 0
+    assert list(empty) == []
+
+
+def test_sorted_index_mutations():
+    index = SortedIndex(['delta', 'bravo'], key=len)
+
+    assert index.add('alpha') == 2  # after items with an equal key
+    assert list(index) == ['delta', 'bravo', 'alpha']
+    assert index.index('alpha') == 2
+
+    assert index.add('foxtrot') == 3
+    assert index.add('echo') == 0
+    assert list(index) == ['echo', 'delta', 'bravo', 'alpha', 'foxtrot']
+    assert index.index('foxtrot') == 4
+
+    assert index.remove('bravo') == 2
+    assert list(index) == ['echo', 'delta', 'alpha', 'foxtrot']
+    assert 'bravo' not in index
+    assert index.index('alpha') == 2
+
+    # positions computed, then removal invalidates them
+    assert index.remove('echo') == 0
+    assert index.index('delta') == 0
+
+    with pytest.raises(ValueError):
+        index.remove('echo')
+
+
+def test_sorted_index_update():
+    index = SortedIndex(['delta'], key=len)
+
+    # few items are inserted one by one, many are sorted together
+    index.update(['echo'])
+    assert list(index) == ['echo', 'delta']
+
+    index.update(['alpha', 'bo', 'foxtrot'])
+    assert list(index) == ['bo', 'echo', 'delta', 'alpha', 'foxtrot']
+    assert index.index('alpha') == 3
+    assert 'bo' in index
+
+    assert index.add('bravo') == 4
+    assert index.remove('echo') == 1
+
+
+def test_sorted_index_update_many(monkeypatch):
+    monkeypatch.setattr(index_module, 'BLOCK_SIZE', 16)
+    rng = random.Random(0)
+
+    items = [f'{i:05}' for i in range(5000)]
+    rng.shuffle(items)
+    index = SortedIndex(items[:3000], key=str)
+
+    assert not index.is_bulk(index_module.BULK_SIZE)
+    assert index.is_bulk(index_module.BULK_SIZE + 1)
+    assert SortedIndex(['a'], key=str).is_bulk(2)
+
+    # many items are sorted along with others at once, never inserted one by one
+    with mock.patch.object(SortedIndex, 'add', side_effect=AssertionError):
+        index.update(items[3000:])
+
+    assert list(index) == sorted(items)
+    assert index.index('04999') == 4999
+    assert index[2500] == '02500'
+    assert index.add('02500a') == 2501
+    assert index.remove('00000') == 0
+
+
+def test_sorted_index_blocks(monkeypatch):
+    monkeypatch.setattr(index_module, 'BLOCK_SIZE', 4)
+    rng = random.Random(0)
+
+    # keys of several items are equal, which are kept in insertion order
+    items = [f'{i:03}' for i in range(200)]
+    rng.shuffle(items)
+
+    def key(item: str) -> int:
+        return int(item) % 17
+
+    index = SortedIndex(items[:50], key=key)
+    expected = sorted(items[:50], key=key)
+
+    for item in items[50:]:
+        position = index.add(item)
+        expected.insert(position, item)
+        assert expected == sorted(expected, key=key)
+
+    for item in rng.sample(items, 150):
+        assert index.remove(item) == expected.index(item)
+        expected.remove(item)
+
+    assert list(index) == expected
+    assert len(index) == 50
+    assert index[10:20] == expected[10:20]
+    assert [index[i] for i in range(-50, 50)] == expected + expected
+    assert all(index.index(item) == i for i, item in enumerate(expected))
+
+    with pytest.raises(IndexError):
+        index[50]
+
+    for item in expected:
+        index.remove(item)
+    assert list(index) == [] and len(index) == 0
+
+    assert index.add('001') == 0
+    assert list(index) == ['001']
+
+
+def test_tag_index(image_factory):
+    red = Tag(name='red')
+    dark_red = Tag(name='dark red')
+    blue = Tag(name='blue')
+
+    a = image_factory('a.jpg')
+    b = image_factory('b.jpg')
+    a.tags = {red, blue}
+    b.tags = {dark_red}
+
+    index = TagIndex([a, b], [red, dark_red, blue])
+
+    assert index.tags == {red, dark_red, blue}
+    assert index.images == {a, b}
+    assert index.tagged(red) == {a}
+    assert index.counted(1) == {b}
+    assert index.counted(2) == {a}
+    assert index.tagged(blue) == {a}
+    assert index.tagged(Tag(name='green')) == set()
+
+    assert set(index.matching('red')) == {red, dark_red}
+    assert index.matching('dark') == [dark_red]
+    assert index.matching('green') == []
+
+    index.add(b, blue)
+    assert index.tagged(blue) == {a, b}
+    assert index.counted(2) == {a, b}
+    index.discard(a, blue)
+    assert index.tagged(blue) == {b}
+    assert index.counted(1) == {a}
+
+    index.add_tag(Tag(name='green'))
+    assert index.matching('green') == [Tag(name='green')]
+
+    index.rename_tag(blue, Tag(name='cyan'))
+    assert index.tagged(Tag(name='cyan')) == {b}
+    assert index.tagged(blue) == set()
+    assert index.matching('blue') == []
+
+    index.remove_tag(red)
+    assert index.matching('red') == [dark_red]
+    assert index.counted(0) == {a}
+
+    index.remove_image(a)
+    assert index.images == {b}
+    assert index.counted(0) == set()
+
+
+def test_sorted_index_copy_and_equality():
+    index = SortedIndex(['charlie', 'alpha', 'bravo'], key=str)
+    copy = SortedIndex(index, key=str)
+
+    assert copy == index
+    assert list(copy) == ['alpha', 'bravo', 'charlie']
+    assert index != ['alpha', 'bravo', 'charlie']  # only equal to indexes
+
+    # copies are independent
+    copy.add('delta')
+    assert copy != index
+    assert list(index) == ['alpha', 'bravo', 'charlie']
+    assert list(copy) == ['alpha', 'bravo', 'charlie', 'delta']
+
+    assert index.index('bravo', 1, 2) == 1
+    with pytest.raises(ValueError):
+        index.index('bravo', 2)
+
+
+def test_lazy_index():
+    created = []
+
+    def create(i: int) -> str:
+        created.append(i)
+        return f'item {i}'
+
+    items = LazyIndex(5, create)
+    assert len(items) == 5 and created == []
+
+    assert items[3] == 'item 3' and items[-1] == 'item 4'
+    assert items[1:3] == ['item 1', 'item 2']
+    assert created == [3, 4, 1, 2]
+
+    # created once
+    assert items[3] is items[3]
+    assert created == [3, 4, 1, 2]
+
+    assert 'item 3' in items
+    assert items.index('item 3') == 3
+    with pytest.raises(ValueError):
+        items.index('item 0')  # not created yet
+    with pytest.raises(IndexError):
+        items[5]
+
+    assert list(items) == [f'item {i}' for i in range(5)]
+    assert created == [3, 4, 1, 2, 0]
+
+
+def test_hash_index():
+    rng = random.Random(0)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    values += [value ^ 1 << bit for value, bit in zip(values[:100], range(64))]
+    # about 8 bits apart, spread over blocks
+    values += [
+        value ^ rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        for value in values[:100]
+    ]
+
+    hashes = HashIndex((value, i) for i, value in enumerate(values))
+    hashes.add(values[0], -1)  # same hash as another item
+    assert len(hashes) == len(values) + 1
+
+    # looked up through blocks, then by comparing all hashes once fewer
+    for radius in (0, 1, 10, 12):
+        for value in values[:20]:
+            expected = {
+                i for i, other in enumerate(values) if distance(value, other) <= radius
+            }
+            if value == values[0]:
+                expected.add(-1)
+            assert set(hashes.near(value, radius)) == expected
+
+    assert HashIndex().near(0, 64) == []
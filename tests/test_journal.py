@@ -0,0 +1,136 @@
+import pathlib
+
+from typing import List
+
+from picpick import operations, storage
+from picpick.model import Model, Tag
+from picpick.storage import journal
+
+
+def test_encode_and_decode():
+    examples: List[operations.Operation] = [
+        operations.AddImage(path=pathlib.Path('/images/foo "bar".jpg')),
+        operations.RenameTag(old='red', new='lime'),
+        operations.UntagImage(path=pathlib.Path('foo.jpg'), name='red'),
+    ]
+
+    for operation in examples:
+        line = journal.encode(operation)
+        assert line.endswith('\n') and line.count('\n') == 1
+        assert journal.decode(line) == operation
+
+
+def test_journal_replay(basedir: pathlib.Path, model: Model):
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model)
+
+    one, three, two = model.order
+    red = Tag(name='red')
+
+    changes: List[operations.Operation] = [
+        operations.AddTag(name='yellow'),
+        operations.TagImage(path=one.path, name='red'),
+        operations.RemoveImage(path=two.path),
+    ]
+
+    j = journal.Journal(save_path)
+    for operation in changes:
+        j.append(operation)
+    j.close()
+
+    assert j.operations == changes
+
+    journaled: List[operations.Operation] = []
+    loaded_model, _ = storage.load(save_path, changes=journaled)
+    assert journaled == changes
+    assert Tag(name='yellow') in loaded_model.tags
+    assert {i.path.name: i.tags for i in loaded_model.images} == {
+        'one.jpg': {red},
+        'three.jpg': set(),
+    }
+
+    # interrupted record, and those following it, are ignored
+    with journal.path_for(save_path).open('a') as f:
+        f.write(journal.encode(operations.AddTag(name='purple')))
+        f.write(journal.encode(operations.AddTag(name='yellow')))
+        f.write(journal.encode(operations.AddTag(name='lime'))[:-1])
+
+    loaded_model, _ = storage.load(save_path)
+    assert Tag(name='purple') in loaded_model.tags
+    assert Tag(name='lime') not in loaded_model.tags
+
+    # journal of a project written since is not replayed
+    storage.save(save_path, model)
+    loaded_model, _ = storage.load(save_path)
+    assert Tag(name='yellow') not in loaded_model.tags
+
+
+def test_journal_continued_after_torn_record(basedir: pathlib.Path, model: Model):
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model)
+
+    one, three, two = model.order
+
+    j = journal.Journal(save_path)
+    j.append(operations.TagImage(path=one.path, name='red'))
+    j.append(operations.TagImage(path=two.path, name='red'))
+    j.close()
+
+    # last record torn by a crash
+    path = journal.path_for(save_path)
+    path.write_text(path.read_text()[:-5])
+
+    replayed: List[operations.Operation] = []
+    storage.load(save_path, changes=replayed)
+    assert replayed == [operations.TagImage(path=one.path, name='red')]
+
+    j = journal.Journal(save_path, replayed)
+    j.append(operations.TagImage(path=three.path, name='red'))
+    j.append(operations.AddTag(name='yellow'))
+    j.close()
+
+    journaled: List[operations.Operation] = []
+    loaded_model, _ = storage.load(save_path, changes=journaled)
+    assert journaled == j.operations
+    assert Tag(name='yellow') in loaded_model.tags
+    assert {i.path.name for i in loaded_model.images if i.tags} == {
+        'one.jpg',
+        'three.jpg',
+    }
+
+
+def test_journal_compaction(basedir: pathlib.Path, monkeypatch):
+    monkeypatch.setattr(journal, 'COMPACT_THRESHOLD', 4)
+
+    model = Model()
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model)
+
+    j = journal.Journal(save_path)
+    for i in range(5):
+        j.append(operations.AddImage(path=pathlib.Path(f'{i}.jpg')))
+    j.close()
+
+    # merged into project once threshold was reached
+    assert j.operations == []
+
+    loaded_model, _ = storage.load(save_path)
+    assert len(loaded_model.images) == 5
+
+    # journal started over
+    journaled: List[operations.Operation] = []
+    loaded_model, _ = storage.load(save_path, changes=journaled)
+    assert journaled == []
+
+    j = journal.Journal(save_path)
+    j.append(operations.RemoveImage(path=pathlib.Path('0.jpg')))
+    j.close()
+    assert j.operations == [operations.RemoveImage(path=pathlib.Path('0.jpg'))]
+
+    loaded_model, _ = storage.load(save_path)
+    assert {image.path.name for image in loaded_model.images} == {
+        '1.jpg',
+        '2.jpg',
+        '3.jpg',
+        '4.jpg',
+    }
@@ -0,0 +1,81 @@
+import gzip
+import pathlib
+
+from typing import List
+
+import pytest  # type: ignore
+
+from picpick import exporting, labels, operations
+from picpick.model import Model, Tag
+
+
+def test_read(basedir: pathlib.Path, model: Model):
+    tags = basedir / 'tags.csv'
+    tags.write_text("path,tags\none.jpg,red;yellow\n/elsewhere/two.jpg,\n")
+    assert list(labels.read(tags)) == [
+        (basedir / 'one.jpg', 'red'),
+        (basedir / 'one.jpg', 'yellow'),
+    ]
+
+    tag = basedir / 'tag.csv'
+    tag.write_text("path,tag\none.jpg,red\none.jpg,green\n")
+    assert list(labels.read(tag)) == [
+        (basedir / 'one.jpg', 'red'),
+        (basedir / 'one.jpg', 'green'),
+    ]
+
+    # exported tags are read back
+    model.tag(model.order[0], Tag(name='red'))
+    exported = basedir / 'exported.jsonl.gz'
+    exporting.export(exported, model, exporting.JSONL, compression=exporting.GZIP)
+    assert list(labels.read(exported)) == [(basedir / 'one.jpg', 'red')]
+
+    records = basedir / 'records.jsonl.gz'
+    with gzip.open(records, 'wt') as f:
+        f.write('{"path": "two.jpg", "tag": "blue"}\n\n')
+    assert list(labels.read(records)) == [(basedir / 'two.jpg', 'blue')]
+
+    with pytest.raises(labels.UnknownFormat, match="tags.xml is unknown"):
+        labels.read(basedir / 'tags.xml')
+
+
+def test_read_sidecars(basedir: pathlib.Path, model: Model):
+    one, three, two = model.order
+    (basedir / 'one.txt').write_text("red, green\nblue\n")
+    (basedir / 'two.txt').write_text("")
+
+    assert list(labels.read_sidecars(model.order)) == [
+        (one.path, 'red'),
+        (one.path, 'green'),
+        (one.path, 'blue'),
+    ]
+
+
+def test_apply(basedir: pathlib.Path, model: Model):
+    one, three, two = model.order
+    model.tag(one, Tag(name='red'))
+    recorded: List[operations.Operation] = []
+
+    applied = labels.apply(
+        model,
+        [
+            (one.path, 'red'),
+            (one.path, 'yellow'),
+            (two.path, 'yellow'),
+            (basedir / 'missing.jpg', 'blue'),
+        ],
+        recorded.append,
+    )
+
+    assert (applied.tagged, applied.created, applied.unresolved) == (
+        2,
+        [Tag(name='yellow')],
+        1,
+    )
+    assert one.tags == {Tag(name='red'), Tag(name='yellow')}
+    assert two.tags == {Tag(name='yellow')}
+    assert recorded == [
+        operations.AddTag(name='yellow'),
+        operations.TagImage(path=one.path, name='yellow'),
+        operations.TagImage(path=two.path, name='yellow'),
+    ]
@@ -0,0 +1,187 @@
+import pickle
+
+from picpick.model import Model, Tag
+
+
+def test_index_kept_up_to_date(model: Model):
+    one, three, two = sorted(model.images, key=lambda image: image.path.name)
+    red = Tag(name='red')
+    blue = Tag(name='blue')
+
+    assert model.index.tagged(red) == set()
+
+    model.tag(one, red)
+    model.tag(two, red)
+    model.tag(two, blue)
+    assert one.tags == {red}
+    assert model.index.tagged(red) == {one, two}
+
+    model.untag(one, red)
+    assert one.tags == set()
+    assert model.index.tagged(red) == {two}
+
+    model.rename_tag(red, Tag(name='purple'))
+    assert model.tags == {Tag(name='purple'), Tag(name='green'), blue}
+    assert two.tags == {Tag(name='purple'), blue}
+    assert model.index.tagged(Tag(name='purple')) == {two}
+    assert model.index.tagged(red) == set()
+
+    model.delete_tag(blue)
+    assert two.tags == {Tag(name='purple')}
+    assert model.index.tagged(blue) == set()
+    assert model.index.matching('blue') == []
+
+    model.set_tags({Tag(name='green')})
+    assert two.tags == set()
+    assert model.index.tags == {Tag(name='green')}
+
+    model.tag(three, Tag(name='green'))
+    model.remove_image(three)
+    assert model.index.tagged(Tag(name='green')) == set()
+
+
+class Unlisted(set):
+    def __iter__(self):
+        raise AssertionError("all images looked through")
+
+
+def test_tags_mutations_only_look_through_tagged_images(model: Model):
+    one, three, two = sorted(model.images, key=lambda image: image.path.name)
+    red = Tag(name='red')
+    blue = Tag(name='blue')
+
+    model.tag(one, red)
+    model.tag(two, blue)
+    model.index  # built before images can no longer be listed
+    model.images = Unlisted(model.images)
+
+    model.rename_tag(red, Tag(name='purple'))
+    assert one.tags == {Tag(name='purple')}
+
+    model.delete_tag(Tag(name='purple'))
+    assert one.tags == set()
+    assert two.tags == {blue}
+
+
+def test_index_not_pickled(model: Model):
+    red = Tag(name='red')
+    image = next(iter(model.images))
+    model.tag(image, red)
+
+    assert model._index is not None
+
+    loaded = pickle.loads(pickle.dumps(model))
+    assert loaded._index is None
+
+    (loaded_image,) = (i for i in loaded.images if i.path == image.path)
+    assert loaded.index.tagged(red) == {loaded_image}
+
+
+def test_order(model: Model, image_factory):
+    assert [image.path.name for image in model.order] == [
+        'one.jpg',
+        'three.jpg',
+        'two.jpg',
+    ]
+    one, three, two = model.order
+
+    four = image_factory('four.jpg')
+    model.add_image(four)
+    assert list(model.order) == [four, one, three, two]
+    assert model.order.index(one) == 1
+
+    model.remove_image(three)
+    assert list(model.order) == [four, one, two]
+    assert model.order.index(two) == 2
+
+
+def test_image_at(model: Model, image_factory):
+    one = next(i for i in model.images if i.path.name == 'one.jpg')
+    assert model.image_at(one.path) is one
+
+    four = image_factory('four.jpg')
+    assert model.image_at(four.path) is None
+    model.add_image(four)
+    assert model.image_at(four.path) is four
+
+    model.remove_image(one)
+    assert model.image_at(one.path) is None
+
+    loaded = pickle.loads(pickle.dumps(model))
+    assert loaded._paths is None
+    assert loaded.image_at(four.path).path == four.path
+
+
+def test_add_images(model: Model, image_factory):
+    one, three, two = model.order
+    assert model.image_at(one.path) is one
+
+    four, zero = image_factory('four.jpg'), image_factory('zero.jpg')
+    model.add_images([zero, four])
+
+    assert list(model.order) == [four, one, three, two, zero]
+    assert model.image_at(zero.path) is zero
+    assert model.index.counted(0) == model.images
+
+
+def test_near_duplicates(model: Model, image_factory):
+    one, three, two = model.order
+    assert model.near_duplicates(one, 2) == set()
+    assert model.distinct(2) == model.images
+
+    model.set_hash(one, 0b1111)
+    model.set_hash(two, 0b0111)
+    model.set_hash(three, 0b1111_0000)
+
+    assert model.near_duplicates(one, 2) == {one, two}
+    assert model.near_duplicates(two, 0) == {two}
+    assert model.distinct(2) == {one, three}
+    assert model.distinct(8) == {one}
+
+    # kept up to date as images and hashes change
+    model.set_hash(one, 0b1111_0001)
+    assert model.near_duplicates(three, 2) == {one, three}
+    assert model.distinct(2) == {one, two}
+
+    four = image_factory('four.jpg')
+    four.hash = 0b0111
+    model.add_image(four)
+    assert model.near_duplicates(two, 0) == {two, four}
+
+    model.remove_image(one)
+    assert model.near_duplicates(three, 2) == {three}
+    assert model.distinct(2) == {four, three}
+
+    # hashes are copied along with images
+    hashes = {'four.jpg': 0b0111, 'three.jpg': 0b1111_0000, 'two.jpg': 0b0111}
+    for copy in (pickle.loads(pickle.dumps(model)), model.snapshot()):
+        assert {image.path.name: image.hash for image in copy.images} == hashes
+
+
+def test_snapshot(model: Model):
+    one, three, two = model.order
+    red, blue = Tag(name='red'), Tag(name='blue')
+    model.tag(one, red)
+    model.tag(two, red)
+
+    snapshot = model.snapshot()
+
+    # read before the image was mutated
+    assert snapshot.order[0].tags == {red}
+
+    model.untag(one, red)
+    model.set_hash(three, 0b1010)
+    model.rename_tag(red, Tag(name='purple'))
+    model.delete_tag(blue)
+
+    assert [(i.path.name, i.tags, i.hash) for i in snapshot.order] == [
+        ('one.jpg', {red}, None),
+        ('three.jpg', set(), None),
+        ('two.jpg', {red}, None),
+    ]
+    assert snapshot.tags == {red, blue, Tag(name='green')}
+    assert all(copy is not image for copy, image in zip(snapshot.order, model.order))
+
+    # images are no longer copied once snapshot is dropped
+    del snapshot
+    assert len(model._snapshots) == 0
@@ -0,0 +1,41 @@
+import pathlib
+
+from typing import List
+
+import pytest  # type: ignore
+
+from picpick import operations
+from picpick.model import Model, Tag
+
+
+def test_apply(model: Model):
+    one, _, two = model.order
+    lime = Tag(name='lime')
+
+    operations.apply(model, operations.TagImage(path=one.path, name='red'))
+    operations.apply(model, operations.RenameTag(old='red', new='lime'))
+    assert one.tags == {lime}
+    assert model.index.tagged(lime) == {one}
+
+    operations.apply(model, operations.AddImage(path=pathlib.Path('four.jpg')))
+    four = model.image_at(pathlib.Path('four.jpg'))
+    assert four is not None and four in model.order
+
+    invalid: List[operations.Operation] = [
+        operations.AddImage(path=two.path),
+        operations.RemoveImage(path=pathlib.Path('five.jpg')),
+        operations.AddTag(name='lime'),
+        operations.DeleteTag(name='red'),
+        operations.RenameTag(old='lime', new='green'),
+        operations.TagImage(path=one.path, name='lime'),
+        operations.UntagImage(path=two.path, name='lime'),
+    ]
+
+    # operations not applying to model leave it untouched
+    for operation in invalid:
+        with pytest.raises(ValueError):
+            operations.apply(model, operation)
+
+    assert len(model.images) == 4
+    assert model.tags == {lime, Tag(name='green'), Tag(name='blue')}
+    assert one.tags == {lime}
@@ -14,7 +14,7 @@ def test_version():
 def test_empty_add_some_tags(basedir):
     controller = Controller(model=Model())
     assert controller._view._window.title() == "PicPick *"
-    assert controller.images == []
+    assert list(controller.images) == []
     assert controller.tags == []
     assert controller.current_image is None
 
@@ -43,7 +43,7 @@ def test_empty_add_some_tags(basedir):
 def test_empty_add_one_image_and_tag_it(basedir, image_factory):
     controller = Controller(model=Model())
     assert controller._view._window.title() == "PicPick *"
-    assert controller.images == []
+    assert list(controller.images) == []
     assert controller.tags == []
     assert controller.current_image is None
 
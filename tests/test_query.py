@@ -0,0 +1,95 @@
+import pytest  # type: ignore
+
+from picpick import query
+from picpick.index import TagIndex
+from picpick.model import Tag
+from picpick.query import And, Count, Exact, Not, Or, Word
+
+
+@pytest.fixture
+def images(image_factory):
+    names = {
+        'a.jpg': ('red',),
+        'b.jpg': ('red', 'reviewed'),
+        'c.jpg': ('dark red', 'blue'),
+        'd.jpg': ('blue',),
+        'e.jpg': (),
+    }
+
+    result = {}
+    for filename, tagnames in names.items():
+        image = image_factory(filename)
+        image.tags = {Tag(name=name) for name in tagnames}
+        result[filename[0]] = image
+    return result
+
+
+def test_parse():
+    assert query.parse('') is None
+    assert query.parse('   ') is None
+
+    assert query.parse('red') == Word('red')
+    assert query.parse('"dark red"') == Exact('dark red')
+    assert query.parse('untagged') == Count(0)
+    assert query.parse('has:2') == Count(2)
+
+    # spaces only are alternatives, like previous filters
+    assert query.parse('red blue') == Or((Word('red'), Word('blue')))
+    assert query.parse('red OR blue') == Or((Word('red'), Word('blue')))
+
+    assert query.parse('red AND NOT reviewed') == And(
+        (Word('red'), Not(Word('reviewed')))
+    )
+    assert query.parse('NOT NOT red') == Word('red')
+
+    # NOT binds tighter than AND, itself tighter than OR
+    assert query.parse('a OR b AND NOT c') == Or(
+        (Word('a'), And((Word('b'), Not(Word('c')))))
+    )
+    assert query.parse('(a OR b) AND c') == And((Or((Word('a'), Word('b'))), Word('c')))
+
+
+@pytest.mark.parametrize(
+    'text, position',
+    [
+        ('red AND', 7),
+        ('AND red', 0),
+        ('(red', 4),
+        ('red)', 3),
+        ('"dark red', 0),
+        ('NOT', 3),
+    ],
+)
+def test_parse_invalid(text: str, position: int):
+    with pytest.raises(query.QuerySyntaxError) as info:
+        query.parse(text)
+    assert info.value.position == position
+
+
+def test_evaluate(images):
+    a, b, c, d, e = (images[k] for k in 'abcde')
+    index = TagIndex(images.values(), set())
+
+    def evaluate(text):
+        plan = query.parse(text)
+        assert plan is not None
+        return plan.evaluate(index)
+
+    assert evaluate('red') == {a, b, c}
+    assert evaluate('"red"') == {a, b}
+    assert evaluate('"re"') == set()
+    assert evaluate('red AND NOT reviewed') == {a, c}
+    assert evaluate('red AND blue') == {c}
+    assert evaluate('NOT red') == {d, e}
+    assert evaluate('reviewed blue') == {b, c, d}
+    assert evaluate('untagged') == {e}
+    assert evaluate('has:1') == {a, d}
+    assert evaluate('has:2') == {b, c}
+    assert evaluate('has:3') == set()
+    assert evaluate('NOT "red" AND NOT untagged') == {c, d}
+    assert evaluate('(reviewed OR blue) AND has:2') == {b, c}
+
+
+def test_query_abstract():
+    with pytest.raises(TypeError):
+        query.Query()  # type: ignore
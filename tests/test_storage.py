@@ -1,7 +1,14 @@
 import pathlib
+import pickle
+import sqlite3
 
-from picpick import storage
-from picpick.model import Image, Model, Tag
+from typing import List
+
+import pytest  # type: ignore
+
+from picpick import operations, storage
+from picpick.model import Image, LazyModel, Model, Tag
+from picpick.storage import journal, validation
 
 
 def test_save_and_load_empty(basedir: pathlib.Path):
@@ -48,3 +55,261 @@ def test_save_and_load_some_images_and_tags(basedir: pathlib.Path):
         pathlib.Path('bar.jpg'),
     }
     assert loaded_model.tags == model.tags == {red, blue}
+
+
+def test_formats(basedir: pathlib.Path, model: Model):
+    # new files use default format, existing ones keep theirs
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model)
+    assert storage.detect(save_path) == storage.DEFAULT_FORMAT == storage.SQLITE
+
+    storage.save(save_path, model, format=storage.PICKLE)
+    assert storage.detect(save_path) == storage.PICKLE
+
+    storage.save(save_path, model)
+    assert storage.detect(save_path) == storage.PICKLE
+
+    loaded_model, _ = storage.load(save_path)
+    assert {i.path for i in loaded_model.images} == {i.path for i in model.images}
+
+
+def test_sqlite_incremental_save(basedir: pathlib.Path, model: Model):
+    one, three, two = model.order
+    red, green = Tag(name='red'), Tag(name='green')
+
+    model.tag(one, red)
+    model.tag(one, green)
+    model.tag(two, red)
+
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model, current_index=1, format=storage.SQLITE)
+
+    loaded_model, current_index = storage.load(save_path)
+    assert current_index == 1
+    assert loaded_model.tags == model.tags
+    assert {(i.path, frozenset(i.tags)) for i in loaded_model.images} == {
+        (i.path, frozenset(i.tags)) for i in model.images
+    }
+
+    four = Image(path=one.path.with_name('four.jpg'))
+    lime = Tag(name='lime')
+
+    model.add_image(four)
+    model.tag(four, red)
+    model.untag(one, red)
+    model.rename_tag(green, lime)
+    model.remove_image(two)
+    model.delete_tag(Tag(name='blue'))
+
+    changes: List[operations.Operation] = [
+        operations.AddImage(path=four.path),
+        operations.TagImage(path=four.path, name='red'),
+        operations.UntagImage(path=one.path, name='red'),
+        operations.RenameTag(old='green', new='lime'),
+        operations.RemoveImage(path=two.path),
+        operations.DeleteTag(name='blue'),
+    ]
+    storage.save(save_path, model, current_index=0, changes=changes)
+
+    loaded_model, current_index = storage.load(save_path)
+    assert current_index == 0
+    assert loaded_model.tags == {red, lime}
+    assert {i.path.name: i.tags for i in loaded_model.images} == {
+        'four.jpg': {red},
+        'one.jpg': {lime},
+        'three.jpg': set(),
+    }
+
+
+def test_sqlite_tag_missing(basedir: pathlib.Path, model: Model):
+    one = model.order[0]
+
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model, format=storage.SQLITE)
+
+    model.add_tag(Tag(name='lime'))
+    model.tag(one, Tag(name='lime'))
+    with pytest.raises(sqlite3.IntegrityError):
+        # addition of the tag itself was not recorded
+        storage.save(
+            save_path,
+            model,
+            changes=[operations.TagImage(path=one.path, name='lime')],
+        )
+
+    loaded_model, _ = storage.load(save_path)
+    assert {image.path: image.tags for image in loaded_model.images}[one.path] == set()
+
+
+def test_binary(basedir: pathlib.Path, model_factory):
+    names = [f'{i:05}.jpg' for i in range(1000)]
+    model = model_factory(names, ('red', 'green', 'blue', 'ünïcode'))
+
+    tags = sorted(model.tags, key=lambda tag: tag.name)
+    for i, image in enumerate(model.order):
+        image.tags.update(tags[: i % 5])
+
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model, current_index=42, format=storage.BINARY)
+    assert storage.detect(save_path) == storage.BINARY
+
+    loaded_model, current_index = storage.load(save_path)
+    assert current_index == 42
+    assert loaded_model.tags == model.tags
+    assert {(i.path, frozenset(i.tags)) for i in loaded_model.images} == {
+        (i.path, frozenset(i.tags)) for i in model.images
+    }
+
+    # paths are stored once their common prefix is removed
+    pickle_path = basedir / 'save.pickle'
+    storage.save(pickle_path, model, current_index=42, format=storage.PICKLE)
+    assert save_path.stat().st_size < pickle_path.stat().st_size
+
+    # empty projects too
+    storage.save(save_path, Model(), format=storage.BINARY)
+    loaded_model, current_index = storage.load(save_path)
+    assert current_index is None
+    assert loaded_model.images == set() and loaded_model.tags == set()
+
+
+def test_binary_lazy_load(basedir: pathlib.Path, model_factory, monkeypatch):
+    names = [f'{i:05}.jpg' for i in range(1000)]
+    model = model_factory(names, ('red', 'green'))
+
+    red = Tag(name='red')
+    for image in model.order[::2]:
+        image.tags.add(red)
+
+    save_path = basedir / 'save.picpick'
+    validated = storage.save(save_path, model, current_index=42, format=storage.BINARY)
+
+    # as when saved by PicPick, otherwise all images are read to be checked
+    journal.restart(save_path, validated)
+    monkeypatch.setattr(validation, 'TRUSTED_SAMPLE', 0)
+
+    loaded_model, current_index = storage.load(save_path, lazy=True)
+    assert isinstance(loaded_model, LazyModel)
+    assert current_index == 42
+    assert loaded_model.tags == model.tags
+
+    # images are only created once accessed
+    order = loaded_model.order
+    assert len(order) == 1000
+
+    current = order[current_index]
+    assert current.path.name == '00042.jpg' and current.tags == {red}
+    assert order[42] is current and order.index(current) == 42
+    assert [image.path.name for image in order[10:13]] == names[10:13]
+    assert len(order._created) == 4  # type: ignore
+
+    # then all of them, once the whole set is needed
+    assert current in loaded_model.images
+    assert len(loaded_model.images) == 1000
+    assert loaded_model.order[42] is current
+    assert loaded_model.image_at(current.path) is current
+
+    # and pickled as a plain model
+    loaded_model, _ = storage.load(save_path, lazy=True)
+    unpickled = pickle.loads(pickle.dumps(loaded_model))
+    assert type(unpickled) is Model
+    assert {i.path for i in unpickled.images} == {i.path for i in model.images}
+
+    # journaled operations are replayed on images
+    j = journal.Journal(save_path)
+    j.append(operations.UntagImage(path=current.path, name='red'))
+    j.close()
+
+    loaded_model, current_index = storage.load(save_path, lazy=True)
+    assert current_index == 42
+    assert loaded_model.order[42].tags == set()
+
+
+def test_atomic_save(basedir: pathlib.Path, model: Model, monkeypatch):
+    save_path = basedir / 'save.picpick'
+    storage.save(save_path, model, format=storage.BINARY)
+    saved = save_path.read_bytes()
+
+    fractions: List[float] = []
+    storage.save(save_path, model, format=storage.SQLITE, progress=fractions.append)
+    assert fractions == sorted(fractions) and fractions[-1] == 1.0
+    assert storage.detect(save_path) == storage.SQLITE
+
+    # interrupted save leaves project as it was
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    storage.save(save_path, model, format=storage.BINARY)
+    monkeypatch.setattr(storage.binary, 'save', fail)
+
+    with pytest.raises(OSError):
+        storage.save(save_path, model)
+
+    assert save_path.read_bytes() == saved
+    assert list(basedir.glob('*.tmp')) == []
+
+
+def test_hashes(basedir: pathlib.Path, model: Model):
+    one, three, two = model.order
+    model.set_hash(one, 1)
+    model.set_hash(two, (1 << 64) - 1)  # beyond SQLite signed integers
+
+    expected = {'one.jpg': 1, 'three.jpg': None, 'two.jpg': (1 << 64) - 1}
+
+    for format in storage.FORMATS:
+        save_path = basedir / f'save.{format}'
+        storage.save(save_path, model, format=format)
+
+        loaded_model, _ = storage.load(save_path)
+        assert {i.path.name: i.hash for i in loaded_model.images} == expected
+
+    # lazily loaded
+    loaded_model, _ = storage.load(basedir / 'save.binary', lazy=True)
+    assert [i.hash for i in loaded_model.order] == [1, None, (1 << 64) - 1]
+
+    # incrementally saved
+    save_path = basedir / 'save.sqlite'
+    model.set_hash(three, 1 << 63)
+    model.set_hash(one, 2)
+    changes: List[operations.Operation] = [
+        operations.HashImage(path=three.path, hash=1 << 63),
+        operations.HashImage(path=one.path, hash=2),
+    ]
+    storage.save(save_path, model, changes=changes)
+
+    loaded_model, _ = storage.load(save_path)
+    assert {i.path.name: i.hash for i in loaded_model.images} == {
+        'one.jpg': 2,
+        'three.jpg': 1 << 63,
+        'two.jpg': (1 << 64) - 1,
+    }
+
+    # journaled
+    assert journal.decode(journal.encode(changes[0])) == changes[0]
+
+
+def test_sqlite_upgrade(basedir: pathlib.Path):
+    save_path = basedir / 'save.picpick'
+
+    # as written before images had hashes
+    connection = sqlite3.connect(str(save_path))
+    connection.executescript(
+        '''
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID;
+        CREATE TABLE images (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+        CREATE TABLE tags (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE image_tags (image_id INTEGER, tag_id INTEGER);
+        INSERT INTO meta VALUES ('version', 1), ('current', NULL);
+        INSERT INTO images VALUES (1, '/one.jpg');
+        '''
+    )
+    connection.close()
+
+    model, _ = storage.load(save_path)
+    assert [i.hash for i in model.images] == [None]
+
+    model.set_hash(model.order[0], 42)
+    change = operations.HashImage(path=pathlib.Path('/one.jpg'), hash=42)
+    storage.save(save_path, model, changes=[change])
+
+    model, _ = storage.load(save_path)
+    assert [i.hash for i in model.images] == [42]
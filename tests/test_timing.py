@@ -0,0 +1,99 @@
+import csv
+import json
+
+import pytest  # type: ignore
+
+from picpick import timing
+
+
+@pytest.fixture(autouse=True)
+def disabled():
+    timing.disable()
+    yield
+    timing.disable()
+
+
+@timing.timed
+def double(value: int) -> int:
+    return 2 * value
+
+
+class Doubler:
+    @timing.timed
+    def double(self, value: int) -> int:
+        if value < 0:
+            raise ValueError(value)
+        return 2 * value
+
+
+def test_timed():
+    assert double(2) == 4
+    assert timing.timings() is None
+
+    timings = timing.enable()
+    assert timing.enable() is timings
+
+    assert double(3) == 6
+    assert Doubler().double(4) == 8
+    with pytest.raises(ValueError):
+        Doubler().double(-1)
+
+    stats = timings.stats()
+    assert list(stats) == ['Doubler.double', 'test_timing.double']
+    assert stats['Doubler.double'].calls == 2
+    assert stats['test_timing.double'].calls == 1
+
+    timing.disable()
+    assert double(4) == 8
+    assert timings.stats()['test_timing.double'].calls == 1
+
+
+def test_stats():
+    timings = timing.Timings(window=100)
+
+    for duration in range(1, 201):
+        timings.record('operation', float(duration))
+
+    assert timings.stats() == {
+        # only the most recent calls, from 101 to 200 milliseconds
+        'operation': timing.Stats(calls=200, p50=150, p95=195, p99=199, max=200)
+    }
+
+    timings.record('other', 3.0)
+    assert timings.stats()['other'] == timing.Stats(1, 3.0, 3.0, 3.0, 3.0)
+
+
+def test_write(basedir):
+    timings = timing.Timings()
+    timings.record('Controller.add_images', 2.0)
+    timings.record('storage.save', 10.0)
+
+    timings.write(basedir / 'timings.json')
+    data = json.loads((basedir / 'timings.json').read_text())
+    assert data['storage.save'] == {
+        'calls': 1,
+        'p50': 10.0,
+        'p95': 10.0,
+        'p99': 10.0,
+        'max': 10.0,
+    }
+    assert list(data) == ['Controller.add_images', 'storage.save']
+
+    timings.write(basedir / 'timings.csv')
+    with (basedir / 'timings.csv').open(newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['operation', 'calls', 'p50', 'p95', 'p99', 'max']
+    assert rows[1] == ['Controller.add_images', '1', '2.0', '2.0', '2.0', '2.0']
+
+    timings.write(basedir / 'timings.txt', format=timing.CSV)
+    assert (basedir / 'timings.txt').read_text().startswith('operation,')
+
+
+def test_table():
+    assert timing.table({}) == ''
+
+    table = timing.table({'storage.save': timing.Stats(3, 1.0, 2.25, 3.0, 4.0)})
+    header, row = table.split('\n')
+
+    assert header.split() == ['operation', '(ms)', 'calls', 'p50', 'p95', 'p99', 'max']
+    assert row.split() == ['storage.save', '3', '1.0', '2.2', '3.0', '4.0']
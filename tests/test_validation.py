@@ -0,0 +1,131 @@
+import pathlib
+
+from typing import Optional
+from unittest import mock
+
+import pytest  # type: ignore
+
+from picpick import storage
+from picpick.model import Image, LazyModel, Model, Tag
+from picpick.storage import binary, journal, validation
+
+
+def test_invalid_save(basedir: pathlib.Path, model: Model):
+    save_path = basedir / 'save.picpick'
+
+    for format in storage.FORMATS:
+        storage.save(save_path, model, format=format)
+        saved = save_path.read_bytes()
+
+        one, three, two = model.order
+        purple = Image(path=one.path.with_name('purple.jpg'))
+        purple.tags.add(Tag(name='purple'))
+
+        invalid = Model()
+        invalid.images = {*model.images, purple, Image(path=two.path)}
+        invalid.tags = model.tags
+
+        with pytest.raises(validation.InvalidProject) as e:
+            storage.save(save_path, invalid, format=format)
+
+        # every invalid record is reported
+        assert e.value.count == 2
+        assert set(e.value.errors) == {
+            f"{purple.path} has unknown tags purple",
+            f"{two.path} is present several times",
+        }
+
+        assert save_path.read_bytes() == saved
+
+    with pytest.raises(validation.InvalidProject) as e:
+        storage.save(save_path, model, current_index=3)
+    assert e.value.errors == ["current image 3 is out of range"]
+
+
+def test_trusted_load(basedir: pathlib.Path, model_factory, monkeypatch):
+    model = model_factory([f'{i}.jpg' for i in range(10)], ('red',))
+
+    checked = []
+    check = validation.Validator.check
+
+    def counted(self, image: Image, position: Optional[int] = None):
+        checked.append(image)
+        check(self, image, position)
+
+    monkeypatch.setattr(validation.Validator, 'check', counted)
+    monkeypatch.setattr(validation, 'TRUSTED_SAMPLE', 3)
+
+    save_path = basedir / 'save.picpick'
+    validated = storage.save(save_path, model, format=storage.BINARY)
+    assert validated == validation.checksum(save_path)
+
+    assert len(checked) == 10
+    checked.clear()
+
+    storage.load(save_path)
+    assert len(checked) == 10
+    checked.clear()
+
+    # only sampled once recorded as validated
+    journal.restart(save_path, validated)
+    assert journal.checksum(save_path) == validated
+
+    storage.load(save_path)
+    assert len(checked) == 3
+    checked.clear()
+
+    # kept when journal starts over
+    journal.Journal(save_path).close()
+    storage.load(save_path)
+    assert len(checked) == 3
+    checked.clear()
+
+    # but not trusted once changed
+    with save_path.open('ab') as f:
+        f.write(b'\0')
+
+    storage.load(save_path)
+    assert len(checked) == 10
+
+
+def test_sampled_duplicates():
+    foo = Image(path=pathlib.Path('foo.jpg'))
+    model = Model()
+    model.images = {foo, Image(path=foo.path)}
+
+    # found from whichever is sampled, next to the other one
+    with pytest.raises(validation.InvalidProject) as e:
+        validation.validate(model, None, sample=1)
+    assert e.value.errors == [f"{foo.path} is present several times"]
+
+
+def test_lazy_load_validation(basedir: pathlib.Path, model_factory, monkeypatch):
+    model = model_factory([f'{i:04}.jpg' for i in range(1000)], ('red',))
+    save_path = basedir / 'save.picpick'
+
+    # written as is, as if by another program
+    binary.save(save_path, model, 1000, None, None)
+    with pytest.raises(validation.InvalidProject) as e:
+        storage.load(save_path, lazy=True)
+    assert e.value.errors == ["current image 1000 is out of range"]
+
+    invalid = Model()
+    invalid.images = {*model.images, Image(path=model.order[10].path)}
+    invalid.tags = model.tags
+    binary.save(save_path, invalid, 0, None, None)
+
+    # checked in full, without a recorded checksum to compare
+    with mock.patch.object(validation, 'checksum', side_effect=AssertionError):
+        with pytest.raises(validation.InvalidProject):
+            storage.load(save_path, lazy=True)
+
+    monkeypatch.setattr(validation, 'TRUSTED_SAMPLE', 3)
+
+    validated = storage.save(save_path, model, 42, format=storage.BINARY)
+    journal.restart(save_path, validated)
+
+    # only sampled images are read, along with those next to them
+    loaded_model, current_index = storage.load(save_path, lazy=True)
+    assert isinstance(loaded_model, LazyModel)
+    assert current_index == 42
+    assert len(loaded_model.order._created) <= 1 + 3 * 3  # type: ignore
@@ -0,0 +1,161 @@
+import os
+import pathlib
+import time
+
+from typing import List
+
+import pytest  # type: ignore
+
+from picpick import watching
+
+
+@pytest.fixture
+def settled(monkeypatch):
+    # files are reported as soon as they are written
+    monkeypatch.setattr(watching, 'SETTLE_DELAY', 0)
+
+
+@pytest.fixture
+def listed(monkeypatch) -> List[pathlib.Path]:
+    listed: List[pathlib.Path] = []
+    scandir = os.scandir
+
+    def counted(path):
+        listed.append(pathlib.Path(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', counted)
+    return listed
+
+
+def touch(path: pathlib.Path, age: int = 10):
+    path.write_bytes(b'')
+    past = time.time() - age
+    os.utime(path, (past, past))
+
+
+def test_rescan(basedir: pathlib.Path, settled, listed: List[pathlib.Path]):
+    root = basedir / 'root'
+    (root / 'a' / 'b').mkdir(parents=True)
+    (root / 'c').mkdir()
+    touch(root / 'one.jpg')
+    touch(root / 'a' / 'b' / 'two.png')
+    touch(root / 'a' / 'notes.txt')
+
+    tree = watching.Tree([root])
+    changes = tree.rescan()
+    assert sorted(changes.added) == [root / 'a' / 'b' / 'two.png', root / 'one.jpg']
+    assert changes.removed == []
+
+    # unchanged directories are not listed again
+    listed.clear()
+    assert tree.rescan() == watching.Changes([], [])
+    assert listed == []
+
+    touch(root / 'a' / 'b' / 'three.jpg')
+    (root / 'one.jpg').unlink()
+    changes = tree.rescan()
+    assert changes == watching.Changes(
+        [root / 'a' / 'b' / 'three.jpg'], [root / 'one.jpg']
+    )
+    assert sorted(listed) == [root, root / 'a' / 'b']
+
+    # given directories only, along with new subdirectories
+    listed.clear()
+    (root / 'c' / 'd').mkdir()
+    touch(root / 'c' / 'd' / 'four.jpg')
+    touch(root / 'five.jpg')
+    assert tree.rescan([root / 'c']) == watching.Changes(
+        [root / 'c' / 'd' / 'four.jpg'], []
+    )
+    assert listed == [root / 'c', root / 'c' / 'd']
+
+    # listings are kept in index
+    index = basedir / 'project.picpick.watch'
+    tree.save(index)
+
+    listed.clear()
+    tree = watching.Tree.load(index, [root])
+    assert tree.rescan() == watching.Changes([root / 'five.jpg'], [])
+    assert listed == [root]
+    assert len(list(tree.files())) == 4
+
+    assert list(watching.Tree.load(index, [root / 'a']).files()) == []
+
+    # removed directories have their images removed
+    os.remove(root / 'a' / 'b' / 'two.png')
+    os.remove(root / 'a' / 'b' / 'three.jpg')
+    os.rmdir(root / 'a' / 'b')
+    changes = tree.rescan()
+    assert changes.added == []
+    assert sorted(changes.removed) == [
+        root / 'a' / 'b' / 'three.jpg',
+        root / 'a' / 'b' / 'two.png',
+    ]
+
+
+def test_rescan_unsettled(basedir: pathlib.Path):
+    tree = watching.Tree([basedir])
+    touch(basedir / 'old.jpg')
+    (basedir / 'new.jpg').write_bytes(b'being written')
+
+    # files still being written are reported once they are not anymore
+    assert tree.rescan() == watching.Changes([basedir / 'old.jpg'], [])
+    assert tree.unsettled() == [basedir]
+
+    touch(basedir / 'old.jpg', age=0)  # modified in place
+    assert tree.rescan() == watching.Changes([], [])
+
+    touch(basedir / 'new.jpg')
+    touch(basedir / 'old.jpg')
+    os.utime(basedir, (time.time() - 10, time.time() - 10))
+    assert tree.rescan() == watching.Changes([basedir / 'new.jpg'], [])
+    assert tree.unsettled() == []
+
+
+@pytest.mark.parametrize('inotify', (True, False))
+def test_watcher(basedir: pathlib.Path, settled, monkeypatch, inotify: bool):
+    if inotify:
+        try:
+            watching.Inotify().close()
+        except OSError:
+            pytest.skip("inotify is not available")
+    else:
+
+        def unavailable():
+            raise OSError("inotify is not available")
+
+        monkeypatch.setattr(watching, 'Inotify', unavailable)
+
+    root = basedir / 'root'
+    root.mkdir()
+    touch(root / 'one.jpg')
+
+    index = basedir / 'project.picpick.watch'
+    watcher = watching.Watcher([root], index, interval=0.05)
+
+    def wait() -> List[watching.Changes]:
+        for _ in range(100):
+            changes = watcher.changes()
+            if changes != []:
+                return changes
+            time.sleep(0.05)
+        raise TimeoutError
+
+    watcher.start()
+    try:
+        assert wait() == [([root / 'one.jpg'], [], True)]
+
+        (root / 'a').mkdir()
+        touch(root / 'a' / 'two.jpg')
+        assert wait() == [([root / 'a' / 'two.jpg'], [], False)]
+
+        (root / 'one.jpg').unlink()
+        assert wait() == [([], [root / 'one.jpg'], False)]
+
+        watcher.sync()
+        assert wait() == [([root / 'a' / 'two.jpg'], [], True)]
+    finally:
+        watcher.stop()
+
+    assert list(watching.Tree.load(index, [root]).files()) == [root / 'a' / 'two.jpg']
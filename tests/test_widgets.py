@@ -1,15 +1,41 @@
+import pathlib
+import time
 import tkinter as tk
 
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from unittest import mock
 
-from picpick import widgets
+from PIL import Image as PILImage  # type: ignore
+
+from picpick import imaging, index, model, timing, widgets
 from picpick.model import Tag
 
 
+class ImageDisplay(widgets.ImageDisplay):
+    """Display of a given size, whatever the size of its window."""
+
+    box: Optional[imaging.Size] = (400, 300)
+
+    @property
+    def _box(self) -> Optional[imaging.Size]:
+        return self.box
+
+    def resize_to(self, box: imaging.Size):
+        self.box = box
+        self.event_generate('<Configure>')
+
+    def wait(self):
+        """Process events until the displayed image is rendered at its size."""
+        deadline = time.monotonic() + 5
+        while self._resize_job is not None or self._pending is not None:
+            assert time.monotonic() < deadline
+            self.update()
+            time.sleep(0.01)
+
+
 class FileList(widgets.FileList):
-    def __init__(self, master):
-        super().__init__(master)
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
         self._callback = mock.Mock()
         self.bind('<<FileListSelect>>', lambda _: self._callback())
 
@@ -136,3 +162,179 @@ def test_tag_list(image_factory):
     assert tag_list.displayed == [('red', False), ('blue', True)]
     callback.assert_called_once_with(red, False)
     callback.reset_mock()
+
+
+def test_file_list_virtualized(image_factory):
+    file_list = FileList(None)
+
+    images = [image_factory(f'{i:04}.jpg') for i in range(1000)]
+    file_list.set_images(images)
+
+    # only visible rows are rendered
+    assert 0 < len(file_list.displayed) < 100
+    assert file_list.displayed[0] == '0000.jpg'
+
+    # selected image is scrolled into view
+    file_list.select(images[500])
+    file_list.update()
+
+    assert file_list.selected == images[500]
+    assert file_list.select_event_generated()
+    assert '0500.jpg' in file_list.displayed
+    assert '0000.jpg' not in file_list.displayed
+
+    assert file_list.neighbours(images[500], 2) == [
+        images[501],
+        images[499],
+        images[502],
+        images[498],
+    ]
+    assert file_list.neighbours(images[0], 1) == [images[1]]
+
+
+def test_file_list_lazy(image_factory):
+    file_list = FileList(None)
+
+    images = index.LazyIndex(
+        1000, lambda i: model.Image(path=pathlib.Path(f'{i:04}.jpg'))
+    )
+    file_list.set_images(images)
+
+    # only images of visible rows are created
+    assert file_list.displayed[0] == '0000.jpg'
+    assert len(images._created) == len(file_list.displayed)
+
+    file_list.select(images[500])
+    file_list.update()
+    assert '0500.jpg' in file_list.displayed
+    assert len(images._created) < 100
+
+    # all of them once rows are inserted
+    file_list.insert([image_factory('0500a.jpg')])
+    assert len(images._created) == 1000
+    assert file_list.selected == images[500]
+    assert file_list.neighbours(images[500], 1)[0].path.name == '0500a.jpg'
+
+
+def test_file_list_insert_and_remove(image_factory):
+    file_list = FileList(None)
+
+    a = image_factory('a.jpg')
+    b = image_factory('b.jpg')
+    c = image_factory('c.jpg')
+
+    file_list.set_images([a, c])
+    assert file_list.displayed == ['a.jpg', 'c.jpg']
+
+    file_list.insert([b])
+    assert file_list.displayed == ['a.jpg', 'b.jpg', 'c.jpg']
+
+    file_list.select(b)
+    file_list.update()
+    assert file_list.select_event_generated()
+
+    file_list.remove([a])
+    file_list.update()
+    assert file_list.displayed == ['b.jpg', 'c.jpg']
+    assert file_list.selected == b
+    assert not file_list.select_event_generated()
+
+    # removing selected image unselects it
+    file_list.remove([b])
+    file_list.update()
+    assert file_list.displayed == ['c.jpg']
+    assert file_list.selected is None
+    assert file_list.select_event_generated()
+
+
+def test_file_list_duplicates(model_factory):
+    images = model_factory(('a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'), ())
+    a, b, c, d = images.order
+    for image, value in ((a, 0b0011), (b, 0b0111), (c, 0b1100_0000), (d, 0b0001)):
+        images.set_hash(image, value)
+
+    file_list = FileList(
+        None,
+        search=lambda text: None if text == '' else {a, c},
+        near_duplicates=lambda image: images.near_duplicates(image, 1),
+        distinct=lambda: images.distinct(1),
+    )
+    file_list.set_images(images.order)
+
+    # near-duplicates of the image selected when mode was set
+    file_list.select(a)
+    file_list.set_mode(widgets.NEAR_DUPLICATES)
+    assert file_list.displayed == ['a.jpg', 'b.jpg', 'd.jpg']
+
+    file_list.select(b)
+    assert file_list.displayed == ['a.jpg', 'b.jpg', 'd.jpg']
+
+    file_list.set_mode(widgets.DISTINCT)
+    assert file_list.displayed == ['a.jpg', 'c.jpg']
+
+    # along with filter
+    file_list.set_mode(widgets.NEAR_DUPLICATES)
+    file_list._filter.set('red')
+    assert file_list.displayed == ['a.jpg']
+
+    file_list.set_mode(widgets.ALL)
+    assert file_list.displayed == ['a.jpg', 'c.jpg']
+
+
+def test_timings_overlay():
+    overlay = widgets.TimingsOverlay(None)
+    assert not overlay.shown
+
+    timing.disable()
+    try:
+        overlay.toggle()
+        assert overlay.shown
+        assert timing.timings() is not None
+        assert overlay['text'] == "No operation timed yet"
+
+        overlay.toggle()
+        assert not overlay.shown
+
+        timing.enable().record('storage.save', 1.0)
+        overlay.toggle()
+        assert 'storage.save' in overlay['text']
+    finally:
+        overlay.hide()
+        timing.disable()
+
+
+def test_image_display_resize(basedir):
+    path = basedir / 'image.jpg'
+    PILImage.new(mode='RGB', size=(1600, 1200)).save(path)
+
+    display = ImageDisplay(None)
+    render = mock.Mock(wraps=display._loader.render)
+    display._loader.render = render  # type: ignore
+
+    display.set_image(model.Image(path=path))
+    display.wait()
+    render.assert_called_once_with(path, (400, 300), None)
+    assert display._rendered is not None and display._rendered.size == (400, 300)
+
+    # a burst of resizes only stretches the current rendering meanwhile
+    render.reset_mock()
+    for box in [(500, 400), (600, 450), (800, 600)]:
+        display.resize_to(box)
+
+        assert display._resize_job is not None
+        assert display._pending is None
+
+    display.wait()
+    assert render.call_count == 1
+    assert render.call_args[0][:2] == (path, (800, 600))
+    assert display._rendered.size == (800, 600)
+
+    # going back to a size rendered at before reuses its rendering
+    render.reset_mock()
+    display.resize_to((400, 300))
+
+    assert display._resize_job is None
+    display.wait()
+    render.assert_not_called()
+    assert display._rendered is display._renderings[(400, 300)]
+    assert list(display._renderings) == [(800, 600), (400, 300)]